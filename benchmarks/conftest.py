@@ -0,0 +1,55 @@
+"""Fixtures of the tests checking build invariants on generated corpora.
+
+    python -m pytest benchmarks
+
+Builds run ``src/cli.py`` in a fresh process, as the benchmarks do, since the
+ATRM and build paths are read when ``constants`` is imported.
+"""
+
+import os
+import subprocess
+import sys
+from collections.abc import Callable
+from pathlib import Path
+
+import pytest
+from synthetic_corpus import generate_corpus
+
+SRC_PATH = Path(__file__).parent.parent / "src"
+sys.path.insert(0, str(SRC_PATH))
+
+# Build files that change between identical builds, or are not outputs
+SKIPPED_FILES = ("build_report.json",)
+
+
+def read_outputs(build_path: Path) -> dict[str, bytes]:
+    """Return the content of every output file of ``build_path`` by name."""
+    return {
+        path.name: path.read_bytes()
+        for path in sorted(build_path.iterdir())
+        if path.is_file() and path.name not in SKIPPED_FILES
+    }
+
+
+@pytest.fixture(scope="session")
+def corpus(tmp_path_factory: pytest.TempPathFactory) -> Path:
+    """A corpus shared by the tests that do not change it."""
+    return generate_corpus(tmp_path_factory.mktemp("corpus") / "atrm")
+
+
+@pytest.fixture(scope="session")
+def build() -> Callable[..., dict[str, bytes]]:
+    """Build ``corpus`` into ``build_path`` with the given options and return the outputs."""
+
+    def run_build(corpus: Path, build_path: Path, *args: str) -> dict[str, bytes]:
+        build_path.mkdir(parents=True, exist_ok=True)
+        env = {**os.environ, "ATRM_PATH": str(corpus), "ATRM_BUILD_PATH": str(build_path)}
+        subprocess.run(
+            [sys.executable, str(SRC_PATH / "cli.py"), "build", *args],
+            env=env,
+            check=True,
+            capture_output=True,
+        )
+        return read_outputs(build_path)
+
+    return run_build
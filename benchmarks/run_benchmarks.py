@@ -0,0 +1,121 @@
+"""Time full, cached and incremental builds of synthetic corpora at several scales.
+
+Every build runs ``src/parse.py`` in a fresh process against a generated
+corpus. Stage times are taken from the ``build_report.json`` it writes.
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from synthetic_corpus import add_revision, generate_corpus, get_commit_hash
+
+SRC_PATH = Path(__file__).parent.parent / "src"
+# Techniques per tactic in a corpus of scale 1, about the size of today's ATRM
+BASE_TECHNIQUES = 5
+REPORTED_STAGES = ("read", "markdown", "stix.build", "output.serialize", "output.write")
+
+
+def run_build(corpus: Path, build_path: Path, *args: str) -> dict:
+    env = {**os.environ, "ATRM_PATH": str(corpus), "ATRM_BUILD_PATH": str(build_path)}
+    start = time.perf_counter()
+    subprocess.run([sys.executable, str(SRC_PATH / "parse.py"), *args], env=env, check=True)
+    seconds = time.perf_counter() - start
+    report = json.loads((build_path / "build_report.json").read_text(encoding="utf-8"))
+    return {
+        "seconds": round(seconds, 3),
+        "stages": {name: stage["seconds"] for name, stage in report["stages"].items()},
+        "counters": report["counters"],
+    }
+
+
+def best_of(repeat: int, corpus: Path, build_path: Path, *args: str) -> dict:
+    return min(
+        (run_build(corpus, build_path, *args) for _ in range(repeat)),
+        key=lambda run: run["seconds"],
+    )
+
+
+def benchmark_scale(scale: int, args: argparse.Namespace, work_path: Path) -> dict:
+    corpus = generate_corpus(
+        work_path / f"corpus_{scale}",
+        techniques=BASE_TECHNIQUES * scale,
+        subtechniques=args.subtechniques,
+        history_depth=args.history_depth,
+        seed=args.seed,
+    )
+    build_path = work_path / f"build_{scale}"
+    build_path.mkdir()
+    workers = str(args.workers)
+
+    result = {
+        "scale": scale,
+        "pages": len(list(corpus.glob("docs/**/*.md"))),
+        "full": best_of(args.repeat, corpus, build_path, "--no-cache", "-j", workers),
+    }
+    # The first cached build fills the cache
+    run_build(corpus, build_path, "-j", workers)
+    result["cached"] = best_of(args.repeat, corpus, build_path, "-j", workers)
+
+    previous_hash = get_commit_hash(corpus)
+    add_revision(
+        corpus,
+        "Benchmark revision",
+        datetime.now(timezone.utc),
+        random.Random(args.seed),
+        fraction=args.changed,
+    )
+    result["incremental"] = best_of(args.repeat, corpus, build_path, "--since", previous_hash)
+    return result
+
+
+def print_results(results: list[dict]) -> None:
+    header = ["scale", "pages", "build", "seconds", *REPORTED_STAGES]
+    print("\t".join(header))
+    for result in results:
+        for build in ("full", "cached", "incremental"):
+            run = result[build]
+            stages = [f"{run['stages'].get(name, 0):.3f}" for name in REPORTED_STAGES]
+            row = [str(result["scale"]), str(result["pages"]), build, f"{run['seconds']:.3f}"]
+            print("\t".join([*row, *stages]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--scales",
+        type=int,
+        nargs="+",
+        default=[1, 10],
+        help="corpus sizes relative to today's ATRM (default: %(default)s)",
+    )
+    parser.add_argument("--subtechniques", type=int, default=2, help="per technique")
+    parser.add_argument("--history-depth", type=int, default=3, help="commits after the first")
+    parser.add_argument(
+        "--changed",
+        type=float,
+        default=0.05,
+        help="share of pages edited before the incremental build (default: %(default)s)",
+    )
+    parser.add_argument("-j", "--workers", type=int, default=1, help="passed to parse.py")
+    parser.add_argument("--repeat", type=int, default=3, help="keep the best of this many runs")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, help="also write the results as JSON")
+    parser.add_argument("--keep", type=Path, help="generate corpora and builds here and keep them")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        work_path = args.keep or Path(tmp)
+        work_path.mkdir(parents=True, exist_ok=True)
+        results = [benchmark_scale(scale, args, work_path) for scale in args.scales]
+
+    print_results(results)
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=4), encoding="utf-8")
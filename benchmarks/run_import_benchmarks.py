@@ -0,0 +1,82 @@
+"""Time the startup of CLI commands and the import of each module in fresh processes.
+
+Commands run ``src/cli.py`` against a synthetic corpus built once beforehand,
+so ``validate`` and ``build --if-changed`` have bundles to find. ``python``
+is the interpreter alone, the floor every command pays.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from synthetic_corpus import generate_corpus
+
+SRC_PATH = Path(__file__).parent.parent / "src"
+COMMANDS = {
+    "--help": ["--help"],
+    "--version": ["--version"],
+    "build --help": ["build", "--help"],
+    "validate": ["validate"],
+    "build --if-changed": ["build", "--if-changed"],
+}
+MODULES = (
+    "constants",
+    "metrics",
+    "cli",
+    "validate",
+    "bundle_index",
+    "output",
+    "delta",
+    "git_tools",
+    "markdown_tools",
+    "custom_atrm_objects",
+    "parse",
+)
+
+
+def run(args: list[str], env: dict) -> float:
+    start = time.perf_counter()
+    subprocess.run(args, env=env, cwd=SRC_PATH, check=True, capture_output=True)
+    return time.perf_counter() - start
+
+
+def best_of(repeat: int, args: list[str], env: dict) -> float:
+    return round(min(run(args, env) for _ in range(repeat)), 3)
+
+
+def benchmark(args: argparse.Namespace, work_path: Path) -> dict:
+    corpus = generate_corpus(work_path / "corpus", seed=args.seed)
+    build_path = work_path / "build"
+    build_path.mkdir()
+    env = {**os.environ, "ATRM_PATH": str(corpus), "ATRM_BUILD_PATH": str(build_path)}
+    subprocess.run([sys.executable, "cli.py", "build"], env=env, cwd=SRC_PATH, check=True)
+
+    results = {"python": best_of(args.repeat, [sys.executable, "-c", "pass"], env)}
+    for name, command in COMMANDS.items():
+        results[f"cli.py {name}"] = best_of(args.repeat, [sys.executable, "cli.py", *command], env)
+    for module in MODULES:
+        command = [sys.executable, "-c", f"import {module}"]
+        results[f"import {module}"] = best_of(args.repeat, command, env)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="keep the best of this many runs")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, help="also write the results as JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = benchmark(args, Path(tmp))
+
+    print("command\tseconds")
+    for name, seconds in results.items():
+        print(f"{name}\t{seconds:.3f}")
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=4), encoding="utf-8")
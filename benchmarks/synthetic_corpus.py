@@ -0,0 +1,288 @@
+"""Generate ATRM-shaped docs trees as local git repositories for benchmarks.
+
+Pages follow the layout the parsers expect: a tactic overview table, parent
+technique pages listing their sub-techniques, and technique pages in the
+tables style (``pre`` blocks under headings) or the bullets style.
+"""
+
+import argparse
+import os
+import random
+import subprocess
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+TACTICS = [
+    ("Reconnaissance", "AZTA100", "Reconnaissance"),
+    ("InitialAccess", "AZTA200", "Initial Access"),
+    ("Execution", "AZTA300", "Execution"),
+    ("PrivilegeEscalation", "AZTA400", "Privilege Escalation"),
+    ("Persistence", "AZTA500", "Persistence"),
+    ("CredentialAccess", "AZTA600", "Credential Access"),
+    ("Impact", "AZTA700", "Impact"),
+]
+
+WORDS = (
+    "adversary azure tenant subscription role assignment virtual machine runcommand "
+    "storage account key vault secret token graph application principal identity "
+    "resource group managed policy logic app automation runbook function webhook "
+    "password spray credential certificate federation consent"
+).split()
+
+
+def sentence(rng: random.Random, words: int = 12) -> str:
+    text = " ".join(rng.choice(WORDS) for _ in range(words))
+    return f"An {text}."
+
+
+def pre(body: str) -> str:
+    return f"```\n{body}\n```\n"
+
+
+def tactic_page(display_name: str, rows: list[tuple], rng: random.Random) -> str:
+    lines = [
+        f"# {display_name}",
+        "",
+        sentence(rng),
+        "",
+        "| Technique ID | Sub-Technique ID | Name | Description |",
+        "|---|---|---|---|",
+    ]
+    for tech_id, sub_id, name, brief, href in rows:
+        tech_cell = f"[{tech_id}]({href})" if tech_id else ""
+        sub_cell = f"[{sub_id}]({href})" if sub_id else ""
+        lines.append(f"| {tech_cell} | {sub_cell} | {name} | {brief} |")
+    return "\n".join(lines) + "\n"
+
+
+def parent_page(tech_id: str, name: str, subs: list[tuple], rng: random.Random) -> str:
+    lines = [
+        f"# {tech_id} - {name}",
+        "",
+        sentence(rng, 20),
+        "",
+        "| Sub-Technique ID | Name |",
+        "|---|---|",
+    ]
+    for sub_id, sub_name in subs:
+        lines.append(f"| [{sub_id}](./{sub_id.replace('.00', '-')}.md) | {sub_name} |")
+    return "\n".join(lines) + "\n"
+
+
+def links(rng: random.Random) -> str:
+    links = [
+        f"* [{rng.choice(WORDS)}](https://docs.microsoft.com/en-us/azure/{rng.choice(WORDS)})",
+        f"* https://learn.microsoft.com/en-us/graph/{rng.choice(WORDS)}",
+    ]
+    return "\n".join(links[: rng.randint(1, 2)])
+
+
+def examples(rng: random.Random) -> str:
+    return (
+        '=== "Az PowerShell"\n'
+        f"    [`#!powershell Get-Az{rng.choice(WORDS).title()}`](https://docs.microsoft.com/x)\n\n"
+        '=== "Azure CLI"\n'
+        f"    [`#!powershell az {rng.choice(WORDS)} show`](https://docs.microsoft.com/y)"
+    )
+
+
+def detections(rng: random.Random) -> str:
+    if rng.random() < 0.1:
+        return "N/A"
+    return (
+        "## **Logs**\n\n"
+        "| Data Source | Operation Name | Action | Log Provider |\n"
+        "|---|---|---|---|\n"
+        f"| Resource | {rng.choice(WORDS).title()} | Microsoft.{rng.choice(WORDS).title()}/read | AzureActivity |"
+    )
+
+
+def tables_page(tech_id: str, title: str, rng: random.Random) -> str:
+    resources = "\n".join(rng.choice(WORDS).title() for _ in range(rng.randint(1, 3)))
+    actions = "\n".join(
+        f"Microsoft.{rng.choice(WORDS).title()}/{rng.choice(WORDS)}/read"
+        for _ in range(rng.randint(1, 3))
+    )
+    if rng.random() < 0.1:
+        actions = "N/A"
+    return "\n".join(
+        [
+            f"# {tech_id} - {title}",
+            "",
+            sentence(rng, 18),
+            "",
+            "## Resources",
+            "",
+            pre(resources),
+            "## Actions",
+            "",
+            pre(actions),
+            "## Examples",
+            "",
+            pre(examples(rng)),
+            "## Detections",
+            "",
+            pre(detections(rng)),
+            "## Additional Resources",
+            "",
+            pre(links(rng)),
+        ],
+    )
+
+
+def bullets_page(tech_id: str, title: str, rng: random.Random) -> str:
+    return "\n".join(
+        [
+            f"# {tech_id} - {title}",
+            "",
+            f"By utilizing the `{rng.choice(WORDS)}` feature, an attacker can pass:",
+            "",
+            f"- **Windows**: {sentence(rng, 6)}",
+            "",
+            f"- **Linux**: {sentence(rng, 6)}",
+            "",
+            "Resources:",
+            f"\\* {rng.choice(WORDS).title()}",
+            "",
+            "Actions:",
+            f"\\* Microsoft.Compute/{rng.choice(WORDS)}/action",
+            f"\\* Microsoft.Compute/{rng.choice(WORDS)}/read",
+            "",
+            "## Examples",
+            "",
+            pre(examples(rng)),
+            "## Detections",
+            "",
+            pre(detections(rng)),
+            "## Additional Resources",
+            "",
+            pre(links(rng)),
+        ],
+    )
+
+
+def git(repo: Path, *args: str, when: datetime | None = None) -> None:
+    env = dict(os.environ)
+    env.update(
+        {
+            "GIT_AUTHOR_NAME": "synthetic",
+            "GIT_AUTHOR_EMAIL": "synthetic@example.com",
+            "GIT_COMMITTER_NAME": "synthetic",
+            "GIT_COMMITTER_EMAIL": "synthetic@example.com",
+        },
+    )
+    if when is not None:
+        env["GIT_AUTHOR_DATE"] = env["GIT_COMMITTER_DATE"] = when.isoformat()
+    subprocess.run(["git", *args], cwd=repo, env=env, check=True, capture_output=True)
+
+
+def get_commit_hash(corpus: Path) -> str:
+    return subprocess.run(
+        ["git", "rev-parse", "--short=7", "main"],
+        cwd=corpus,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout.strip()
+
+
+def technique_pages(
+    tactic_index: int,
+    techniques: int,
+    subtechniques: int,
+    rng: random.Random,
+) -> tuple[list[tuple], dict[str, str]]:
+    rows = []
+    pages = {}
+    for t in range(1, techniques + 1):
+        tech_id = f"AZT{tactic_index}{t:02d}"
+        name = " ".join(rng.choice(WORDS) for _ in range(3)).title()
+        rows.append((tech_id, "", name, sentence(rng, 8), f"./{tech_id}/{tech_id}.md"))
+        subs = []
+        for s in range(1, subtechniques + 1):
+            sub_id = f"{tech_id}.{s:03d}"
+            sub_name = " ".join(rng.choice(WORDS) for _ in range(2)).title()
+            subs.append((sub_id, sub_name))
+            href = f"./{tech_id}/{tech_id}-{s}.md"
+            rows.append(("", sub_id, sub_name, sentence(rng, 8), href))
+            page = bullets_page if rng.random() < 0.3 else tables_page
+            pages[f"{tech_id}/{tech_id}-{s}.md"] = page(
+                f"{tech_id}.{s}",
+                f"{name}: {sub_name}",
+                rng,
+            )
+        if subs:
+            pages[f"{tech_id}/{tech_id}.md"] = parent_page(tech_id, name, subs, rng)
+        else:
+            pages[f"{tech_id}/{tech_id}.md"] = tables_page(tech_id, name, rng)
+    return rows, pages
+
+
+def add_revision(
+    repo: Path,
+    message: str,
+    when: datetime,
+    rng: random.Random,
+    fraction: float = 0.1,
+) -> None:
+    """Commit an edit to ``fraction`` of the technique pages."""
+    pages = sorted(repo.glob("docs/*/*/*.md"))
+    for page_path in rng.sample(pages, k=max(1, int(len(pages) * fraction))):
+        with open(page_path, "a", encoding="utf-8") as f:
+            f.write(f"\n<!-- {message} -->\n")
+    git(repo, "commit", "-q", "-am", message, when=when)
+
+
+def generate_corpus(
+    root: str | os.PathLike,
+    tactics: int = 7,
+    techniques: int = 5,
+    subtechniques: int = 2,
+    history_depth: int = 3,
+    seed: int = 0,
+) -> Path:
+    """Create an ATRM-shaped docs tree as a local git repository on branch ``main``."""
+    rng = random.Random(seed)
+    repo = Path(root)
+    docs = repo / "docs"
+    docs.mkdir(parents=True, exist_ok=True)
+    git(repo, "init", "-q", "-b", "main")
+    when = datetime(2022, 7, 29, 17, 49, 20, tzinfo=timezone.utc)
+
+    (repo / "LICENSE").write_text("MIT License\n", encoding="utf-8")
+    for index, (folder, _, display_name) in enumerate(TACTICS[:tactics], start=1):
+        rows, pages = technique_pages(index, techniques, subtechniques, rng)
+        tactic_dir = docs / folder
+        tactic_dir.mkdir(exist_ok=True)
+        tactic_file = tactic_dir / f"{folder}.md"
+        tactic_file.write_text(tactic_page(display_name, rows, rng), encoding="utf-8")
+        for rel_path, text in pages.items():
+            page_path = tactic_dir / rel_path
+            page_path.parent.mkdir(exist_ok=True)
+            page_path.write_text(text, encoding="utf-8")
+    git(repo, "add", "-A")
+    git(repo, "commit", "-q", "-m", "Initial corpus", when=when)
+
+    for depth in range(history_depth):
+        when += timedelta(days=rng.randint(1, 30), seconds=rng.randint(0, 86400))
+        add_revision(repo, f"Revision {depth}", when, rng)
+    return repo
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic ATRM corpus")
+    parser.add_argument("path", help="directory for the new git repository")
+    parser.add_argument("--tactics", type=int, default=7, help="at most %(default)s")
+    parser.add_argument("--techniques", type=int, default=5, help="per tactic")
+    parser.add_argument("--subtechniques", type=int, default=2, help="per technique")
+    parser.add_argument("--history-depth", type=int, default=3, help="commits after the first")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    generate_corpus(
+        args.path,
+        tactics=args.tactics,
+        techniques=args.techniques,
+        subtechniques=args.subtechniques,
+        history_depth=args.history_depth,
+        seed=args.seed,
+    )
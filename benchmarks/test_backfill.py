@@ -0,0 +1,46 @@
+import random
+import subprocess
+from datetime import datetime, timezone
+
+from synthetic_corpus import add_revision, generate_corpus, get_commit_hash, git
+
+from git_tools import GitHistory, RangeHistory
+
+
+def test_commits_with_broken_relations_are_skipped(tmp_path, build):
+    corpus = generate_corpus(tmp_path / "atrm", history_depth=0)
+    base_hash = get_commit_hash(corpus)
+    # The subtechniques of AZT101 lose their parent page, then get it back
+    git(corpus, "rm", "-q", "docs/Reconnaissance/AZT101/AZT101.md")
+    git(corpus, "commit", "-q", "-m", "Break", when=datetime(2023, 1, 1, tzinfo=timezone.utc))
+    broken_hash = get_commit_hash(corpus)
+    git(corpus, "revert", "--no-edit", "HEAD", when=datetime(2023, 2, 1, tzinfo=timezone.utc))
+    fixed_hash = get_commit_hash(corpus)
+
+    outputs = build(corpus, tmp_path / "build", "--no-cache", "--backfill", f"{base_hash}..HEAD")
+    assert f"atrm_strict_{broken_hash}.json" not in outputs
+    assert f"atrm_strict_{fixed_hash}.json" in outputs
+
+
+def test_range_history_matches_git_history(tmp_path):
+    corpus = generate_corpus(tmp_path / "atrm", techniques=1)
+    # With a merged branch, the ancestors of a commit are not a suffix of the log
+    git(corpus, "checkout", "-q", "-b", "side", "HEAD~1")
+    add_revision(corpus, "Side", datetime(2023, 7, 1, tzinfo=timezone.utc), random.Random(1))
+    git(corpus, "checkout", "-q", "main")
+    add_revision(corpus, "Main", datetime(2023, 8, 1, tzinfo=timezone.utc), random.Random(2))
+    when = datetime(2023, 9, 1, tzinfo=timezone.utc)
+    git(corpus, "merge", "-q", "--no-ff", "-m", "Merge", "side", when=when)
+    commits = subprocess.run(
+        ["git", "rev-list", "main"],
+        cwd=corpus,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout.split()
+
+    histories = RangeHistory(str(corpus), commits)
+    for commit_hash in commits:
+        expected = GitHistory(str(corpus), rev=commit_hash)
+        history = histories.get(commit_hash)
+        assert (history.created, history.modified) == (expected.created, expected.modified)
@@ -0,0 +1,12 @@
+def test_cached_builds_match_a_full_build(corpus, tmp_path, build):
+    expected = build(corpus, tmp_path / "full", "--no-cache", "--deterministic")
+    cached_path = tmp_path / "cached"
+    # The first build fills the cache, the second reads every page from it
+    assert build(corpus, cached_path, "--deterministic") == expected
+    assert build(corpus, cached_path, "--deterministic") == expected
+
+
+def test_parallel_builds_match_a_serial_build(corpus, tmp_path, build):
+    expected = build(corpus, tmp_path / "serial", "--no-cache", "--deterministic", "-j", "1")
+    parallel = build(corpus, tmp_path / "parallel", "--no-cache", "--deterministic", "-j", "3")
+    assert parallel == expected
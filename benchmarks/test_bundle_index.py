@@ -0,0 +1,57 @@
+import json
+
+import pytest
+
+from bundle_index import BundleIndex, get_external_id
+
+
+@pytest.fixture(scope="module")
+def bundle_path(corpus, tmp_path_factory, build):
+    build_path = tmp_path_factory.mktemp("index")
+    build(corpus, build_path, "--deterministic")
+    return build_path / "atrm_strict.json"
+
+
+def test_index_returns_every_object(bundle_path):
+    with open(bundle_path, encoding="utf-8") as f:
+        objects = json.load(f)["objects"]
+    with BundleIndex(bundle_path) as atrm:
+        for obj in objects:
+            assert atrm.get_object_by_stix_id(obj["id"]) == obj
+            if obj["type"] in ("x-mitre-tactic", "attack-pattern"):
+                assert atrm.get_object_by_external_id(get_external_id(obj)) == obj
+        assert atrm.get_object_by_stix_id("attack-pattern--missing") is None
+
+
+def test_index_follows_tactics_and_subtechniques(bundle_path):
+    with open(bundle_path, encoding="utf-8") as f:
+        objects = json.load(f)["objects"]
+    relationships = [obj for obj in objects if obj["type"] == "relationship"]
+    with BundleIndex(bundle_path) as atrm:
+        # Pages write subtechnique ids without padding
+        subtechnique = atrm.get_object_by_external_id("AZT101.1")
+        assert get_external_id(subtechnique) == "AZT101.001"
+        parent = atrm.get_parent_technique_of_subtechnique(subtechnique["id"])
+        assert get_external_id(parent) == "AZT101"
+        assert subtechnique in atrm.get_subtechniques_of_technique(parent["id"])
+
+        for relationship in relationships:
+            parent = atrm.get_object_by_stix_id(relationship["target_ref"])
+            source = atrm.get_object_by_stix_id(relationship["source_ref"])
+            assert atrm.get_parent_technique_of_subtechnique(source["id"]) == parent
+
+        techniques = atrm.get_techniques_by_tactic("reconnaissance")
+        assert techniques
+        for technique in techniques:
+            phases = [phase["phase_name"] for phase in technique["kill_chain_phases"]]
+            assert "reconnaissance" in phases
+
+
+def test_index_rejects_a_changed_bundle(bundle_path, tmp_path):
+    changed_path = tmp_path / bundle_path.name
+    changed_path.write_bytes(bundle_path.read_bytes().replace(b"AZT101", b"AZT109"))
+    (tmp_path / "atrm_strict.index.json").write_bytes(
+        bundle_path.with_suffix(".index.json").read_bytes(),
+    )
+    with pytest.raises(ValueError, match="does not match its index"):
+        BundleIndex(changed_path)
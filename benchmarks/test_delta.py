@@ -0,0 +1,70 @@
+import json
+from datetime import datetime, timezone
+
+from synthetic_corpus import generate_corpus, get_commit_hash, git
+
+from bundle_index import get_external_id
+from delta import DeltaWriter
+
+
+def get_ids(objects: list[dict]) -> dict[str, str]:
+    """Map the external id of every technique to its STIX id."""
+    return {get_external_id(obj): obj["id"] for obj in objects if obj["type"] == "attack-pattern"}
+
+
+def read_bundle(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_delta_lists_added_modified_and_removed_objects(tmp_path, build):
+    corpus = generate_corpus(tmp_path / "atrm", history_depth=0)
+    build_path = tmp_path / "build"
+    old_hash = get_commit_hash(corpus)
+    build(corpus, build_path, "--deterministic")
+
+    page = corpus / "docs/Execution/AZT301/AZT301.md"
+    page.write_text(page.read_text(encoding="utf-8") + "\nAnother paragraph.\n", encoding="utf-8")
+    (corpus / "docs/Impact/AZT701/AZT701-2.md").unlink()
+    text = (corpus / "docs/Impact/AZT702/AZT702-1.md").read_text(encoding="utf-8")
+    text = text.replace("# AZT702.1 ", "# AZT702.3 ")
+    (corpus / "docs/Impact/AZT702/AZT702-3.md").write_text(text, encoding="utf-8")
+    git(corpus, "add", "-A")
+    git(corpus, "commit", "-q", "-m", "Edit", when=datetime(2024, 1, 1, tzinfo=timezone.utc))
+    new_hash = get_commit_hash(corpus)
+    build(corpus, build_path, "--deterministic")
+
+    manifest = DeltaWriter(build_path).write_delta("strict", old_hash, new_hash)
+    old_ids = get_ids(read_bundle(build_path / f"atrm_strict_{old_hash}.json")["objects"])
+    new_ids = get_ids(read_bundle(build_path / f"atrm_strict_{new_hash}.json")["objects"])
+    assert new_ids["AZT702.003"] in manifest["added"]
+    assert new_ids["AZT301"] in manifest["modified"]
+    assert old_ids["AZT701.002"] in manifest["removed"]
+    assert manifest["revoked"] == []
+    unchanged = new_ids["AZT101"]
+    assert unchanged not in manifest["added"] + manifest["modified"] + manifest["removed"]
+
+    delta = read_bundle(build_path / f"atrm_strict_{old_hash}_{new_hash}.delta.json")
+    changed_ids = manifest["added"] + manifest["modified"]
+    assert sorted(obj["id"] for obj in delta["objects"]) == sorted(changed_ids)
+
+
+def test_delta_lists_revoked_objects(corpus, tmp_path, build):
+    build(corpus, tmp_path, "--deterministic")
+    bundle = read_bundle(tmp_path / "atrm_strict.json")
+    (tmp_path / "atrm_strict_old.json").write_text(json.dumps(bundle), encoding="utf-8")
+    technique = next(obj for obj in bundle["objects"] if obj["type"] == "attack-pattern")
+    technique["revoked"] = True
+    technique["modified"] = "2030-01-01T00:00:00.000Z"
+    (tmp_path / "atrm_strict_new.json").write_text(json.dumps(bundle), encoding="utf-8")
+
+    manifest = DeltaWriter(tmp_path).write_delta("strict", "old", "new")
+    assert manifest == {
+        "from": "old",
+        "to": "new",
+        "added": [],
+        "modified": [technique["id"]],
+        "revoked": [technique["id"]],
+        "removed": [],
+    }
+    assert read_bundle(tmp_path / "atrm_strict_old_new.delta.json")["objects"] == [technique]
@@ -0,0 +1,50 @@
+import os
+import random
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+from conftest import SRC_PATH
+from synthetic_corpus import add_revision, generate_corpus, get_commit_hash, git
+
+
+def edit_pages(corpus):
+    """Commit a tactic brief edit, a deleted, an added and a renumbered technique page."""
+    add_revision(corpus, "Edit pages", datetime(2023, 6, 1, tzinfo=timezone.utc), random.Random(1))
+    tactic_page = corpus / "docs/Execution/Execution.md"
+    text = tactic_page.read_text(encoding="utf-8")
+    tactic_page.write_text(text.replace("| An ", "| A changed brief ", 1), encoding="utf-8")
+    (corpus / "docs/Impact/AZT701/AZT701-2.md").unlink()
+    page = corpus / "docs/Impact/AZT702/AZT702-1.md"
+    text = page.read_text(encoding="utf-8").replace("# AZT702.1 ", "# AZT702.3 ")
+    (corpus / "docs/Impact/AZT702/AZT702-3.md").write_text(text, encoding="utf-8")
+    page = corpus / "docs/Reconnaissance/AZT101/AZT101-1.md"
+    text = page.read_text(encoding="utf-8").replace("# AZT101.1 ", "# AZT101.4 ")
+    page.write_text(text, encoding="utf-8")
+    git(corpus, "add", "-A")
+    git(corpus, "commit", "-q", "-m", "Move pages", when=datetime(2024, 1, 1, tzinfo=timezone.utc))
+
+
+def test_since_matches_a_full_build(tmp_path, build):
+    corpus = generate_corpus(tmp_path / "atrm", seed=1)
+    build_path = tmp_path / "build"
+    build(corpus, build_path, "--deterministic")
+    previous_hash = get_commit_hash(corpus)
+    edit_pages(corpus)
+
+    incremental = build(corpus, build_path, "--deterministic", "--since", previous_hash)
+    expected = build(corpus, tmp_path / "full", "--no-cache", "--deterministic")
+    assert {name: incremental[name] for name in expected} == expected
+
+
+def test_since_without_the_previous_build_exits(corpus, tmp_path):
+    env = {**os.environ, "ATRM_PATH": str(corpus), "ATRM_BUILD_PATH": str(tmp_path)}
+    result = subprocess.run(
+        [sys.executable, str(SRC_PATH / "cli.py"), "build", "--since", "0000000"],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    assert result.returncode == 1
+    assert "atrm_strict_0000000.json" in result.stderr
@@ -0,0 +1,25 @@
+import html_to_json
+import pytest
+from marko.ext.gfm import gfm
+
+from markdown_tools import convert_markdown
+
+# Raw HTML around other blocks, within a block, and next to GFM extensions
+HTML_PAGES = (
+    "# AZT101 - Title\n\n<details>\n<summary>Commands</summary>\n\n```bash\naz vm list\n```\n\n"
+    "</details>\n\nAfter the details.\n",
+    "<div align=center>\n\n```\ncode\n```\n\n</div>\n\n| a | b |\n|---|---|\n| 1 | 2 |\n",
+    "<p align=center>\n<img src=diagram.png>\n</p>\n\nText with <b>bold</b> and <br> a break.\n",
+    "# Tasks\n\n- [x] done\n- [ ] left <!-- note -->\n\n<!-- Revision 1 -->\n",
+)
+
+
+@pytest.mark.parametrize("content", HTML_PAGES)
+def test_html_pages_convert_as_html(content):
+    assert convert_markdown(content) == html_to_json.convert(gfm(content))
+
+
+def test_corpus_pages_convert_as_html(corpus):
+    for page in sorted(corpus.glob("docs/**/*.md")):
+        content = page.read_text(encoding="utf-8")
+        assert convert_markdown(content) == html_to_json.convert(gfm(content)), page
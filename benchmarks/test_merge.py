@@ -0,0 +1,114 @@
+import io
+import json
+
+import pytest
+
+import merge
+from merge import MergeStream, iter_bundle_objects
+
+ENTERPRISE_TACTIC = {
+    "type": "x-mitre-tactic",
+    "id": "x-mitre-tactic--4ca45d45-df4d-4613-8980-bac22d278fa5",
+    "created": "2018-10-17T00:14:20.652Z",
+    "modified": "2019-07-19T17:42:06.909Z",
+    "name": "Execution",
+    "x_mitre_shortname": "execution",
+}
+ENTERPRISE_TECHNIQUE = {
+    "type": "attack-pattern",
+    "id": "attack-pattern--7385dfaf-6886-4229-9ecd-6fd678040830",
+    "created": "2017-05-31T21:31:08.977Z",
+    "modified": "2024-04-15T19:58:46.398Z",
+    "name": "Command and Scripting Interpreter",
+    "description": 'Adversaries may abuse interpreters — with "quotes" and \\ escapes.',
+    "kill_chain_phases": [{"kill_chain_name": "mitre-attack", "phase_name": "execution"}],
+    "x_mitre_platforms": ["Linux", "Windows"],
+    "x_test_numbers": [1, -2.5e-3, 1234567890, True, None],
+}
+ENTERPRISE_MATRIX = {
+    "type": "x-mitre-matrix",
+    "id": "x-mitre-matrix--eafc1b4c-5e56-4965-bd4e-66a6a89c88cc",
+    "created": "2018-10-17T00:14:20.652Z",
+    "modified": "2024-04-23T15:34:02.410Z",
+    "name": "Enterprise ATT&CK",
+    "tactic_refs": [ENTERPRISE_TACTIC["id"]],
+}
+ENTERPRISE_COLLECTION = {
+    "type": "x-mitre-collection",
+    "id": "x-mitre-collection--1f5f1533-f617-4ca8-9ab4-6a02367fa019",
+    "created": "2018-01-17T12:56:55.080Z",
+    "modified": "2024-04-23T15:34:02.410Z",
+    "name": "Enterprise ATT&CK",
+    "x_mitre_contents": [],
+}
+
+
+@pytest.fixture(scope="module")
+def atrm_bundle(corpus, tmp_path_factory, build):
+    build_path = tmp_path_factory.mktemp("merge")
+    build(corpus, build_path, "--deterministic")
+    with open(build_path / "atrm_attack_compatible.json", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def get_enterprise_bundle(atrm_bundle: dict) -> dict:
+    """An enterprise bundle holding an older and a newer version of two ATRM objects."""
+    atrm_objects = {obj["type"]: obj for obj in reversed(atrm_bundle["objects"])}
+    older = {**atrm_objects["identity"], "modified": "2020-01-01T00:00:00.000Z"}
+    newer = {**atrm_objects["attack-pattern"], "modified": "2030-01-01T00:00:00.000Z"}
+    objects = [ENTERPRISE_COLLECTION, ENTERPRISE_TACTIC, ENTERPRISE_TECHNIQUE, older, newer]
+    return {
+        "type": "bundle",
+        "id": "bundle--0d8a4a3c-4b6f-4ab2-9a6e-7b2e0a7c0e11",
+        "objects": [*objects, ENTERPRISE_MATRIX],
+    }
+
+
+def merge_bundles(atrm_bundle: dict, enterprise_path, path) -> dict:
+    collection, *objects = atrm_bundle["objects"]
+    stream = MergeStream(path, enterprise_path)
+    for obj in objects:
+        stream.write(obj)
+    stream.close(collection, "0000000")
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 1024])
+def test_bundle_objects_are_read_across_chunks(atrm_bundle, monkeypatch, chunk_size):
+    monkeypatch.setattr(merge, "CHUNK_SIZE", chunk_size)
+    enterprise_bundle = get_enterprise_bundle(atrm_bundle)
+    bundle = {}
+    text = json.dumps(enterprise_bundle, indent="\t")
+    objects = list(iter_bundle_objects(io.StringIO(text), bundle))
+    assert objects == enterprise_bundle["objects"]
+    assert bundle == {"type": "bundle", "id": enterprise_bundle["id"]}
+
+
+def test_merge_keeps_the_latest_version_of_every_object(atrm_bundle, monkeypatch, tmp_path):
+    enterprise_bundle = get_enterprise_bundle(atrm_bundle)
+    enterprise_path = tmp_path / "enterprise-attack.json"
+    enterprise_path.write_text(json.dumps(enterprise_bundle, indent=4), encoding="utf-8")
+    expected = merge_bundles(atrm_bundle, enterprise_path, tmp_path / "expected.json")
+    monkeypatch.setattr(merge, "CHUNK_SIZE", 16)
+    merged = merge_bundles(atrm_bundle, enterprise_path, tmp_path / "merged.json")
+    assert merged == expected
+
+    collection, *objects = merged["objects"]
+    ids = [obj["id"] for obj in objects]
+    assert [content["object_ref"] for content in collection["x_mitre_contents"]] == ids
+    assert len(set(ids)) == len(ids)
+    merged_objects = {obj["id"]: obj for obj in objects}
+    older, newer = enterprise_bundle["objects"][3:5]
+    atrm_objects = {obj["id"]: obj for obj in atrm_bundle["objects"]}
+    assert merged_objects[older["id"]] == atrm_objects[older["id"]]
+    assert merged_objects[newer["id"]] == newer
+    assert merged_objects[ENTERPRISE_TECHNIQUE["id"]] == ENTERPRISE_TECHNIQUE
+
+    # The ATRM execution tactic joins the enterprise one
+    atrm_tactics = [obj for obj in atrm_bundle["objects"] if obj["type"] == "x-mitre-tactic"]
+    tactic_refs = [obj["id"] for obj in atrm_tactics if obj["x_mitre_shortname"] != "execution"]
+    (matrix,) = (obj for obj in objects if obj["type"] == "x-mitre-matrix")
+    assert matrix["tactic_refs"] == [ENTERPRISE_TACTIC["id"], *tactic_refs]
+    assert set(tactic_refs) < set(ids)
+    assert len(tactic_refs) == len(atrm_tactics) - 1
@@ -0,0 +1,100 @@
+import json
+
+import pytest
+
+from navigator import MatrixStream, NavigatorStream, load_scores
+
+
+def tactic(external_id: str, shortname: str, name: str) -> dict:
+    return {
+        "type": "x-mitre-tactic",
+        "id": f"x-mitre-tactic--{external_id}",
+        "name": name,
+        "x_mitre_shortname": shortname,
+        "external_references": [{"source_name": "mitre-attack", "external_id": external_id}],
+    }
+
+
+def technique(external_id: str, name: str, *shortnames: str, **properties) -> dict:
+    return {
+        "type": "attack-pattern",
+        "id": f"attack-pattern--{external_id}",
+        "name": name,
+        "kill_chain_phases": [
+            {"kill_chain_name": "mitre-attack", "phase_name": shortname}
+            for shortname in shortnames
+        ],
+        "external_references": [{"source_name": "mitre-attack", "external_id": external_id}],
+        "x_mitre_domains": ["atrm"],
+        **properties,
+    }
+
+
+# Techniques out of id order, one under two tactics, a subtechnique and a revoked one
+OBJECTS = [
+    tactic("AZTA100", "reconnaissance", "Reconnaissance"),
+    tactic("AZTA300", "execution", "Execution"),
+    technique("AZT102", "IP Discovery", "reconnaissance"),
+    technique("AZT101.001", "Bucket Listing", "reconnaissance", x_mitre_is_subtechnique=True),
+    technique("AZT101", "Resource Enumeration", "reconnaissance", "execution"),
+    technique("AZT301", "Run Command", "execution"),
+    technique("AZT302", "Old Technique", "execution", revoked=True),
+    {
+        "type": "relationship",
+        "id": "relationship--1",
+        "relationship_type": "subtechnique-of",
+        "source_ref": "attack-pattern--AZT101.001",
+        "target_ref": "attack-pattern--AZT101",
+    },
+]
+COLLECTION = {"type": "x-mitre-collection", "name": "Azure Threat Research Matrix"}
+
+
+def export(stream_class, path, scores=None):
+    stream = stream_class(path, scores)
+    for obj in OBJECTS:
+        stream.write(obj)
+    stream.close(COLLECTION, "0000000")
+    return path.read_text(encoding="utf-8")
+
+
+def test_matrix_lists_techniques_by_tactic(tmp_path):
+    scores = {"AZT101.001": 2.0, "AZT301": 0.5}
+    assert export(MatrixStream, tmp_path / "atrm.matrix.csv", scores) == (
+        "tactic_id,tactic,technique_id,technique,parent_id,score\n"
+        "AZTA100,Reconnaissance,AZT101,Resource Enumeration,,\n"
+        "AZTA100,Reconnaissance,AZT101.001,Bucket Listing,AZT101,2.0\n"
+        "AZTA100,Reconnaissance,AZT102,IP Discovery,,\n"
+        "AZTA300,Execution,AZT101,Resource Enumeration,,\n"
+        "AZTA300,Execution,AZT301,Run Command,,0.5\n"
+    )
+
+
+def test_layer_shows_scored_techniques(tmp_path):
+    scores = {"AZT101.001": 2.0, "AZT301": 0.5}
+    layer = json.loads(export(NavigatorStream, tmp_path / "atrm.layer.json", scores))
+    assert layer["name"] == COLLECTION["name"]
+    assert layer["domain"] == "atrm"
+    assert layer["gradient"]["minValue"] == 0.5
+    assert layer["gradient"]["maxValue"] == 2.0
+    assert [
+        (t["tactic"], t["techniqueID"], t.get("score"), t["showSubtechniques"])
+        for t in layer["techniques"]
+    ] == [
+        ("reconnaissance", "AZT101", None, True),
+        ("reconnaissance", "AZT101.001", 2.0, False),
+        ("reconnaissance", "AZT102", None, False),
+        ("execution", "AZT101", None, True),
+        ("execution", "AZT301", 0.5, False),
+    ]
+
+
+def test_scores_of_unknown_techniques_are_rejected(tmp_path):
+    with pytest.raises(ValueError, match="AZT302"):
+        export(MatrixStream, tmp_path / "atrm.matrix.csv", {"AZT302": 1.0})
+
+
+def test_scores_accept_page_ids(tmp_path):
+    path = tmp_path / "scores.csv"
+    path.write_text("technique_id,score\nAZT101.1,2\nAZT301,0.5\n", encoding="utf-8")
+    assert load_scores(path) == {"AZT101.001": 2.0, "AZT301": 0.5}
@@ -0,0 +1,28 @@
+import json
+
+import pytest
+from stix2 import Bundle
+from synthetic_corpus import generate_corpus
+
+from incremental import to_stix_dict
+from output import serialize_pretty
+from stix_dicts import validate_object
+
+
+@pytest.fixture(scope="module")
+def small_corpus(tmp_path_factory):
+    # stix2 searches the whole bundle for every key it writes, so keep it small
+    return generate_corpus(tmp_path_factory.mktemp("small") / "atrm", techniques=1)
+
+
+@pytest.mark.parametrize("mode", ["strict", "attack_compatible"])
+def test_bundles_serialize_as_stix2(small_corpus, tmp_path, build, mode):
+    text = build(small_corpus, tmp_path, "--deterministic")[f"atrm_{mode}.json"].decode()
+    bundle = json.loads(text)
+    objects = [to_stix_dict(obj) for obj in bundle["objects"]]
+    for obj in objects:
+        assert serialize_pretty(obj) == validate_object(obj).serialize(pretty=True), obj["id"]
+
+    stix_objects = [validate_object(obj) for obj in objects]
+    expected = Bundle(stix_objects, id=bundle["id"], allow_custom=True).serialize(pretty=True)
+    assert text == expected
@@ -0,0 +1,54 @@
+import pickle
+from datetime import datetime, timezone
+
+import pytest
+
+from constants import Mode
+from output import serialize_pretty
+from parse_tactic import read_tactic
+from parse_technique import (
+    TechniqueRecord,
+    build_technique,
+    get_techniques_brief_info,
+    read_technique,
+)
+
+
+@pytest.fixture(scope="module")
+def records(corpus):
+    """The technique records of every page of ``corpus``, dated as a build dates them."""
+    records = []
+    for tactic_path in sorted(path for path in (corpus / "docs").iterdir() if path.is_dir()):
+        tactic_file = tactic_path / f"{tactic_path.name}.md"
+        tactic = read_tactic(tactic_file, tactic_path.name)
+        techniques_brief = get_techniques_brief_info(file_path=tactic_file, tactic=tactic)
+        for page in sorted(tactic_path.glob("*/*.md")):
+            technique, _ = read_technique(
+                str(page),
+                tactic_path.name,
+                techniques_brief,
+                tactic["shortname"],
+            )
+            technique["created"] = datetime(2022, 7, 29, tzinfo=timezone.utc)
+            technique["modified"] = datetime(2024, 1, 1, 12, 30, tzinfo=timezone.utc)
+            records.append(technique)
+    return records
+
+
+@pytest.mark.parametrize("mode", list(Mode))
+def test_records_build_as_dicts(records, mode):
+    assert records
+    for record in records:
+        technique = dict(record.items())
+        expected = serialize_pretty(build_technique(technique, mode))
+        assert serialize_pretty(build_technique(record, mode)) == expected, record.id
+
+
+def test_records_survive_the_cache_and_workers(records):
+    for record in records:
+        # The parse cache stores records as dicts, parse workers pickle them
+        assert TechniqueRecord(**dict(record.items())) == record
+        unpickled = pickle.loads(pickle.dumps(record))  # noqa: S301
+        assert unpickled == record
+        assert unpickled.phase_name is record.phase_name
+        assert all(a is b for a, b in zip(unpickled.links, record.links, strict=True))
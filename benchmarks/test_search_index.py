@@ -0,0 +1,70 @@
+import pytest
+
+from search_index import SearchIndex, SearchIndexStream
+
+
+def technique(external_id: str, name: str, description: str, detections: list) -> dict:
+    return {
+        "type": "attack-pattern",
+        "id": f"attack-pattern--{external_id}",
+        "name": name,
+        "description": description,
+        "external_references": [{"source_name": "atrm", "external_id": external_id}],
+        "x_atrm_detections": detections,
+    }
+
+
+TECHNIQUES = [
+    technique(
+        "AZT301",
+        "Virtual Machine Scripting",
+        "An adversary may run scripts on a virtual machine through its agent.",
+        ["Microsoft.Compute/virtualMachines/runCommand/action"],
+    ),
+    technique(
+        "AZT604",
+        "Key Vault Secret Dump",
+        "An adversary may read every secret of a key vault from a virtual machine.",
+        ["Microsoft.KeyVault/vaults/secrets/read"],
+    ),
+    technique(
+        "AZT201",
+        "Password Spraying",
+        "An adversary may try one password against many accounts of a tenant.",
+        [],
+    ),
+]
+
+
+@pytest.fixture(scope="module")
+def index(tmp_path_factory):
+    path = tmp_path_factory.mktemp("search") / "atrm_strict.search.json"
+    stream = SearchIndexStream(path)
+    for obj in [{"type": "x-mitre-tactic", "id": "x-mitre-tactic--1"}, *TECHNIQUES]:
+        stream.write(obj)
+    stream.close({}, "0000000")
+    return SearchIndex(path)
+
+
+def search_ids(index: SearchIndex, query: str, **kwargs) -> list[str]:
+    return [result["external_id"] for result in index.search(query, **kwargs)]
+
+
+def test_name_matches_rank_first(index):
+    # Both descriptions mention a virtual machine, one name does
+    assert search_ids(index, "virtual machine") == ["AZT301", "AZT604"]
+    assert search_ids(index, "key vault secret") == ["AZT604"]
+
+
+def test_operations_match_whole_and_by_part(index):
+    operation = "Microsoft.Compute/virtualMachines/runCommand/action"
+    assert search_ids(index, operation)[0] == "AZT301"
+    assert search_ids(index, "runcommand") == ["AZT301"]
+    assert search_ids(index, "read", fields=["detections"]) == ["AZT604"]
+
+
+def test_fields_and_limit_restrict_results(index):
+    assert search_ids(index, "virtual machine", fields=["detections"]) == []
+    assert search_ids(index, "adversary", limit=2) == search_ids(index, "adversary")[:2]
+    assert len(search_ids(index, "adversary")) == len(TECHNIQUES)
+    assert search_ids(index, "unknown") == []
@@ -0,0 +1,52 @@
+import json
+import sqlite3
+from contextlib import closing
+
+import pytest
+from synthetic_corpus import get_commit_hash
+
+from sqlite_export import LIST_PROPERTIES
+
+
+@pytest.fixture(scope="module")
+def build_path(corpus, tmp_path_factory, build):
+    build_path = tmp_path_factory.mktemp("sqlite")
+    build(corpus, build_path, "--deterministic", "--sqlite")
+    return build_path
+
+
+def get_expected_counts(objects: list[dict]) -> dict[str, int]:
+    techniques = [obj for obj in objects if obj["type"] == "attack-pattern"]
+    counts = {
+        "metadata": 5,
+        "tactics": sum(obj["type"] == "x-mitre-tactic" for obj in objects),
+        "techniques": len(techniques),
+        "technique_tactics": sum(len(obj["kill_chain_phases"]) for obj in techniques),
+        "subtechniques": sum(
+            obj["type"] == "relationship" and obj["relationship_type"] == "subtechnique-of"
+            for obj in objects
+        ),
+    }
+    for name, table in LIST_PROPERTIES.items():
+        counts[table] = sum(len(obj.get(name, [])) for obj in techniques)
+    return counts
+
+
+@pytest.mark.parametrize("mode", ["strict", "attack_compatible"])
+def test_tables_hold_a_row_per_item(corpus, build_path, mode):
+    with open(build_path / f"atrm_{mode}.json", encoding="utf-8") as f:
+        objects = json.load(f)["objects"]
+    expected = get_expected_counts(objects)
+    assert expected["techniques"]
+    assert expected["subtechniques"]
+
+    with closing(sqlite3.connect(build_path / f"atrm_{mode}.sqlite")) as connection:
+        counts = {
+            table: connection.execute(f"SELECT count(*) FROM {table}").fetchone()[0]  # noqa: S608
+            for table in expected
+        }
+        commit_hash = connection.execute(
+            "SELECT value FROM metadata WHERE name = 'commit_hash'",
+        ).fetchone()[0]
+    assert counts == expected
+    assert commit_hash == get_commit_hash(corpus)
@@ -0,0 +1,122 @@
+import json
+import threading
+from http.client import HTTPConnection
+from http.server import ThreadingHTTPServer
+from urllib.parse import urlencode
+
+import pytest
+
+from taxii_server import TaxiiCollection, TaxiiRequestHandler, get_dates_path
+
+
+@pytest.fixture(scope="module")
+def build_path(corpus, tmp_path_factory, build):
+    build_path = tmp_path_factory.mktemp("taxii")
+    build(corpus, build_path, "--deterministic")
+    return build_path
+
+
+@pytest.fixture
+def bundle_path(build_path, tmp_path):
+    # Each test starts without the dates a previous server recorded
+    bundle_path = tmp_path / "atrm_strict.json"
+    bundle_path.write_bytes((build_path / "atrm_strict.json").read_bytes())
+    return bundle_path
+
+
+@pytest.fixture
+def collection(bundle_path):
+    collection = TaxiiCollection(bundle_path)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), TaxiiRequestHandler)
+    server.collections = {collection.id: collection}
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    collection.port = server.server_port
+    yield collection
+    server.shutdown()
+    server.server_close()
+
+
+def request(collection, endpoint, **query):
+    connection = HTTPConnection("127.0.0.1", collection.port)
+    path = f"/atrm/collections/{collection.id}/{endpoint}/?{urlencode(query)}"
+    connection.request("GET", path)
+    response = connection.getresponse()
+    try:
+        return response.status, json.load(response)
+    finally:
+        connection.close()
+
+
+def get(collection, endpoint, **query):
+    status, body = request(collection, endpoint, **query)
+    assert status == 200, body
+    return body
+
+
+def read_ids(bundle_path):
+    with open(bundle_path, encoding="utf-8") as f:
+        return sorted(obj["id"] for obj in json.load(f)["objects"])
+
+
+def test_pages_list_every_object_once(collection, bundle_path):
+    ids = []
+    page = get(collection, "objects", limit=7)
+    while page["more"]:
+        ids.extend(obj["id"] for obj in page["objects"])
+        page = get(collection, "objects", limit=7, next=page["next"])
+    ids.extend(obj["id"] for obj in page.get("objects", []))
+    assert sorted(ids) == read_ids(bundle_path)
+
+
+@pytest.mark.parametrize("limit", [0, -1])
+def test_limits_below_one_are_rejected(collection, limit):
+    status, body = request(collection, "objects", limit=limit)
+    assert status == 400
+    assert "limit" in body["description"]
+
+
+@pytest.mark.parametrize("endpoint", ["objects", "manifest"])
+def test_empty_pages_have_no_next(collection, endpoint):
+    page = get(collection, endpoint, added_after="2999-01-01T00:00:00Z")
+    assert page == {"more": False}
+
+
+def test_dates_added_survive_a_restart(collection, bundle_path):
+    manifest = get(collection, "manifest")
+    dates = {obj["id"]: obj["date_added"] for obj in manifest["objects"]}
+    assert get_dates_path(bundle_path).exists()
+
+    restarted = TaxiiCollection(bundle_path)
+    assert {entry[1]: entry[4] for entry in restarted.entries} == dates
+
+
+def test_changed_objects_are_added_again(collection, bundle_path):
+    manifest = get(collection, "manifest")
+    last_added = max(obj["date_added"] for obj in manifest["objects"])
+
+    bundle = json.loads(bundle_path.read_text(encoding="utf-8"))
+    technique = next(obj for obj in bundle["objects"] if obj["type"] == "attack-pattern")
+    # modified stays, as when a property changes without a new page commit
+    technique["description"] += " Edited."
+    bundle_path.write_text(json.dumps(bundle, indent=4), encoding="utf-8")
+
+    page = get(collection, "objects", added_after=last_added)
+    assert [obj["id"] for obj in page["objects"]] == [technique["id"]]
+    assert page["objects"][0]["modified"] == technique["modified"]
+
+
+def test_objects_are_found_by_id_and_version(collection, bundle_path):
+    bundle = json.loads(bundle_path.read_text(encoding="utf-8"))
+    first, *others = (obj for obj in bundle["objects"] if obj["type"] == "attack-pattern")
+    second = next(obj for obj in others if obj["modified"] != first["modified"])
+    assert get(collection, f"objects/{first['id']}")["objects"] == [first]
+
+    ids = f"{first['id']},{second['id']},attack-pattern--missing"
+    page = get(collection, "objects", **{"match[id]": ids})
+    assert sorted(obj["id"] for obj in page["objects"]) == sorted([first["id"], second["id"]])
+    page = get(collection, "objects", **{"match[id]": ids, "match[version]": second["modified"]})
+    assert page["objects"] == [second]
+
+    status, _ = request(collection, "objects/attack-pattern--missing")
+    assert status == 404
@@ -0,0 +1,56 @@
+import json
+
+import pytest
+
+from validate import validate_bundle, validate_file
+
+
+@pytest.fixture(scope="module")
+def build_path(corpus, tmp_path_factory, build):
+    build_path = tmp_path_factory.mktemp("validate")
+    build(corpus, build_path, "--deterministic")
+    return build_path
+
+
+@pytest.fixture
+def bundle(build_path):
+    with open(build_path / "atrm_strict.json", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def get_relationship(bundle: dict) -> dict:
+    return next(obj for obj in bundle["objects"] if obj["type"] == "relationship")
+
+
+@pytest.mark.parametrize("mode", ["strict", "attack_compatible"])
+def test_built_bundles_are_valid(build_path, mode):
+    assert validate_file(build_path / f"atrm_{mode}.json") == []
+
+
+def test_relationships_to_missing_objects_are_reported(bundle):
+    relationship = get_relationship(bundle)
+    relationship["target_ref"] = "attack-pattern--00000000-0000-4000-8000-000000000000"
+    assert validate_bundle(bundle) == [
+        f"{relationship['id']}: target_ref {relationship['target_ref']} is not in the bundle",
+    ]
+
+
+def test_subtechniques_of_subtechniques_are_reported(bundle):
+    relationship = get_relationship(bundle)
+    relationship["target_ref"] = relationship["source_ref"]
+    problem = f"{relationship['id']}: target_ref {relationship['source_ref']} is a subtechnique"
+    assert problem in validate_bundle(bundle)
+
+
+def test_removed_techniques_are_reported_where_referenced(bundle):
+    relationship = get_relationship(bundle)
+    bundle["objects"] = [
+        obj for obj in bundle["objects"] if obj["id"] != relationship["source_ref"]
+    ]
+    collection = bundle["objects"][0]
+    assert sorted(validate_bundle(bundle)) == sorted(
+        [
+            f"{relationship['id']}: source_ref {relationship['source_ref']} is not in the bundle",
+            f"{collection['id']}: x_mitre_contents {relationship['source_ref']} is not in the bundle",
+        ],
+    )
@@ -0,0 +1,67 @@
+import os
+import subprocess
+import sys
+import threading
+
+import pytest
+from conftest import SRC_PATH, read_outputs
+from synthetic_corpus import generate_corpus
+
+import watch
+
+
+class Stop(Exception): ...
+
+
+def append_paragraph(page):
+    page.write_text(page.read_text(encoding="utf-8") + "\nAnother paragraph.\n", encoding="utf-8")
+
+
+def test_a_poll_reports_the_changed_page(corpus, monkeypatch):
+    page = corpus / "docs/Execution/AZT301/AZT301.md"
+    original = page.read_text(encoding="utf-8")
+    polls = iter([lambda: append_paragraph(page), lambda: None])
+    monkeypatch.setattr(watch, "DOCS_PATH", corpus / "docs")
+    monkeypatch.setattr(watch.time, "sleep", lambda _: next(polls)())
+    updates = []
+
+    def update(changed):
+        updates.append(changed)
+        raise Stop
+
+    try:
+        with pytest.raises(Stop):
+            watch.watch_atrm(update, interval=0, debounce=0)
+    finally:
+        page.write_text(original, encoding="utf-8")
+    assert updates == [{str(page)}]
+
+
+def test_an_edit_is_rebuilt_as_a_full_build(tmp_path, build):
+    corpus = generate_corpus(tmp_path / "atrm", techniques=2)
+    build_path = tmp_path / "build"
+    build_path.mkdir()
+    env = {**os.environ, "ATRM_PATH": str(corpus), "ATRM_BUILD_PATH": str(build_path)}
+    args = ["watch", "--deterministic", "--no-cache", "--interval", "0.05", "--debounce", "0.05"]
+    process = subprocess.Popen(
+        [sys.executable, str(SRC_PATH / "cli.py"), *args],
+        env=env,
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    # A watcher that stops printing would block readline
+    timer = threading.Timer(120, process.kill)
+    timer.start()
+    try:
+        assert process.stdout.readline().startswith("built ")
+        append_paragraph(corpus / "docs/Execution/AZT301/AZT301.md")
+        assert process.stdout.readline().startswith("rebuilt 1 changed pages")
+    finally:
+        timer.cancel()
+        process.kill()
+        process.wait()
+        process.stdout.close()
+
+    expected = build(corpus, tmp_path / "full", "--no-cache", "--deterministic")
+    outputs = read_outputs(build_path)
+    assert {name: outputs[name] for name in expected} == expected
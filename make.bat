@@ -4,4 +4,5 @@ popd
 
 CALL pipenv install
 mkdir build
-CALL pipenv run python ./src/parse.py
+CALL pipenv run python ./src/cli.py build
+CALL pipenv run python ./src/cli.py validate
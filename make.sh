@@ -4,4 +4,5 @@ popd
 
 pipenv install
 mkdir -p build
-pipenv run python ./src/parse.py
+pipenv run python ./src/cli.py build
+pipenv run python ./src/cli.py validate
@@ -0,0 +1,200 @@
+"""Build bundles for past ATRM commits straight from git objects.
+
+Trees and blobs are read through GitPython's object database, which keeps a
+single ``git cat-file --batch`` process alive for the whole run. Parsed pages
+are keyed by blob SHA, so a page that did not change between two commits is
+parsed only once.
+"""
+
+import warnings
+from collections.abc import Callable, Sequence
+from dataclasses import replace
+
+import git
+
+from constants import ATRM_PATH, ATRM_TACTICS_MAP, Mode, RelationError
+from git_tools import GitHistory, RangeHistory, get_commits
+from metrics import metrics
+from output import ExportWriter
+from parse import parse_atrm, set_dates, without_dates
+from parse_cache import ParseCache
+from parse_tactic import read_tactic_markdown
+from parse_technique import TechniqueRecord, get_techniques_brief_markdown, read_technique_markdown
+
+
+class ParsedPages:
+    """Records parsed from page blobs during a backfill, backed by the parse cache."""
+
+    def __init__(self, cache: ParseCache | None = None) -> None:
+        self.cache = cache
+        self.records = {}
+
+    def get(
+        self,
+        parts: tuple,
+        key: str | None,
+        read: Callable[..., list],
+        *args,
+        load: Callable[[list], list] | None = None,
+    ) -> list:
+        """Return the records of a page, ``load`` converting them from their cached JSON."""
+        if parts not in self.records:
+            value = self.cache.get(key) if self.cache else None
+            if value is None:
+                value = read(*args)
+                if self.cache:
+                    self.cache.put(key, value)
+            self.records[parts] = load(value) if load else value
+        return self.records[parts]
+
+
+def read_blob(blob: git.Blob) -> str:
+    metrics.count("git_objects_read")
+    return blob.data_stream.read().decode("utf-8")
+
+
+def read_tactic_blob(blob: git.Blob, tactic_name: str) -> list:
+    content = read_blob(blob)
+    tactic = read_tactic_markdown(content, tactic_name)
+    return [without_dates(tactic), get_techniques_brief_markdown(content, tactic)]
+
+
+def read_technique_blob(
+    blob: git.Blob,
+    tactic_name: str,
+    techniques_brief_info: dict,
+    tactic_short: str,
+) -> list:
+    technique, relation = read_technique_markdown(
+        read_blob(blob),
+        blob.path,
+        tactic_name,
+        techniques_brief_info,
+        tactic_short,
+    )
+    return [without_dates(technique), without_dates(relation)]
+
+
+def load_technique_page(value: list) -> list:
+    technique, relation = value
+    return [TechniqueRecord(**technique), relation]
+
+
+def get_name(obj: git.Blob | git.Tree) -> str:
+    return obj.name
+
+
+def list_pages(tree: git.Tree) -> dict[str, tuple[git.Blob, list[git.Blob]]]:
+    """Map every tactic folder of a commit to its overview page and technique pages."""
+    docs = tree / "docs"
+    pages = {}
+    for tactic_name in ATRM_TACTICS_MAP:
+        try:
+            tactic_tree = docs / tactic_name
+        except KeyError:
+            continue
+        tactic_pages = sorted(
+            (b for b in tactic_tree.blobs if b.name.endswith(".md")),
+            key=get_name,
+        )
+        if not tactic_pages:
+            continue
+        # In the order of get_technique_files, which git's tree order can differ from
+        technique_pages = [
+            blob
+            for tech_tree in sorted(tactic_tree.trees, key=get_name)
+            for blob in sorted(tech_tree.blobs, key=get_name)
+            if blob.name.endswith(".md")
+        ]
+        pages[tactic_name] = (tactic_pages[0], technique_pages)
+    return pages
+
+
+def read_commit(commit: git.Commit, pages: ParsedPages, history: GitHistory) -> dict:
+    """Return the model ``read_atrm`` would produce with ``commit`` checked out.
+
+    ``history`` holds the dates of ``GitHistory(ATRM_PATH, rev=commit.hexsha)``.
+    """
+    tactics = {}
+    techniques = {}
+    relations = []
+
+    for tactic_name, (tactic_blob, technique_blobs) in list_pages(commit.tree).items():
+        tactic_parts = (tactic_name, tactic_blob.hexsha)
+        tactic_key = pages.cache.get_key(*tactic_parts) if pages.cache else None
+        tactic, techniques_brief = pages.get(
+            tactic_parts,
+            tactic_key,
+            read_tactic_blob,
+            tactic_blob,
+            tactic_name,
+        )
+        tactic = dict(tactic)
+        set_dates(tactic, history, tactic_blob.path)
+        tactics[tactic_name] = tactic
+
+        for blob in technique_blobs:
+            key = pages.cache.get_key(tactic_key, blob.name, blob.hexsha) if pages.cache else None
+            technique, relation = pages.get(
+                (*tactic_parts, blob.name, blob.hexsha),
+                key,
+                read_technique_blob,
+                blob,
+                tactic_name,
+                techniques_brief,
+                tactic["shortname"],
+                load=load_technique_page,
+            )
+            technique = replace(technique)
+            set_dates(technique, history, blob.path)
+            techniques[technique["id"]] = technique
+            if relation:
+                relation = dict(relation)
+                set_dates(relation, history, blob.path)
+                relations.append(relation)
+
+    return {
+        "tactics": tactics,
+        "techniques": techniques,
+        "relations": relations,
+        "created": history.get_first_commit_date(),
+        "commit_hash": commit.hexsha[:7],
+    }
+
+
+@metrics.timer("backfill")
+def backfill_atrm(
+    revs: list[str],
+    cache: ParseCache | None = None,
+    deterministic: bool = False,
+    exporters: Sequence[ExportWriter] = (),
+    validate: bool = False,
+) -> None:
+    """Write ``build/atrm_<mode>_<hash>.json`` for every commit in ``revs``.
+
+    ``revs`` holds commits and ``A..B`` ranges. Commits whose pages cannot be
+    parsed, typically from before the current page layout, are skipped with a
+    warning.
+    """
+    repo = git.Repo(ATRM_PATH)
+    pages = ParsedPages(cache)
+    commits = get_commits(ATRM_PATH, revs)
+    histories = RangeHistory(ATRM_PATH, commits)
+    for commit_hash in commits:
+        commit = repo.commit(commit_hash)
+        try:
+            model = read_commit(commit, pages, histories.get(commit_hash))
+            for mode in Mode:
+                parse_atrm(
+                    mode,
+                    model,
+                    write_latest=False,
+                    validate=validate,
+                    deterministic=deterministic,
+                    exporters=exporters,
+                )
+        except (KeyError, IndexError, RelationError) as e:
+            warnings.warn(f"skipping {commit_hash[:7]}: {e!r}", stacklevel=2)
+
+    if cache:
+        cache.evict()
@@ -0,0 +1,137 @@
+"""Sidecar index of a bundle, and a loader answering lookups without parsing the whole bundle.
+
+``build/atrm_<mode>.index.json`` holds the byte range of every object in
+``build/atrm_<mode>.json`` and maps external ids, tactic shortnames and parent
+techniques to STIX ids. ``BundleIndex`` maps the bundle into memory and parses
+only the objects a lookup returns::
+
+    with BundleIndex("build/atrm_strict.json") as atrm:
+        technique = atrm.get_object_by_external_id("AZT301.2")
+        techniques = atrm.get_techniques_by_tactic("execution")
+
+This module only needs the standard library, so consumers can import it alone.
+"""
+
+import hashlib
+import json
+import mmap
+import re
+from pathlib import Path
+
+from utils import fix_id
+
+INDEX_SUFFIX = ".index.json"
+INDEX_VERSION = 1
+# Objects of a bundle laid out like json.dumps(bundle, indent=4) start and end
+# with a brace alone on a line indented by two levels; nested ones are deeper
+OBJECT_START = re.compile(rb"\n {8}\{\n")
+OBJECT_END = re.compile(rb"\n {8}\}(?=,?\n)")
+
+
+def get_index_path(bundle_path: Path) -> Path:
+    return bundle_path.with_suffix(INDEX_SUFFIX)
+
+
+def get_digest(obj: dict) -> str:
+    """Hash the content of an object, whatever the layout it was read from."""
+    return hashlib.sha256(json.dumps(obj, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def get_external_id(obj: dict) -> str | None:
+    for reference in obj.get("external_references", []):
+        if "external_id" in reference:
+            return reference["external_id"]
+    return None
+
+
+def build_index(bundle_path: Path) -> dict:
+    data = bundle_path.read_bytes()
+    starts = [match.end() - 2 for match in OBJECT_START.finditer(data)]
+    ends = [match.end() for match in OBJECT_END.finditer(data)]
+    objects = {}
+    external_ids = {}
+    tactics = {}
+    subtechniques = {}
+
+    for start, end in zip(starts, ends, strict=True):
+        obj = json.loads(data[start:end])
+        objects[obj["id"]] = [start, end - start]
+        if obj["type"] in ("x-mitre-tactic", "attack-pattern"):
+            external_ids[get_external_id(obj)] = obj["id"]
+        if obj["type"] == "attack-pattern":
+            for phase in obj.get("kill_chain_phases", []):
+                tactics.setdefault(phase["phase_name"], []).append(obj["id"])
+        elif obj["type"] == "relationship" and obj["relationship_type"] == "subtechnique-of":
+            subtechniques.setdefault(obj["target_ref"], []).append(obj["source_ref"])
+
+    return {
+        "version": INDEX_VERSION,
+        "bundle": {"size": len(data), "sha256": hashlib.sha256(data).hexdigest()},
+        "objects": objects,
+        "external_ids": external_ids,
+        "tactics": tactics,
+        "subtechniques": subtechniques,
+    }
+
+
+class BundleIndex:
+    """Objects of one bundle, read through its sidecar index.
+
+    Raises ``ValueError`` when the index was built for another version of the
+    bundle, e.g. when it is opened while a build replaces both files.
+    """
+
+    def __init__(self, bundle_path: Path | str) -> None:
+        bundle_path = Path(bundle_path)
+        with open(get_index_path(bundle_path), encoding="utf-8") as f:
+            index = json.load(f)
+        if index["version"] != INDEX_VERSION:
+            raise ValueError(f"unsupported index version {index['version']}")
+        with open(bundle_path, "rb") as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if hashlib.sha256(self.data).hexdigest() != index["bundle"]["sha256"]:
+            self.close()
+            raise ValueError(f"{bundle_path} does not match its index")
+
+        self.objects = index["objects"]
+        self.external_ids = index["external_ids"]
+        self.tactics = index["tactics"]
+        self.subtechniques = index["subtechniques"]
+        self.parents = {
+            subtechnique: parent
+            for parent, subtechniques in self.subtechniques.items()
+            for subtechnique in subtechniques
+        }
+        self.parsed = {}
+
+    def close(self) -> None:
+        self.data.close()
+
+    def __enter__(self) -> "BundleIndex":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def get_object_by_stix_id(self, stix_id: str) -> dict | None:
+        if stix_id not in self.parsed:
+            if stix_id not in self.objects:
+                return None
+            offset, length = self.objects[stix_id]
+            self.parsed[stix_id] = json.loads(self.data[offset : offset + length])
+        return self.parsed[stix_id]
+
+    def get_object_by_external_id(self, external_id: str) -> dict | None:
+        """Accept ids as ATRM pages write them, e.g. AZT301.2 for AZT301.002."""
+        stix_id = self.external_ids.get(external_id) or self.external_ids.get(fix_id(external_id))
+        return self.get_object_by_stix_id(stix_id) if stix_id else None
+
+    def get_techniques_by_tactic(self, tactic_shortname: str) -> list[dict]:
+        return [self.get_object_by_stix_id(i) for i in self.tactics.get(tactic_shortname, [])]
+
+    def get_subtechniques_of_technique(self, stix_id: str) -> list[dict]:
+        return [self.get_object_by_stix_id(i) for i in self.subtechniques.get(stix_id, [])]
+
+    def get_parent_technique_of_subtechnique(self, stix_id: str) -> dict | None:
+        parent = self.parents.get(stix_id)
+        return self.get_object_by_stix_id(parent) if parent else None
@@ -0,0 +1,488 @@
+"""Command line entry point of the ATRM STIX tools.
+
+    python src/cli.py build [--since COMMIT | --backfill REV ...]
+    python src/cli.py validate [BUNDLE ...]
+    python src/cli.py diff OLD [NEW]
+    python src/cli.py export {index,sqlite,search-index,navigator,matrix} ...
+    python src/cli.py merge ENTERPRISE
+    python src/cli.py watch [--interval SECONDS]
+    python src/cli.py serve [--port PORT]
+
+Importing stix2, mitreattack, marko and git takes seconds, so this module only
+imports the standard library and light modules of its own, and each command
+imports what it runs. ``--help``, ``--version``, ``validate`` and a
+``build --if-changed`` with nothing to build never load the build pipeline.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
+import tracemalloc
+from collections.abc import Sequence
+from pathlib import Path
+
+from constants import ATRM_PATH, ATRM_VERSION, ATTACK_SPEC_VERSION, BUILD_PATH, LINK_MODES, Mode
+from metrics import PROFILE_NAME, REPORT_NAME, metrics
+from parse_cache import CACHE_SIZE, ParseCache
+
+# The bundle merged into enterprise ATT&CK by merge
+MERGED_NAME = f"atrm_{Mode.ATTACK_COMPATIBLE.name.lower()}"
+
+
+def get_names() -> list[str]:
+    return [f"atrm_{mode.name.lower()}" for mode in Mode]
+
+
+def get_exporter(export_format: str, link: str, scores_path: Path | None = None):
+    if export_format in ("navigator", "matrix"):
+        from navigator import MatrixWriter, NavigatorWriter, load_scores
+
+        writer_class = NavigatorWriter if export_format == "navigator" else MatrixWriter
+        scores = load_scores(scores_path) if scores_path else None
+        return writer_class(link=link, scores=scores)
+    if export_format == "sqlite":
+        from sqlite_export import SqliteWriter
+
+        return SqliteWriter(link=link)
+    from search_index import SearchIndexWriter
+
+    return SearchIndexWriter(link=link)
+
+
+def get_exporters(args: argparse.Namespace) -> list:
+    exporters = []
+    if args.sqlite:
+        exporters.append(get_exporter("sqlite", args.link))
+    if args.search_index:
+        exporters.append(get_exporter("search-index", args.link))
+    if args.navigator:
+        exporters.append(get_exporter("navigator", args.link, args.scores))
+    if args.matrix:
+        exporters.append(get_exporter("matrix", args.link, args.scores))
+    return exporters
+
+
+def get_merger(args: argparse.Namespace):
+    if not args.merge_enterprise:
+        return None
+    if args.backfill:
+        sys.exit("--merge-enterprise only merges the current build, not past ones")
+    from merge import MergeWriter
+
+    return MergeWriter(args.merge_enterprise, link=args.link)
+
+
+def is_built(commit_hash: str, exporters: Sequence, merger=None) -> bool:
+    from output import BundleWriter
+
+    writers = (BundleWriter(), *exporters)
+    paths = [writer.get_path(name, commit_hash) for writer in writers for name in get_names()]
+    if merger:
+        paths.append(merger.get_path(MERGED_NAME, commit_hash))
+    return all(path.exists() for path in paths)
+
+
+def check_previous_build(writer, commit_hash: str) -> None:
+    for name in get_names():
+        path = writer.get_path(name, commit_hash)
+        if not path.exists():
+            sys.exit(f"no {path} to update: build commit {commit_hash} first or drop --since")
+
+
+def build(args: argparse.Namespace) -> None:
+    exporters = get_exporters(args)
+    merger = get_merger(args)
+    if args.if_changed and not (args.since or args.backfill):
+        from git_tools import get_last_commit_hash
+
+        if is_built(get_last_commit_hash(ATRM_PATH), exporters, merger):
+            return
+
+    from output import BundleWriter, write_atomic
+
+    if args.profile:
+        metrics.start_profiling()
+    if args.trace_memory:
+        tracemalloc.start()
+    cache = None if args.no_cache else ParseCache(max_size=args.cache_size * 1024 * 1024)
+    if cache:
+        metrics.watch_cache("parse", cache)
+    writer = BundleWriter(link=args.link)
+
+    if args.since:
+        from incremental import update_atrm
+
+        check_previous_build(writer, args.since)
+        update_atrm(
+            args.since,
+            cache,
+            writer,
+            args.deterministic,
+            exporters,
+            validate=args.validate,
+        )
+    elif args.backfill:
+        from backfill import backfill_atrm
+
+        backfill_atrm(
+            args.backfill,
+            cache,
+            args.deterministic,
+            exporters,
+            validate=args.validate,
+        )
+    else:
+        from git_tools import GitHistory
+        from parse import parse_atrm, read_atrm
+
+        model = read_atrm(
+            GitHistory(ATRM_PATH),
+            workers=args.workers or os.cpu_count(),
+            cache=cache,
+        )
+        for mode in Mode:
+            parse_atrm(
+                mode,
+                model,
+                writer=writer,
+                validate=args.validate,
+                deterministic=args.deterministic,
+                exporters=exporters,
+            )
+
+    if merger:
+        from git_tools import get_last_commit_hash
+
+        export_bundle(merger, MERGED_NAME, get_last_commit_hash(ATRM_PATH), write_latest=True)
+
+    if args.profile:
+        metrics.stop_profiling(BUILD_PATH / PROFILE_NAME)
+    write_atomic(BUILD_PATH / REPORT_NAME, json.dumps(metrics.get_report(), indent=4))
+
+
+def validate(args: argparse.Namespace) -> None:
+    from validate import get_bundle_paths, validate_file
+
+    paths = args.bundles or get_bundle_paths(BUILD_PATH)
+    if not paths:
+        sys.exit(f"no bundle in {BUILD_PATH}")
+    problems = [f"{path}: {problem}" for path in paths for problem in validate_file(path)]
+    if problems:
+        sys.exit("\n".join(problems))
+
+
+def diff(args: argparse.Namespace) -> None:
+    from delta import DeltaWriter
+
+    writer = DeltaWriter(BUILD_PATH)
+    if args.new_hash:
+        new_hash = args.new_hash
+    else:
+        from git_tools import get_last_commit_hash
+
+        new_hash = get_last_commit_hash(ATRM_PATH)
+    for mode in Mode:
+        writer.write_delta(mode.name.lower(), args.old_hash, new_hash, not args.no_latest)
+
+
+def get_commit_hash(args: argparse.Namespace) -> str:
+    if args.commit_hash:
+        return args.commit_hash
+    from git_tools import get_last_commit_hash
+
+    return get_last_commit_hash(ATRM_PATH)
+
+
+def export_bundle(exporter, name: str, commit_hash: str, write_latest: bool) -> None:
+    """Write another format of a bundle already built, without building it again."""
+    from output import BundleWriter
+
+    path = BundleWriter().get_path(name, commit_hash)
+    if not path.exists():
+        sys.exit(f"no bundle {path}, build it first")
+    with open(path, encoding="utf-8") as f:
+        bundle = json.load(f)
+    exporter.write(name, commit_hash, bundle, write_latest)
+
+
+def export(args: argparse.Namespace) -> None:
+    commit_hash = get_commit_hash(args)
+    if args.format == "index":
+        from output import BundleWriter
+
+        for name in get_names():
+            BundleWriter(link=args.link).write_index(name, commit_hash, not args.no_latest)
+        return
+
+    exporter = get_exporter(args.format, args.link, args.scores)
+    for name in get_names():
+        export_bundle(exporter, name, commit_hash, not args.no_latest)
+
+
+def merge(args: argparse.Namespace) -> None:
+    from merge import MergeWriter
+
+    writer = MergeWriter(args.enterprise_path, link=args.link)
+    export_bundle(writer, MERGED_NAME, get_commit_hash(args), not args.no_latest)
+
+
+def watch(args: argparse.Namespace) -> None:
+    from output import BundleWriter
+    from watch import DOCS_PATH, ModelWatcher, scan, watch_atrm
+
+    snapshot = scan(DOCS_PATH)
+    watcher = ModelWatcher(
+        BundleWriter(link=args.link),
+        cache=None if args.no_cache else ParseCache(),
+        workers=args.workers or os.cpu_count(),
+        deterministic=args.deterministic,
+        exporters=get_exporters(args),
+    )
+    sys.stdout.write(f"built {watcher.commit_hash}, watching {DOCS_PATH}\n")
+    sys.stdout.flush()
+
+    def update(changed: set[str]) -> None:
+        start = time.perf_counter()
+        if watcher.update(changed):
+            milliseconds = (time.perf_counter() - start) * 1000
+            sys.stdout.write(f"rebuilt {len(changed)} changed pages in {milliseconds:.0f} ms\n")
+            sys.stdout.flush()
+
+    with contextlib.suppress(KeyboardInterrupt):
+        watch_atrm(update, args.interval, args.debounce, snapshot)
+
+
+def serve(args: argparse.Namespace) -> None:
+    from taxii_server import serve as serve_taxii
+
+    serve_taxii(args.host, args.port, args.build_path)
+
+
+def add_export_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--sqlite",
+        action="store_true",
+        help="also export every bundle to build/atrm_<mode>.sqlite",
+    )
+    parser.add_argument(
+        "--search-index",
+        action="store_true",
+        help="also write a full-text index of every bundle to build/atrm_<mode>.search.json",
+    )
+    parser.add_argument(
+        "--navigator",
+        action="store_true",
+        help="also write an ATT&CK Navigator layer of every bundle to build/atrm_<mode>.layer.json",
+    )
+    parser.add_argument(
+        "--matrix",
+        action="store_true",
+        help="also write the tactic x technique matrix of every bundle to build/atrm_<mode>.matrix.csv",
+    )
+    parser.add_argument(
+        "--scores",
+        type=Path,
+        metavar="FILE",
+        help="technique scores of the layers and matrices, as JSON or CSV",
+    )
+
+
+def add_build_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "-j",
+        "--workers",
+        type=int,
+        default=1,
+        help="number of processes parsing technique files (0 uses every CPU)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="parse every page instead of reusing records from build/.cache",
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=CACHE_SIZE // (1024 * 1024),
+        help="size limit of the parse cache in MiB (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--link",
+        choices=LINK_MODES,
+        default="copy",
+        help="how the latest bundle is made from the versioned one (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--validate",
+        action="store_true",
+        help="run the stix2 property checks on every object before it is written",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help=f"profile the build with cProfile into build/{PROFILE_NAME}",
+    )
+    parser.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help=f"trace allocations with tracemalloc and add the peak to build/{REPORT_NAME}",
+    )
+    parser.add_argument(
+        "--deterministic",
+        action="store_true",
+        help="date the matrix and collection from git instead of the clock",
+    )
+    parser.add_argument(
+        "--merge-enterprise",
+        type=Path,
+        metavar="BUNDLE",
+        help="also merge the ATT&CK compatible bundle into this enterprise ATT&CK bundle",
+    )
+    parser.add_argument(
+        "--if-changed",
+        action="store_true",
+        help="do nothing if build/ already holds the outputs of the current ATRM commit",
+    )
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument(
+        "--since",
+        metavar="COMMIT",
+        help="patch build/atrm_<mode>_<COMMIT>.json with the pages changed since that commit",
+    )
+    source.add_argument(
+        "--backfill",
+        nargs="+",
+        metavar="REV",
+        help="build bundles for past commits or A..B ranges from git objects",
+    )
+
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="atrm", description="Build and serve ATRM STIX data")
+    parser.add_argument(
+        "--version",
+        action="version",
+        version=f"%(prog)s {ATRM_VERSION} (ATT&CK spec {ATTACK_SPEC_VERSION})",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = commands.add_parser("build", help="build the STIX bundles")
+    add_build_arguments(build_parser)
+    add_export_arguments(build_parser)
+    build_parser.set_defaults(run=build)
+
+    validate_parser = commands.add_parser("validate", help="check the references of bundles")
+    validate_parser.add_argument(
+        "bundles",
+        nargs="*",
+        type=Path,
+        metavar="BUNDLE",
+        help="bundles to check (default: every bundle in build/)",
+    )
+    validate_parser.set_defaults(run=validate)
+
+    diff_parser = commands.add_parser("diff", help="write delta bundles between two builds")
+    diff_parser.add_argument("old_hash", metavar="OLD", help="commit of the earlier build")
+    diff_parser.add_argument(
+        "new_hash",
+        metavar="NEW",
+        nargs="?",
+        help="commit of the later build (default: the current ATRM commit)",
+    )
+    diff_parser.add_argument(
+        "--no-latest",
+        action="store_true",
+        help="do not update build/atrm_<mode>.delta.json",
+    )
+    diff_parser.set_defaults(run=diff)
+
+    export_parser = commands.add_parser("export", help="write another format of built bundles")
+    export_parser.add_argument(
+        "format",
+        choices=("index", "sqlite", "search-index", "navigator", "matrix"),
+    )
+    export_parser.add_argument(
+        "commit_hash",
+        metavar="COMMIT",
+        nargs="?",
+        help="commit of the bundles (default: the current ATRM commit)",
+    )
+    export_parser.add_argument("--link", choices=LINK_MODES, default="copy")
+    export_parser.add_argument(
+        "--no-latest",
+        action="store_true",
+        help="only write the file of COMMIT, not build/atrm_<mode>.<format>",
+    )
+    export_parser.add_argument(
+        "--scores",
+        type=Path,
+        metavar="FILE",
+        help="technique scores of navigator layers and matrices, as JSON or CSV",
+    )
+    export_parser.set_defaults(run=export)
+
+    merge_parser = commands.add_parser(
+        "merge",
+        help="merge the ATT&CK compatible bundle into an enterprise ATT&CK bundle",
+    )
+    merge_parser.add_argument(
+        "enterprise_path",
+        type=Path,
+        metavar="ENTERPRISE",
+        help="enterprise-attack.json, e.g. from github.com/mitre-attack/attack-stix-data",
+    )
+    merge_parser.add_argument(
+        "commit_hash",
+        metavar="COMMIT",
+        nargs="?",
+        help="commit of the ATRM bundle (default: the current ATRM commit)",
+    )
+    merge_parser.add_argument("--link", choices=LINK_MODES, default="copy")
+    merge_parser.add_argument(
+        "--no-latest",
+        action="store_true",
+        help="only write the file of COMMIT, not build/atrm_attack_compatible.enterprise.json",
+    )
+    merge_parser.set_defaults(run=merge)
+
+    watch_parser = commands.add_parser(
+        "watch",
+        help="rebuild the bundles whenever a page of ATRM_PATH/docs changes",
+    )
+    watch_parser.add_argument(
+        "--interval",
+        type=float,
+        default=0.5,
+        help="seconds between two scans of the docs (default: %(default)s)",
+    )
+    watch_parser.add_argument(
+        "--debounce",
+        type=float,
+        default=0.2,
+        help="seconds the docs must stay unchanged before a rebuild (default: %(default)s)",
+    )
+    watch_parser.add_argument("-j", "--workers", type=int, default=1)
+    watch_parser.add_argument("--no-cache", action="store_true")
+    watch_parser.add_argument("--link", choices=LINK_MODES, default="copy")
+    watch_parser.add_argument("--deterministic", action="store_true")
+    add_export_arguments(watch_parser)
+    watch_parser.set_defaults(run=watch)
+
+    serve_parser = commands.add_parser("serve", help="serve the bundles over TAXII 2.1")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8000)
+    serve_parser.add_argument("--build-path", type=Path, default=BUILD_PATH)
+    serve_parser.set_defaults(run=serve)
+    return parser
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    args = get_parser().parse_args(argv)
+    args.run(args)
+
+
+if __name__ == "__main__":
+    main()
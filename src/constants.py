@@ -1,8 +1,16 @@
+import os
 from enum import Enum
 from pathlib import Path
 from typing import Literal
 
-ATRM_PATH = Path(__file__).parent.parent / "ms-matrix" / "Azure-Threat-Research-Matrix"
+# Both can be pointed elsewhere, e.g. at a synthetic corpus in benchmarks/
+ATRM_PATH = Path(
+    os.environ.get(
+        "ATRM_PATH",
+        Path(__file__).parent.parent / "ms-matrix" / "Azure-Threat-Research-Matrix",
+    ),
+)
+BUILD_PATH = Path(os.environ.get("ATRM_BUILD_PATH", Path(__file__).parent.parent / "build"))
 ATRM_TACTICS_MAP = {
     "Reconnaissance": "AZTA100",
     "InitialAccess": "AZTA200",
@@ -16,6 +24,8 @@ ATRM_VERSION = "0.1"
 ATTACK_SPEC_VERSION = "2.1.0"
 ATRM_PLATFORM = "Azure AD"
 CREATOR_IDENTITY = "identity--5dcf0a7a-875b-470b-8a01-7c6a84c5e68e"
+# How the latest build artifacts are made from the versioned ones, see output.OutputWriter
+LINK_MODES = ("copy", "hardlink", "reflink")
 
 
 class Mode(Enum):
@@ -31,6 +41,10 @@ DEFAULT_MODE = Mode.ATTACK_COMPATIBLE
 class UnexpectedMode(Exception): ...
 
 
+# A relation between techniques of which one has no page
+class RelationError(ValueError): ...
+
+
 def get_collection_id(mode: ModeEnumAttribute = DEFAULT_MODE) -> str:
     match mode:
         case Mode.STRICT:
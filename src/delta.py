@@ -0,0 +1,84 @@
+"""Write what changed between two builds of a bundle, for importers that only want updates.
+
+``build/atrm_<mode>_<old>_<new>.delta.json`` is a bundle of the objects added or
+modified since ``atrm_<mode>_<old>.json``, and ``.delta.manifest.json`` lists
+their ids with those of objects revoked or removed. Objects are matched by id
+and compared by ``modified`` and content, as some properties, like the brief of
+a technique taken from its tactic's page, change without their ``modified``.
+
+    python src/delta.py 9550f4e 3989a36
+"""
+
+import json
+import sys
+from pathlib import Path
+
+from bundle_index import get_digest
+from metrics import metrics
+from output import OutputWriter, serialize_bundle, write_atomic
+
+
+def load_objects(path: Path) -> list[dict]:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)["objects"]
+
+
+@metrics.timer("delta")
+def get_delta(old_objects: list[dict], new_objects: list[dict]) -> tuple[list[dict], dict]:
+    """Return the objects of ``new_objects`` that are new or changed, and the ids of every change."""
+    # id -> (digest, revoked) of the old build
+    old_versions = {obj["id"]: (get_digest(obj), obj.get("revoked", False)) for obj in old_objects}
+    changed = []
+    manifest = {"added": [], "modified": [], "revoked": [], "removed": []}
+    for obj in new_objects:
+        old_version = old_versions.pop(obj["id"], None)
+        if old_version is None:
+            manifest["added"].append(obj["id"])
+        elif old_version[0] != get_digest(obj):
+            manifest["modified"].append(obj["id"])
+            if obj.get("revoked", False) and not old_version[1]:
+                manifest["revoked"].append(obj["id"])
+        else:
+            continue
+        changed.append(obj)
+    # What is left of the old build is gone from the new one
+    manifest["removed"] = list(old_versions)
+    return changed, manifest
+
+
+class DeltaWriter(OutputWriter):
+    """Delta bundles, laid out like the bundles they are taken from."""
+
+    suffix = ".delta.json"
+
+    def serialize(self, bundle: dict) -> str:
+        return serialize_bundle(bundle)
+
+    def get_manifest_path(self, name: str, commit_hash: str | None = None) -> Path:
+        return self.get_path(name, commit_hash).with_suffix(".manifest.json")
+
+    def write_delta(
+        self,
+        mode_name: str,
+        old_hash: str,
+        new_hash: str,
+        write_latest: bool = True,
+    ) -> dict:
+        name = f"atrm_{mode_name}"
+        changed, manifest = get_delta(
+            load_objects(self.path / f"{name}_{old_hash}.json"),
+            load_objects(self.path / f"{name}_{new_hash}.json"),
+        )
+        manifest = {"from": old_hash, "to": new_hash, **manifest}
+        delta_hash = f"{old_hash}_{new_hash}"
+        self.write(name, delta_hash, {"type": "bundle", "objects": changed}, write_latest)
+        write_atomic(self.get_manifest_path(name, delta_hash), json.dumps(manifest, indent=4))
+        if write_latest:
+            write_atomic(self.get_manifest_path(name), json.dumps(manifest, indent=4))
+        return manifest
+
+
+if __name__ == "__main__":
+    from cli import main
+
+    main(["diff", *sys.argv[1:]])
@@ -1,29 +1,142 @@
+import os
+from collections.abc import Iterator
 from datetime import datetime
+from pathlib import Path
 
 import git
 
+from metrics import metrics
 
-def get_first_commit_date(repo_path: str) -> str:
+COMMIT_MARKER = "\x01"
+
+
+def read_log(repo_path: str, *args: str) -> Iterator[tuple[str, list[str], datetime, list[str]]]:
+    """Yield the hash, parents, date and changed paths of each commit of ``git log args``."""
+    metrics.count("git_commands")
     repo = git.Repo(repo_path)
-    return list(repo.iter_commits(paths="LICENSE"))[-1].committed_datetime
+    with metrics.stage("git.history"):
+        output = repo.git.log(
+            *args,
+            "--no-renames",
+            "--name-status",
+            "-z",
+            f"--format={COMMIT_MARKER}%H %P %cI",
+        )
+    commit = None
+    expect_path = False
+    for token in output.split("\0"):
+        token = token.lstrip("\n")
+        if expect_path:
+            commit[3].append(token)
+            expect_path = False
+        elif token.startswith(COMMIT_MARKER):
+            if commit:
+                yield commit
+            commit_hash, *parents, committed_date = token[1:].split()
+            commit = (commit_hash, parents, datetime.fromisoformat(committed_date), [])
+        elif token:
+            expect_path = True
+    if commit:
+        yield commit
 
 
-def get_last_commit_hash(repo_path: str) -> str:
+class GitHistory:
+    """Creation and modification dates of every path, read with a single ``git log`` pass.
+
+    ``dates`` gives the (created, modified) maps instead, as ``RangeHistory`` does.
+    """
+
+    def __init__(self, repo_path: str, rev: str = "HEAD", dates: tuple | None = None) -> None:
+        self.repo_path = repo_path
+        if dates:
+            self.created, self.modified = dates
+            return
+        self.created: dict[str, datetime] = {}
+        self.modified: dict[str, datetime] = {}
+        for _, _, committed_datetime, paths in read_log(repo_path, rev):
+            for path in paths:
+                # `git log` lists newest commits first, so the first hit is the
+                # modification date and the last one is the creation date.
+                self.modified.setdefault(path, committed_datetime)
+                self.created[path] = committed_datetime
+
+    def relative_path(self, file_path: str) -> str:
+        path = Path(file_path)
+        if path.is_absolute():
+            path = Path(os.path.relpath(path, self.repo_path))
+        return path.as_posix()
+
+    def get_creation_date(self, file_path: str) -> datetime:
+        return self.created.get(self.relative_path(file_path))
+
+    def get_modification_date(self, file_path: str) -> datetime:
+        return self.modified.get(self.relative_path(file_path))
+
+    def get_first_commit_date(self) -> datetime:
+        return self.get_creation_date("LICENSE")
+
+
+class RangeHistory:
+    """The ``GitHistory`` of each of many commits, read with a single ``git log`` pass."""
+
+    def __init__(self, repo_path: str, commits: list[str]) -> None:
+        self.repo_path = repo_path
+        # --date-order lists every commit before its parents
+        log = list(read_log(repo_path, "--date-order", *commits))
+        # Bit i of a commit's mask is set if the i-th commit of the log is an ancestor of it
+        self.ancestors: dict[str, int] = {}
+        for i, (commit_hash, parents, _, _) in reversed(list(enumerate(log))):
+            mask = 1 << i
+            for parent in parents:
+                mask |= self.ancestors[parent]
+            self.ancestors[commit_hash] = mask
+        self.changes: dict[str, list[tuple[int, datetime]]] = {}
+        for i, (_, _, committed_datetime, paths) in enumerate(log):
+            for path in paths:
+                self.changes.setdefault(path, []).append((i, committed_datetime))
+
+    def get(self, commit_hash: str) -> GitHistory:
+        """Return the dates ``GitHistory(repo_path, rev=commit_hash)`` reads."""
+        mask = self.ancestors[commit_hash]
+        created = {}
+        modified = {}
+        for path, changes in self.changes.items():
+            dates = [committed_datetime for i, committed_datetime in changes if mask >> i & 1]
+            if dates:
+                modified[path] = dates[0]
+                created[path] = dates[-1]
+        return GitHistory(self.repo_path, dates=(created, modified))
+
+
+def get_changed_files(repo_path: str, old_rev: str, new_rev: str) -> dict[str, str]:
+    """Map every path changed between two revisions to its status (A, M, D or T)."""
+    metrics.count("git_commands")
     repo = git.Repo(repo_path)
-    return repo.commit("main").hexsha[:7]
+    output = repo.git.diff(old_rev, new_rev, "--no-renames", "--name-status", "-z")
+    tokens = output.split("\0")
+    return dict(zip(tokens[1::2], tokens[0::2]))
 
 
-def get_file_creation_date(repo_path: str, file_path: str) -> datetime:
+def get_file_content(repo_path: str, rev: str, file_path: str) -> str:
+    metrics.count("git_commands")
     repo = git.Repo(repo_path)
-    commits = list(repo.iter_commits(paths=file_path))
-    if commits and len(commits):
-        return commits[-1].committed_datetime
-    return None
+    return repo.git.show(f"{rev}:{file_path}", strip_newline_in_stdout=False)
 
 
-def get_file_modification_date(repo_path: str, file_path: str) -> datetime:
+def get_commits(repo_path: str, revs: list[str]) -> list[str]:
+    """Expand commits and ``A..B`` ranges into full hashes, oldest first within a range."""
+    metrics.count("git_commands")
     repo = git.Repo(repo_path)
-    commits = list(repo.iter_commits(paths=file_path))
-    if commits and len(commits):
-        return commits[0].committed_datetime
-    return None
+    commits = []
+    for rev in revs:
+        if ".." in rev:
+            commits.extend(repo.git.rev_list("--reverse", rev).split())
+        else:
+            commits.append(repo.git.rev_parse("--verify", f"{rev}^{{commit}}"))
+    return list(dict.fromkeys(commits))
+
+
+def get_last_commit_hash(repo_path: str) -> str:
+    metrics.count("git_commands")
+    repo = git.Repo(repo_path)
+    return repo.commit("main").hexsha[:7]
@@ -0,0 +1,407 @@
+"""Patch a previous ATRM build with the pages changed upstream since its commit."""
+
+import json
+from collections.abc import Sequence
+from contextlib import ExitStack
+from datetime import datetime
+from pathlib import Path, PurePosixPath
+
+from mitreattack.stix20.custom_attack_objects import Matrix, Tactic
+from stix2 import Identity
+
+from constants import ATRM_PATH, ATRM_TACTICS_MAP, DEFAULT_MODE, Mode, ModeEnumAttribute
+from custom_atrm_objects import Collection, ObjectRef, Relationship, Technique
+from git_tools import GitHistory, get_changed_files, get_file_content, get_last_commit_hash
+from markdown_tools import markdown_to_json
+from metrics import metrics
+from output import (
+    BundleWriter,
+    ExportWriter,
+    get_hashed_pair,
+    get_property_indices,
+    serialize_pretty,
+    split_bundle,
+)
+from parse import (
+    build_relationship,
+    get_tactic_file,
+    get_technique_files,
+    read_tactic_page,
+    set_dates,
+)
+from parse_cache import ParseCache
+from parse_tactic import build_tactic
+from parse_technique import build_technique, read_technique
+from stix_dicts import (
+    StixDict,
+    load_object,
+    make_object,
+    serialize_timestamp,
+    validate_object,
+)
+from utils import create_uuid_from_string, fix_id
+
+OBJECT_ORDER = ("x-mitre-collection", "x-mitre-tactic", "attack-pattern", "relationship")
+# Objects made from pages, whose dates come from git
+PAGE_TYPES = OBJECT_ORDER[1:]
+TACTIC_IDS = list(ATRM_TACTICS_MAP.values())
+# Class of each type of object, and if parse_atrm allows custom properties on it
+STIX_CLASSES = {
+    "x-mitre-collection": (Collection, False),
+    "x-mitre-tactic": (Tactic, False),
+    "attack-pattern": (Technique, False),
+    "relationship": (Relationship, False),
+    "x-mitre-matrix": (Matrix, True),
+    "identity": (Identity, True),
+}
+
+
+def get_technique_ref(technique_id: str) -> str:
+    return "attack-pattern--" + str(
+        create_uuid_from_string(f"microsoft.atrm.technique.{technique_id}"),
+    )
+
+
+def get_deleted_technique_ref(previous_hash: str, file_path: str) -> str:
+    json_content = markdown_to_json(get_file_content(ATRM_PATH, previous_hash, file_path))
+    atrm_id = json_content["h1"][0]["_value"].split(" - ")[0]
+    return get_technique_ref(fix_id(atrm_id))
+
+
+def get_page_positions() -> dict[tuple[str, str], int]:
+    """Map the (tactic folder, page name) of every technique page to its rank in ``read_atrm``."""
+    positions = {}
+    for tactic_name in ATRM_TACTICS_MAP:
+        for tech_file_path in get_technique_files(tactic_name):
+            positions.setdefault((tactic_name, Path(tech_file_path).stem), len(positions))
+    return positions
+
+
+def get_page_key(technique: dict) -> tuple[str, str]:
+    # Technique urls end with <tactic folder>/<technique>/<page name>
+    parts = technique["external_references"][0]["url"].rsplit("/", 3)
+    return parts[1], parts[3]
+
+
+def to_json(stix_object) -> StixDict:
+    """Return ``stix_object`` as ``load_stix_dict`` reads it back from a bundle."""
+    return load_stix_dict(json.loads(serialize_pretty(stix_object)))
+
+
+def to_stix_dict(obj: dict, **kwargs) -> StixDict:
+    """Make ``obj`` again as the build functions of ``parse_atrm`` did, updated with ``kwargs``."""
+    stix_class, allow_custom = STIX_CLASSES[obj["type"]]
+    return make_object(stix_class, allow_custom=allow_custom, **{**obj, **kwargs})
+
+
+def load_stix_dict(obj: dict) -> StixDict:
+    """Read ``obj`` from a bundle as ``to_stix_dict`` would, leaving its values serialized."""
+    stix_class, allow_custom = STIX_CLASSES[obj["type"]]
+    return load_object(stix_class, allow_custom, **obj)
+
+
+def get_head(collection: StixDict) -> StixDict:
+    # The stand-in a bundle is opened with, see BundleStream
+    contents = [
+        make_object(
+            ObjectRef,
+            object_ref=collection["id"],
+            object_modified=collection["modified"],
+        ),
+    ]
+    return to_json(to_stix_dict(collection, x_mitre_contents=contents))
+
+
+def read_bundle(path: Path) -> tuple[dict[str, StixDict], dict[str, tuple], dict]:
+    """Read a bundle for ``write_bundle`` to reuse.
+
+    Return its objects by id, the text and key indices of each, and the key
+    indices of the whole bundle as ``BundleStream`` ranked them.
+    """
+    text = path.read_text(encoding="utf-8")
+    objects = [load_stix_dict(obj) for obj in json.loads(text)["objects"]]
+    indices = get_property_indices(get_head(objects[0]), pair=get_hashed_pair)
+    serialized = {}
+    for obj, obj_text in zip(objects, split_bundle(text), strict=True):
+        own_indices = get_property_indices(obj, pair=get_hashed_pair)
+        if obj is not objects[0]:
+            for pair, index in own_indices.items():
+                indices.setdefault(pair, index)
+        serialized[obj["id"]] = obj_text, own_indices
+    return {obj["id"]: obj for obj in objects}, serialized, indices
+
+
+def group_changes(changes: dict[str, str]) -> tuple[set, set, set]:
+    """Split changed docs into tactics with a new overview page, edited and deleted technique pages."""
+    tactic_names = set()
+    technique_files = set()
+    deleted_files = set()
+    for file_path, status in changes.items():
+        parts = PurePosixPath(file_path).parts
+        if parts[0] != "docs" or not file_path.endswith(".md") or parts[1] not in ATRM_TACTICS_MAP:
+            continue
+        if len(parts) == 3:
+            tactic_names.add(parts[1])
+        elif status == "D":
+            deleted_files.add(file_path)
+        else:
+            technique_files.add(file_path)
+    return tactic_names, technique_files, deleted_files
+
+
+@metrics.timer("incremental")
+def update_atrm(
+    previous_hash: str,
+    cache: ParseCache | None = None,
+    writer: BundleWriter | None = None,
+    deterministic: bool = False,
+    exporters: Sequence[ExportWriter] = (),
+    validate: bool = False,
+) -> None:
+    """Build the bundles for the current ATRM commit from the ones built for previous_hash.
+
+    Only pages changed between the two commits are read, once for every mode.
+    Objects of other pages keep their text in the previous bundles.
+    ``deterministic`` dates the matrix and collection and ``validate`` checks
+    every object as ``parse_atrm`` does.
+    """
+    writer = writer or BundleWriter()
+    previous = {
+        mode: read_bundle(writer.get_path(f"atrm_{mode.name.lower()}", previous_hash))
+        for mode in Mode
+    }
+    commit_hash = get_last_commit_hash(ATRM_PATH)
+    # Dates are the same in every mode
+    changes = read_changes(previous_hash, commit_hash, previous[DEFAULT_MODE][0], cache)
+    positions = get_page_positions()
+
+    for mode, bundle in previous.items():
+        objects = dict(bundle[0])
+        patch_objects(objects, changes, mode)
+        write_bundle(
+            f"atrm_{mode.name.lower()}",
+            commit_hash,
+            finalize_objects(objects, deterministic, positions),
+            writer,
+            exporters,
+            validate,
+            bundle,
+        )
+
+
+def read_changes(
+    previous_hash: str,
+    commit_hash: str,
+    objects: dict[str, dict],
+    cache: ParseCache | None = None,
+) -> dict:
+    """Read the pages changed between the two commits into records of every mode.
+
+    A changed tactic overview page rereads every technique of that tactic, since
+    their names and briefs come from its table. Dates the partial history cannot
+    know come from ``objects``, those of the previous build.
+    """
+    changes = get_changed_files(ATRM_PATH, previous_hash, commit_hash)
+    tactic_names, technique_files, deleted_files = group_changes(changes)
+    # Dates of pages touched since the previous build; older pages keep theirs
+    history = GitHistory(ATRM_PATH, rev=f"{previous_hash}..{commit_hash}")
+
+    technique_paths = {str(ATRM_PATH / file_path) for file_path in technique_files}
+    for tactic_name in tactic_names:
+        technique_paths.update(get_technique_files(tactic_name))
+
+    tactics = []
+    tactic_pages = {}
+    for tactic_name in {PurePosixPath(f).parts[1] for f in technique_files} | tactic_names:
+        tactic, techniques_brief, _ = read_tactic_page(
+            get_tactic_file(tactic_name),
+            tactic_name,
+            history,
+            cache,
+        )
+        tactic_pages[tactic_name] = (tactic, techniques_brief)
+        if tactic_name in tactic_names:
+            keep_dates(tactic, objects.get(tactic["stix_id"]))
+            tactics.append(tactic)
+
+    # Pages that went away or changed may have carried an id that is gone now
+    previous_refs = {
+        get_deleted_technique_ref(previous_hash, file_path)
+        for file_path, status in changes.items()
+        if file_path in deleted_files or (file_path in technique_files and status != "A")
+    }
+    relationships = {
+        obj["source_ref"]: obj for obj in objects.values() if obj["type"] == "relationship"
+    }
+
+    techniques = []
+    full_history = None
+    for tech_file_path in sorted(technique_paths):
+        tactic_name = PurePosixPath(tech_file_path).relative_to(ATRM_PATH).parts[1]
+        tactic, techniques_brief = tactic_pages[tactic_name]
+        technique, relation = read_technique(
+            tech_file_path,
+            tactic_name,
+            techniques_brief,
+            tactic["shortname"],
+        )
+        previous = objects.get(technique["stix_id"])
+        file_path = PurePosixPath(tech_file_path).relative_to(ATRM_PATH).as_posix()
+        page_history = history
+        if previous is None and changes.get(file_path) != "A":
+            # A page predating the previous build under a new id: its creation is outside the range
+            full_history = full_history or GitHistory(ATRM_PATH, rev=commit_hash)
+            page_history = full_history
+        set_dates(technique, page_history, tech_file_path)
+        set_dates(relation, page_history, tech_file_path)
+        keep_dates(technique, previous)
+        if relation:
+            keep_dates(relation, relationships.get(technique["stix_id"]))
+        techniques.append((technique, relation))
+
+    technique_refs = {technique["stix_id"] for technique, _ in techniques}
+    return {
+        "tactics": tactics,
+        "techniques": techniques,
+        "removed": previous_refs - technique_refs,
+    }
+
+
+def patch_objects(objects: dict[str, StixDict], changes: dict, mode: ModeEnumAttribute) -> None:
+    """Replace the objects of the pages in ``read_changes`` by their ``mode`` build."""
+    for tactic in changes["tactics"]:
+        objects[tactic["stix_id"]] = to_json(build_tactic(tactic, mode))
+
+    relationships = {
+        obj["source_ref"]: obj for obj in objects.values() if obj["type"] == "relationship"
+    }
+    for technique, relation in changes["techniques"]:
+        objects[technique["stix_id"]] = to_json(build_technique(technique, mode))
+
+        relationship = relationships.pop(technique["stix_id"], None)
+        if relationship:
+            del objects[relationship["id"]]
+        if relation:
+            target_ref = get_technique_ref(relation["target"])
+            kwargs = {}
+            if relationship and relationship["target_ref"] == target_ref:
+                kwargs["id"] = relationship["id"]
+            relationship = to_json(
+                build_relationship(relation, technique["stix_id"], target_ref, mode, **kwargs),
+            )
+            objects[relationship["id"]] = relationship
+
+    remove_techniques(objects, relationships, changes["removed"])
+
+
+def remove_techniques(objects: dict, relationships: dict, technique_refs: set) -> None:
+    """Drop techniques whose page is gone, with the relationships from or to them."""
+    for technique_ref in technique_refs:
+        objects.pop(technique_ref, None)
+        for source_ref, relationship in list(relationships.items()):
+            if technique_ref in (source_ref, relationship["target_ref"]):
+                del relationships[source_ref]
+                del objects[relationship["id"]]
+
+
+def keep_dates(record: dict, previous: dict | None) -> None:
+    """Fill in dates the partial history cannot know from the previous build."""
+    if previous:
+        record["created"] = previous["created"]
+        if record["modified"] is None:
+            record["modified"] = previous["modified"]
+
+
+def finalize_objects(
+    objects: dict,
+    deterministic: bool = False,
+    positions: dict[tuple[str, str], int] | None = None,
+) -> list[dict]:
+    """Lay out objects as ``parse_atrm`` does, techniques ranked by page in ``positions``.
+
+    Tactics follow ``ATRM_TACTICS_MAP``, then techniques come in page order and
+    relationships in the order of their source technique, so the bundle is the
+    one a full build of the same commit writes.
+    """
+    positions = positions or {}
+
+    def get_page_position(technique: dict | None) -> int:
+        if technique is None:
+            return len(positions)
+        return positions.get(get_page_key(technique), len(positions))
+
+    def order(obj: dict) -> tuple[int, int]:
+        if obj["type"] not in OBJECT_ORDER:
+            return len(OBJECT_ORDER), 0
+        if obj["type"] == "x-mitre-tactic":
+            position = TACTIC_IDS.index(obj["external_references"][0]["external_id"])
+        elif obj["type"] == "attack-pattern":
+            position = get_page_position(obj)
+        elif obj["type"] == "relationship":
+            position = get_page_position(objects.get(obj["source_ref"]))
+        else:
+            position = 0
+        return OBJECT_ORDER.index(obj["type"]), position
+
+    if deterministic:
+        # Serialized timestamps sort like the dates they stand for
+        modified = max(obj["modified"] for obj in objects.values() if obj["type"] in PAGE_TYPES)
+    else:
+        modified = datetime.now()
+
+    objects = sorted(objects.values(), key=order)
+    collection, *objects = objects
+    tactic_refs = [obj["id"] for obj in objects if obj["type"] == "x-mitre-tactic"]
+
+    for i, obj in enumerate(objects):
+        if obj["type"] == "x-mitre-matrix":
+            objects[i] = to_json(to_stix_dict(obj, tactic_refs=tactic_refs, modified=modified))
+
+    contents = [{"object_ref": obj["id"], "object_modified": obj["modified"]} for obj in objects]
+    collection = load_stix_dict(
+        {
+            **collection,
+            "modified": serialize_timestamp(Collection, "modified", modified),
+            "x_mitre_contents": contents,
+        },
+    )
+    return [collection, *objects]
+
+
+def write_bundle(
+    name: str,
+    commit_hash: str,
+    objects: list[StixDict],
+    writer: BundleWriter,
+    exporters: Sequence[ExportWriter] = (),
+    validate: bool = False,
+    previous: tuple | None = None,
+) -> None:
+    """Stream the objects of ``finalize_objects`` as ``parse_atrm`` does, for the same bytes.
+
+    Objects kept from the ``read_bundle`` of ``previous`` are written with their
+    text there, unless the keys of the new bundle are ranked differently.
+    """
+    previous_objects, serialized, indices = previous or ({}, {}, {})
+    collection, *objects = objects
+    with ExitStack() as streams:
+        stream = streams.enter_context(writer.stream(name, commit_hash, get_head(collection)))
+        exports = [
+            streams.enter_context(exporter.stream(name, commit_hash)) for exporter in exporters
+        ]
+        for obj in objects:
+            if validate:
+                validate_object(obj)
+            if previous_objects.get(obj["id"]) is obj:
+                obj_text, own_indices = serialized[obj["id"]]
+                if stream.write_serialized(obj, obj_text, indices, own_indices):
+                    metrics.count("incremental.objects_reused")
+            else:
+                stream.write(obj)
+            for export in exports:
+                export.write(obj)
+        if validate:
+            validate_object(collection)
+        stream.close(collection)
+        for export in exports:
+            export.close(collection, commit_hash)
@@ -0,0 +1,255 @@
+"""Convert Markdown pages straight from marko's parsed document tree.
+
+``markdown_to_json`` builds the nested dicts the parsers read from
+``html_to_json.convert(gfm(text))`` without rendering and re-parsing HTML.
+Blocks holding raw HTML still take the HTML round trip, since only an HTML
+parser can tell how they nest. Raw HTML whose tags open in one block and close
+in another, like a ``<details>`` around a code fence, can only nest across the
+whole page, so such pages take the round trip whole. Converted pages are kept
+in a small LRU, so a page read by several parse functions is converted once.
+"""
+
+import html
+from collections import OrderedDict
+from html.parser import HTMLParser
+from urllib.parse import quote
+
+import html_to_json
+from marko.ext.gfm import gfm
+
+from metrics import metrics
+from parse_cache import get_blob_sha
+
+TEXT_ELEMENTS = ("RawText", "Literal")
+INLINE_TAGS = {"Emphasis": "em", "StrongEmphasis": "strong", "Strikethrough": "del"}
+LINK_ELEMENTS = ("Link", "AutoLink", "Url")
+RAW_HTML_ELEMENTS = ("HTMLBlock", "InlineHTML")
+URL_SAFE_CHARS = "/#:()*?=%@+,&"
+DOCUMENT_CACHE_SIZE = 256
+VOID_TAGS = frozenset(
+    ("area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "wbr"),
+)
+
+
+def record_value(value: str, json_content: dict) -> None:
+    value = value.strip()
+    if not value:
+        return
+    if "_value" in json_content:
+        json_content["_values"] = [json_content.pop("_value"), value]
+    elif "_values" in json_content:
+        json_content["_values"].append(value)
+    else:
+        json_content["_value"] = value
+
+
+def add_child(json_content: dict, tag: str, attributes: dict | None = None) -> dict:
+    child = {"_attributes": attributes} if attributes else {}
+    json_content.setdefault(tag, []).append(child)
+    return child
+
+
+def unescape(value: str) -> str:
+    # marko escapes text as html.escape(html.unescape(raw)); the HTML parser undoes html.escape
+    return html.unescape(value)
+
+
+def escape_url(url: str) -> str:
+    return quote(unescape(url), safe=URL_SAFE_CHARS)
+
+
+def plain_text(element) -> str:
+    if isinstance(element.children, str):
+        return unescape(element.children)
+    return "".join(plain_text(child) for child in element.children)
+
+
+def needs_html(element) -> bool:
+    if element.get_type() in RAW_HTML_ELEMENTS or hasattr(element, "checked"):
+        return True
+    children = getattr(element, "children", None)
+    return isinstance(children, list) and any(needs_html(child) for child in children)
+
+
+class TagBalance(HTMLParser):
+    """Check that every tag opened in an HTML fragment is closed in it, in order."""
+
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=False)
+        self.open_tags = []
+        self.balanced = True
+
+    def handle_starttag(self, tag: str, attrs: list) -> None:
+        if tag not in VOID_TAGS:
+            self.open_tags.append(tag)
+
+    def handle_startendtag(self, tag: str, attrs: list) -> None:
+        pass
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag not in VOID_TAGS and (not self.open_tags or self.open_tags.pop() != tag):
+            self.balanced = False
+
+
+def is_balanced(html_content: str) -> bool:
+    parser = TagBalance()
+    parser.feed(html_content)
+    parser.close()
+    return parser.balanced and not parser.open_tags
+
+
+def flatten(elements: list) -> list:
+    # Tight list paragraphs render without a <p> of their own
+    flat = []
+    for element in elements:
+        if element.get_type() == "Paragraph" and element._tight:  # noqa: SLF001
+            flat.extend(element.children)
+        else:
+            flat.append(element)
+    return flat
+
+
+def convert_children(elements: list, json_content: dict) -> None:
+    text = ""
+    for element in flatten(elements):
+        kind = element.get_type()
+        if kind in TEXT_ELEMENTS:
+            text += unescape(element.children)
+        elif kind == "LineBreak" and element.soft:
+            text += "\n"
+        else:
+            record_value(text, json_content)
+            text = "\n" if kind == "LineBreak" else ""
+            convert_element(element, json_content)
+    record_value(text, json_content)
+
+
+def convert_element(element, json_content: dict) -> None:  # noqa: PLR0912
+    kind = element.get_type()
+
+    if kind in ("Heading", "SetextHeading"):
+        convert_children(element.children, add_child(json_content, f"h{element.level}"))
+    elif kind == "Paragraph":
+        convert_children(element.children, add_child(json_content, "p"))
+    elif kind == "List":
+        if not element.ordered:
+            child = add_child(json_content, "ul")
+        elif element.start != 1:
+            child = add_child(json_content, "ol", {"start": str(element.start)})
+        else:
+            child = add_child(json_content, "ol")
+        convert_children(element.children, child)
+    elif kind == "ListItem":
+        convert_children(element.children, add_child(json_content, "li"))
+    elif kind == "Quote":
+        convert_children(element.children, add_child(json_content, "blockquote"))
+    elif kind in ("FencedCode", "CodeBlock"):
+        attributes = (
+            {"class": [f"language-{unescape(element.lang)}"]}
+            if getattr(element, "lang", "")
+            else None
+        )
+        code = add_child(add_child(json_content, "pre"), "code", attributes)
+        record_value(element.children[0].children, code)
+    elif kind == "ThematicBreak":
+        add_child(json_content, "hr")
+    elif kind == "Table":
+        table = add_child(json_content, "table")
+        header, *body = element.children
+        convert_children([header], add_child(table, "thead"))
+        if body:
+            convert_children(body, add_child(table, "tbody"))
+    elif kind == "TableRow":
+        convert_children(element.children, add_child(json_content, "tr"))
+    elif kind == "TableCell":
+        attributes = {"align": element.align} if element.align else None
+        convert_children(
+            element.children,
+            add_child(json_content, "th" if element.header else "td", attributes),
+        )
+    elif kind in INLINE_TAGS:
+        convert_children(element.children, add_child(json_content, INLINE_TAGS[kind]))
+    elif kind == "CodeSpan":
+        record_value(element.children, add_child(json_content, "code"))
+    elif kind in LINK_ELEMENTS:
+        attributes = {"href": escape_url(element.dest)}
+        if element.title:
+            attributes["title"] = unescape(element.title)
+        convert_children(element.children, add_child(json_content, "a", attributes))
+    elif kind == "Image":
+        attributes = {"src": escape_url(element.dest), "alt": plain_text(element)}
+        if element.title:
+            attributes["title"] = unescape(element.title)
+        add_child(json_content, "img", attributes)
+    elif kind == "LineBreak":
+        add_child(json_content, "br")
+    elif kind not in ("BlankLine", "LinkRefDef"):
+        convert_children(element.children, json_content)
+
+
+def merge_html(html_content: str, json_content: dict) -> None:
+    for key, value in html_to_json.convert(html_content).items():
+        if key == "_value":
+            record_value(value, json_content)
+        elif key == "_values":
+            for v in value:
+                record_value(v, json_content)
+        else:
+            json_content.setdefault(key, []).extend(value)
+
+
+def convert_markdown(content: str) -> dict:
+    metrics.count("documents_converted")
+    document = gfm.parse(content)
+    renderer = gfm.renderer
+    renderer.root_node = document
+    json_content = {}
+    # The renderer context swaps in marko's charref pattern, which html.unescape relies on
+    with renderer:
+        blocks = [
+            (block, renderer.render(block) if needs_html(block) else None)
+            for block in document.children
+        ]
+        if all(is_balanced(html_content) for _, html_content in blocks if html_content):
+            for block, html_content in blocks:
+                if html_content is None:
+                    convert_element(block, json_content)
+                else:
+                    merge_html(html_content, json_content)
+            return json_content
+    metrics.count("documents_converted_as_html")
+    return html_to_json.convert(gfm(content))
+
+
+class DocumentCache:
+    """In-process LRU of converted pages, keyed by the blob SHA of their content.
+
+    Returned documents are shared between callers and must not be modified.
+    """
+
+    def __init__(self, max_entries: int = DOCUMENT_CACHE_SIZE) -> None:
+        self.max_entries = max_entries
+        self.documents = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, content: str) -> dict:
+        key = get_blob_sha(content.encode())
+        if key in self.documents:
+            self.hits += 1
+            self.documents.move_to_end(key)
+            return self.documents[key]
+        self.misses += 1
+        with metrics.stage("markdown"):
+            json_content = self.documents[key] = convert_markdown(content)
+        if len(self.documents) > self.max_entries:
+            self.documents.popitem(last=False)
+        return json_content
+
+
+document_cache = DocumentCache()
+metrics.watch_cache("documents", document_cache)
+
+
+def markdown_to_json(content: str) -> dict:
+    return document_cache.get(content)
@@ -0,0 +1,210 @@
+"""Merge an ATT&CK compatible build into a local enterprise ATT&CK bundle.
+
+``build/atrm_attack_compatible_<hash>.enterprise.json`` holds every object of
+the enterprise bundle and of the ATRM bundle, under one collection and one
+matrix listing the tactics of both. The enterprise bundle is tens of megabytes,
+so it is parsed one object at a time and written out as it is read; only the
+ATRM objects and the ids written so far are held in memory.
+
+Collisions are resolved through indexes built as the enterprise bundle streams by:
+
+- an object in both bundles is kept in the version with the latest ``modified``;
+- an ATRM tactic with the ``x_mitre_shortname`` of an enterprise tactic is
+  dropped, so ATRM techniques of that phase join the enterprise tactic.
+
+    python src/cli.py merge enterprise-attack.json
+"""
+
+import json
+import re
+from collections.abc import Iterator
+from functools import partial
+from pathlib import Path
+from typing import TextIO
+
+from constants import BUILD_PATH
+from metrics import metrics
+from output import CHUNK_SIZE, ExportWriter, JsonBundleStream, serialize_pretty
+from stix_dicts import StixDict
+from utils import create_uuid_from_string
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+class JsonReader:
+    """Decode the JSON values of a file one at a time, holding about a chunk of it in memory."""
+
+    def __init__(self, f: TextIO) -> None:
+        self.f = f
+        self.buffer = ""
+        self.position = 0
+        self.decoder = json.JSONDecoder()
+
+    def fill(self) -> bool:
+        chunk = self.f.read(CHUNK_SIZE)
+        if not chunk:
+            return False
+        self.buffer = self.buffer[self.position :] + chunk
+        self.position = 0
+        return True
+
+    def peek(self) -> str:
+        """Return the next character that is not whitespace, without consuming it."""
+        while True:
+            self.position = WHITESPACE.match(self.buffer, self.position).end()
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self.fill():
+                raise ValueError("unexpected end of JSON document")
+
+    def expect(self, char: str) -> None:
+        if self.peek() != char:
+            raise ValueError(f"expected {char!r}, got {self.buffer[self.position]!r}")
+        self.position += 1
+
+    def read(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+            except json.JSONDecodeError:
+                # Either invalid or cut at the end of the buffer: retry with more
+                if not self.fill():
+                    raise
+                continue
+            # A number ending the buffer may go on in the next chunk
+            if end == len(self.buffer) and self.fill():
+                continue
+            self.position = end
+            return value
+
+
+def iter_bundle_objects(f: TextIO, bundle: dict) -> Iterator[dict]:
+    """Yield the objects of a bundle file; its other properties are set in ``bundle``."""
+    reader = JsonReader(f)
+    reader.expect("{")
+    while reader.peek() != "}":
+        key = reader.read()
+        reader.expect(":")
+        if key == "objects":
+            reader.expect("[")
+            while reader.peek() != "]":
+                yield reader.read()
+                if reader.peek() == ",":
+                    reader.position += 1
+            reader.position += 1
+        else:
+            bundle[key] = reader.read()
+        if reader.peek() == ",":
+            reader.position += 1
+
+
+def get_merged_id(object_type: str, enterprise_id: str, atrm_id: str) -> str:
+    return f"{object_type}--" + str(
+        create_uuid_from_string(f"microsoft.atrm.merge.{object_type}.{enterprise_id}.{atrm_id}"),
+    )
+
+
+def is_current(obj: dict) -> bool:
+    return not obj.get("revoked") and not obj.get("x_mitre_deprecated")
+
+
+class MergeStream:
+    """Collect the ATRM objects of a bundle, merged with the enterprise bundle on ``close``."""
+
+    def __init__(self, path: Path, enterprise_path: Path) -> None:
+        self.path = path
+        self.enterprise_path = enterprise_path
+        # id -> object of the ATRM bundle
+        self.objects = {}
+
+    def write(self, obj: dict) -> None:
+        if isinstance(obj, StixDict):
+            obj = json.loads(serialize_pretty(obj))
+        self.objects[obj["id"]] = obj
+
+    @metrics.timer("merge")
+    def close(self, collection: dict, commit_hash: str) -> None:
+        if isinstance(collection, StixDict):
+            collection = json.loads(serialize_pretty(collection))
+        objects = self.objects
+        atrm_matrix = next(obj for obj in objects.values() if obj["type"] == "x-mitre-matrix")
+        del objects[atrm_matrix["id"]]
+        # Tens of megabytes, mostly enterprise objects: one per line
+        stream = JsonBundleStream(self.path, pretty=False)
+        # [{"object_ref": ..., "object_modified": ...}] of every object written
+        contents = []
+        # x_mitre_shortname of every enterprise tactic
+        shortnames = set()
+        enterprise_collection = None
+        enterprise_matrix = None
+
+        def write(obj: dict) -> None:
+            stream.write(obj)
+            contents.append({"object_ref": obj["id"], "object_modified": obj["modified"]})
+
+        with open(self.enterprise_path, encoding="utf-8") as f:
+            for obj in iter_bundle_objects(f, {}):
+                if obj["type"] == "x-mitre-collection":
+                    obj.pop("x_mitre_contents", None)
+                    enterprise_collection = obj
+                    continue
+                if obj["type"] == "x-mitre-matrix" and enterprise_matrix is None:
+                    enterprise_matrix = obj
+                    continue
+                if obj["type"] == "x-mitre-tactic" and is_current(obj):
+                    shortnames.add(obj["x_mitre_shortname"])
+                atrm_obj = objects.get(obj["id"])
+                if atrm_obj is not None:
+                    # Both use the same UTC timestamp layout, so they sort as strings
+                    if atrm_obj["modified"] > obj["modified"]:
+                        metrics.count("merge.enterprise_replaced")
+                        continue
+                    del objects[obj["id"]]
+                    metrics.count("merge.atrm_replaced")
+                write(obj)
+
+        tactic_refs = []
+        for obj in objects.values():
+            if obj["type"] == "x-mitre-tactic" and obj["x_mitre_shortname"] in shortnames:
+                metrics.count("merge.tactics_joined")
+                continue
+            if obj["type"] == "x-mitre-tactic":
+                tactic_refs.append(obj["id"])
+            write(obj)
+
+        if enterprise_matrix is None:
+            raise ValueError(f"{self.enterprise_path} has no x-mitre-matrix")
+        # Stable across enterprise releases, so the merged objects get new versions, not ids
+        enterprise_id = (enterprise_collection or enterprise_matrix)["id"]
+        matrix = dict(enterprise_matrix)
+        matrix.update(
+            id=get_merged_id("x-mitre-matrix", enterprise_id, atrm_matrix["id"]),
+            name=f"{enterprise_matrix['name']} and {atrm_matrix['name']}",
+            modified=max(enterprise_matrix["modified"], atrm_matrix["modified"]),
+            tactic_refs=[*enterprise_matrix["tactic_refs"], *tactic_refs],
+        )
+        write(matrix)
+
+        enterprise_collection = enterprise_collection or enterprise_matrix
+        merged = dict(collection)
+        merged.update(
+            id=get_merged_id("x-mitre-collection", enterprise_id, collection["id"]),
+            name=f"{enterprise_collection['name']} and {collection['name']}",
+            modified=max(collection["modified"], enterprise_collection["modified"]),
+            x_mitre_contents=contents,
+        )
+        stream.close(merged)
+
+    def abort(self) -> None:
+        pass
+
+
+class MergeWriter(ExportWriter):
+    """ATRM bundles merged into a local enterprise ATT&CK bundle, see ``MergeStream``."""
+
+    suffix = ".enterprise.json"
+
+    def __init__(self, enterprise_path: Path, path: Path = BUILD_PATH, link: str = "copy") -> None:
+        super().__init__(path, link)
+        self.stream_class = partial(MergeStream, enterprise_path=Path(enterprise_path))
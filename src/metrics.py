@@ -0,0 +1,119 @@
+"""Stage timers and counters for the build, reported as JSON next to the outputs.
+
+Stages nest, and each one reports its inclusive wall time. Work done inside
+worker processes (``parse.py -j``) is only seen through the stage that waits
+for it in the main process.
+"""
+
+import cProfile
+import functools
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+from collections.abc import Callable, Iterable, Iterator
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+REPORT_NAME = "build_report.json"
+PROFILE_NAME = "build_profile.pstats"
+TOP_ALLOCATIONS = 20
+
+
+class Metrics:
+    def __init__(self) -> None:
+        self.started = datetime.now(timezone.utc)
+        self.start_time = time.perf_counter()
+        self.seconds = defaultdict(float)
+        self.calls = Counter()
+        self.counters = Counter()
+        self.caches = {}
+        self.outputs = {}
+        self.profiler = None
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] += time.perf_counter() - start
+            self.calls[name] += 1
+
+    def timer(self, name: str) -> Callable[[Callable], Callable]:
+        """Decorate a function to count its calls as the stage ``name``."""
+
+        def decorator(func: Callable) -> Callable:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.stage(name):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def timed(self, name: str, iterable: Iterable) -> Iterator:
+        """Yield from ``iterable``, counting the time spent producing each item as ``name``."""
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def count(self, name: str, value: int = 1) -> None:
+        self.counters[name] += value
+
+    def output(self, name: str, digest: str, changed: bool) -> None:
+        """Report the sha256 of an output file and whether this build changed it."""
+        self.outputs[name] = {"sha256": digest, "changed": changed}
+        if not changed:
+            self.count("files_unchanged")
+
+    def watch_cache(self, name: str, cache) -> None:
+        """Report the ``hits`` and ``misses`` of ``cache`` under ``name``."""
+        self.caches[name] = cache
+
+    def start_profiling(self) -> None:
+        self.profiler = cProfile.Profile()
+        self.profiler.enable()
+
+    def get_report(self) -> dict:
+        report = {
+            "started": self.started.isoformat(),
+            "seconds": round(time.perf_counter() - self.start_time, 6),
+            "stages": {
+                name: {"seconds": round(seconds, 6), "calls": self.calls[name]}
+                for name, seconds in sorted(self.seconds.items())
+            },
+            "counters": dict(sorted(self.counters.items())),
+            "caches": {
+                name: {"hits": cache.hits, "misses": cache.misses}
+                for name, cache in sorted(self.caches.items())
+            },
+            "outputs": dict(sorted(self.outputs.items())),
+        }
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            report["memory"] = {
+                "current_bytes": current,
+                "peak_bytes": peak,
+                "top": [
+                    {"location": str(stat.traceback), "bytes": stat.size, "blocks": stat.count}
+                    for stat in tracemalloc.take_snapshot().statistics("lineno")[:TOP_ALLOCATIONS]
+                ],
+            }
+        return report
+
+    def stop_profiling(self, path: Path) -> None:
+        """Dump the cProfile stats to ``path``; memory tracing goes on until the report."""
+        if self.profiler:
+            self.profiler.disable()
+            self.profiler.dump_stats(path)
+            self.profiler = None
+
+
+metrics = Metrics()
@@ -0,0 +1,174 @@
+"""ATT&CK Navigator layers and a flat tactic x technique matrix of the bundles.
+
+``build/atrm_<mode>.layer.json`` opens in the Navigator, under the domain of its
+mode, and ``build/atrm_<mode>.matrix.csv`` lists the matrix one technique per
+row. Both are filled from the objects of the bundle as they are written, and
+can be regenerated from a built bundle without building it again::
+
+    python src/cli.py export navigator --scores coverage.json
+
+A score file maps technique ids to numbers, as JSON (``{"AZT301.2": 3}``) or as
+CSV rows of ``technique_id,score``. The layer then colors techniques by score,
+for example by the number of detections covering each.
+"""
+
+import csv
+import io
+import json
+from functools import partial
+from pathlib import Path
+
+from bundle_index import get_external_id
+from constants import BUILD_PATH
+from metrics import metrics
+from output import ExportWriter, write_atomic
+from utils import fix_id
+
+LAYER_VERSIONS = {"layer": "4.5", "navigator": "4.9.1"}
+GRADIENT_COLORS = ["#ffffff", "#66b1ff"]
+MATRIX_COLUMNS = ("tactic_id", "tactic", "technique_id", "technique", "parent_id", "score")
+
+
+def load_scores(path: Path) -> dict[str, float]:
+    """Return the scores of ``path`` by technique id, accepting ids as ATRM pages write them."""
+    with open(path, encoding="utf-8", newline="") as f:
+        if Path(path).suffix == ".csv":
+            scores = {row[0]: row[1] for row in csv.reader(f) if row and row[0] != "technique_id"}
+        else:
+            scores = json.load(f)
+    return {fix_id(technique_id): float(score) for technique_id, score in scores.items()}
+
+
+class MatrixStream:
+    """Index the tactics and techniques of a bundle, laid out as a matrix on ``close``."""
+
+    def __init__(self, path: Path, scores: dict[str, float] | None = None) -> None:
+        self.path = path
+        self.scores = scores
+        # [(external id, shortname, name)] in matrix order
+        self.tactics = []
+        # shortname -> [(stix id, name)] of the techniques of each tactic
+        self.techniques = {}
+        # stix id -> external id of each technique
+        self.external_ids = {}
+        # stix id of a subtechnique -> stix id of its technique
+        self.parents = {}
+        self.domains = []
+
+    def write(self, obj: dict) -> None:
+        if obj["type"] == "x-mitre-tactic":
+            self.tactics.append((get_external_id(obj), obj["x_mitre_shortname"], obj["name"]))
+        elif obj["type"] == "attack-pattern":
+            if obj.get("revoked") or obj.get("x_mitre_deprecated"):
+                return
+            self.external_ids[obj["id"]] = get_external_id(obj)
+            self.domains = obj.get("x_mitre_domains", self.domains)
+            for phase in obj.get("kill_chain_phases", []):
+                record = (obj["id"], obj["name"])
+                self.techniques.setdefault(phase["phase_name"], []).append(record)
+        elif obj["type"] == "relationship" and obj["relationship_type"] == "subtechnique-of":
+            self.parents[obj["source_ref"]] = obj["target_ref"]
+
+    def get_rows(self) -> list[tuple]:
+        """Return (tactic, technique id, name, parent id) rows, subtechniques after techniques."""
+        if self.scores:
+            unknown = self.scores.keys() - self.external_ids.values()
+            if unknown:
+                raise ValueError(f"scores of unknown techniques: {', '.join(sorted(unknown))}")
+        rows = []
+        for tactic in self.tactics:
+            techniques = [
+                (
+                    self.external_ids[stix_id],
+                    name,
+                    self.external_ids.get(self.parents.get(stix_id)),
+                )
+                for stix_id, name in self.techniques.get(tactic[1], [])
+            ]
+            # AZT101 < AZT101.001 < AZT102
+            rows.extend((tactic, *technique) for technique in sorted(techniques))
+        return rows
+
+    def get_score(self, technique_id: str) -> float | None:
+        return self.scores.get(technique_id) if self.scores else None
+
+    @metrics.timer("output.matrix")
+    def close(self, collection: dict, commit_hash: str) -> None:
+        text = io.StringIO()
+        writer = csv.writer(text, lineterminator="\n")
+        writer.writerow(MATRIX_COLUMNS)
+        for (tactic_id, _, tactic), technique_id, name, parent_id in self.get_rows():
+            score = self.get_score(technique_id)
+            writer.writerow((tactic_id, tactic, technique_id, name, parent_id, score))
+        write_atomic(self.path, text.getvalue())
+
+    def abort(self) -> None:
+        pass
+
+
+class NavigatorStream(MatrixStream):
+    """Write the matrix of a bundle as an ATT&CK Navigator layer."""
+
+    @metrics.timer("output.navigator")
+    def close(self, collection: dict, commit_hash: str) -> None:
+        rows = self.get_rows()
+        # Subtechniques show under their technique when one of them is scored
+        scored_parents = {
+            parent_id
+            for _, technique_id, _, parent_id in rows
+            if parent_id and self.get_score(technique_id) is not None
+        }
+        techniques = []
+        for (_, shortname, _), technique_id, _, _ in rows:
+            technique = {
+                "techniqueID": technique_id,
+                "tactic": shortname,
+                "enabled": True,
+                "showSubtechniques": technique_id in scored_parents,
+            }
+            score = self.get_score(technique_id)
+            if score is not None:
+                technique["score"] = score
+            techniques.append(technique)
+        scores = [technique["score"] for technique in techniques if "score" in technique]
+
+        layer = {
+            "name": collection["name"],
+            "versions": LAYER_VERSIONS,
+            "domain": self.domains[0] if self.domains else "",
+            "description": f"Techniques of ATRM at commit {commit_hash}",
+            "sorting": 0,
+            "layout": {"layout": "side", "showID": True, "showName": True},
+            "hideDisabled": False,
+            "techniques": techniques,
+            "gradient": {
+                "colors": GRADIENT_COLORS,
+                "minValue": min(scores, default=0),
+                "maxValue": max(scores, default=1),
+            },
+            "metadata": [{"name": "commit", "value": commit_hash}],
+        }
+        write_atomic(self.path, json.dumps(layer, indent=4))
+
+
+class MatrixWriter(ExportWriter):
+    """Flat tactic x technique matrices of the bundles, see ``MatrixStream``."""
+
+    suffix = ".matrix.csv"
+    stream_class = MatrixStream
+
+    def __init__(
+        self,
+        path: Path = BUILD_PATH,
+        link: str = "copy",
+        scores: dict[str, float] | None = None,
+    ) -> None:
+        super().__init__(path, link)
+        self.stream_class = partial(self.stream_class, scores=scores)
+
+
+class NavigatorWriter(MatrixWriter):
+    """ATT&CK Navigator layers of the bundles, see ``NavigatorStream``."""
+
+    suffix = ".layer.json"
+    stream_class = NavigatorStream
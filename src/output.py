@@ -0,0 +1,396 @@
+"""Write build artifacts atomically, once per build, to their latest and versioned paths.
+
+A file already holding the same bytes is left alone, so its timestamps only
+move when its content does.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import uuid
+from collections.abc import Callable, Iterator, Mapping
+from contextlib import contextmanager
+from pathlib import Path
+
+import simplejson
+from stix2.base import _STIXBase
+from stix2.serialization import STIXJSONEncoder
+
+from bundle_index import build_index, get_index_path
+from constants import BUILD_PATH, LINK_MODES
+from metrics import metrics
+from stix_dicts import StixDict
+
+CHUNK_SIZE = 1024 * 1024
+# _IOW(0x94, 9, int) from linux/fs.h
+FICLONE = 0x40049409
+BUNDLE_FOOTER = "\n    ]\n}"
+# Between two objects of a bundle; strings escape newlines, so only objects end a line with }
+OBJECT_SEPARATOR = "\n        },\n        {\n"
+
+
+def freeze(value):
+    if isinstance(value, list):
+        return tuple(freeze(v) for v in value)
+    if isinstance(value, Mapping):
+        return frozenset((k, freeze(v)) for k, v in value.items())
+    return value
+
+
+def get_pair(key: str, value) -> tuple:
+    return key, freeze(value)
+
+
+def get_hashed_pair(key: str, value) -> tuple:
+    # Keeps the index small when it outlives the objects, as in BundleStream
+    return key, hash(freeze(value))
+
+
+def get_property_indices(
+    obj,
+    indices: dict | None = None,
+    pair: Callable[[str, object], tuple] = get_pair,
+) -> dict:
+    """Index every (key, value) pair the way ``stix2.serialization.find_property_index`` does.
+
+    stix2 searches the whole object depth-first for the first mapping holding the
+    pair, once per key it writes. Walking the object once in the same pre-order
+    and keeping the first hit gives the same indices in linear time.
+    """
+    if indices is None:
+        indices = {}
+    if isinstance(obj, Mapping):
+        if isinstance(obj, StixDict):
+            keys = obj.property_order
+        elif isinstance(obj, _STIXBase):
+            keys = list(obj)
+        else:
+            keys = sorted(obj)
+        for key, value in obj.items():
+            indices.setdefault(pair(key, value), keys.index(key))
+        for value in obj.values():
+            get_property_indices(value, indices, pair)
+    elif isinstance(obj, list):
+        for value in obj:
+            get_property_indices(value, indices, pair)
+    return indices
+
+
+def dump_pretty(
+    obj: _STIXBase | StixDict,
+    indices: dict,
+    pair: Callable[[str, object], tuple] = get_pair,
+) -> str:
+    def sort_by(item: tuple) -> int:
+        key, value = item
+        if key.isdigit():
+            return int(key)
+        return indices.get(pair(key, value), -1)
+
+    return simplejson.dumps(
+        obj,
+        cls=STIXJSONEncoder,
+        indent=4,
+        separators=(",", ": "),
+        item_sort_key=sort_by,
+    )
+
+
+def serialize_pretty(obj: _STIXBase | StixDict) -> str:
+    """Return exactly what ``serialize(pretty=True)`` returns for the stix2 form of ``obj``."""
+    return dump_pretty(obj, get_property_indices(obj))
+
+
+def indent(text: str, level: int) -> str:
+    # Pretty JSON escapes newlines inside strings, so every line break is layout
+    prefix = " " * 4 * level
+    return prefix + text.replace("\n", "\n" + prefix)
+
+
+def get_bundle_header(objects_digest: str) -> str:
+    """Open a bundle whose id is derived from the digest of its objects."""
+    bundle_id = f"bundle--{uuid.UUID(hex=objects_digest[:32], version=4)}"
+    return f'{{\n    "type": "bundle",\n    "id": "{bundle_id}",\n    "objects": [\n'
+
+
+def split_bundle(text: str) -> list[str]:
+    """Return the objects of a bundle laid out as ``BundleStream`` does, indented as written."""
+    objects = text[text.index("[\n") + 2 : -len(BUNDLE_FOOTER)].split(OBJECT_SEPARATOR)
+    if len(objects) > 1:
+        objects[0] += "\n        }"
+        objects[-1] = "        {\n" + objects[-1]
+        objects[1:-1] = ["        {\n" + obj + "\n        }" for obj in objects[1:-1]]
+    return objects
+
+
+def serialize_bundle(bundle: dict) -> str:
+    """Lay out a bundle of objects already in output order, e.g. patched from a previous build.
+
+    The layout is that of json.dumps(bundle, indent=4), with the id BundleStream would give.
+    """
+    objects = ",\n".join(indent(json.dumps(obj, indent=4), 2) for obj in bundle["objects"])
+    objects_digest = hashlib.sha256(objects.encode("utf-8")).hexdigest()
+    return get_bundle_header(objects_digest) + objects + BUNDLE_FOOTER
+
+
+class BundleStream:
+    """Pretty-print a bundle object by object, with the layout of ``serialize_pretty``.
+
+    The bundle starts with a collection listing every other object, so objects
+    are spooled to a temporary file until ``close`` is given that collection.
+    ``head`` stands in for it meanwhile: it must have the same properties, since
+    the order stix2 gives to keys of later objects depends on them.
+    """
+
+    def __init__(self, path: Path, head: _STIXBase | StixDict) -> None:
+        self.path = path
+        self.indices = get_property_indices(head, pair=get_hashed_pair)
+        self.spool = tempfile.TemporaryFile("w+", encoding="utf-8", dir=path.parent)
+
+    @metrics.timer("output.serialize")
+    def write(self, obj: _STIXBase | StixDict) -> None:
+        get_property_indices(obj, self.indices, get_hashed_pair)
+        self.spool.write(",\n" + indent(dump_pretty(obj, self.indices, get_hashed_pair), 2))
+
+    @metrics.timer("output.reuse")
+    def write_serialized(
+        self,
+        obj: StixDict,
+        serialized: str,
+        indices: dict,
+        own_indices: dict | None = None,
+    ) -> bool:
+        """Write ``obj`` as ``serialized``, its text in an earlier bundle of key ``indices``.
+
+        The text is reused if every key of ``obj`` is ranked as it was there;
+        otherwise ``obj`` is serialized again. ``own_indices`` saves indexing
+        ``obj`` once more. Return whether the text was reused.
+        """
+        if own_indices is None:
+            own_indices = get_property_indices(obj, pair=get_hashed_pair)
+        for pair, index in own_indices.items():
+            self.indices.setdefault(pair, index)
+        if any(self.indices[pair] != indices.get(pair) for pair in own_indices):
+            self.spool.write(",\n" + indent(dump_pretty(obj, self.indices, get_hashed_pair), 2))
+            return False
+        self.spool.write(",\n" + serialized)
+        return True
+
+    def format_collection(self, collection: _STIXBase | StixDict) -> str:
+        return indent(serialize_pretty(collection), 2)
+
+    @metrics.timer("output.write")
+    def close(self, collection: _STIXBase | StixDict) -> None:
+        collection = self.format_collection(collection)
+        objects_digest = hashlib.sha256(collection.encode("utf-8"))
+        self.spool.seek(0)
+        while chunk := self.spool.read(CHUNK_SIZE):
+            objects_digest.update(chunk.encode("utf-8"))
+
+        tmp_path = get_temp_path(self.path)
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(get_bundle_header(objects_digest.hexdigest()))
+            f.write(collection)
+            self.spool.seek(0)
+            shutil.copyfileobj(self.spool, f)
+            f.write(BUNDLE_FOOTER)
+        replace_changed(tmp_path, self.path)
+        self.spool.close()
+
+
+class JsonBundleStream(BundleStream):
+    """A ``BundleStream`` of plain JSON objects, laid out like ``serialize_bundle``.
+
+    With ``pretty`` off each object takes one line instead, which json encodes
+    several times faster.
+    """
+
+    def __init__(self, path: Path, pretty: bool = True) -> None:
+        self.path = path
+        self.indent = 4 if pretty else None
+        self.spool = tempfile.TemporaryFile("w+", encoding="utf-8", dir=path.parent)
+
+    @metrics.timer("output.serialize")
+    def write(self, obj: dict) -> None:
+        self.spool.write(",\n" + indent(json.dumps(obj, indent=self.indent), 2))
+
+    def format_collection(self, collection: dict) -> str:
+        return indent(json.dumps(collection, indent=self.indent), 2)
+
+
+def get_temp_path(path: Path) -> Path:
+    return path.with_name(f"{path.name}.{os.getpid()}.tmp")
+
+
+def get_file_digest(path: Path) -> str:
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+def is_unchanged(path: Path, size: int, digest: str) -> bool:
+    return path.exists() and path.stat().st_size == size and get_file_digest(path) == digest
+
+
+def replace_changed(tmp_path: Path, path: Path) -> None:
+    """Move ``tmp_path`` over ``path`` unless ``path`` already holds the same bytes."""
+    size = tmp_path.stat().st_size
+    digest = get_file_digest(tmp_path)
+    changed = not is_unchanged(path, size, digest)
+    if changed:
+        tmp_path.replace(path)
+        metrics.count("bytes_written", size)
+    else:
+        tmp_path.unlink()
+    metrics.output(path.name, digest, changed)
+
+
+@metrics.timer("output.write")
+def write_atomic(path: Path, content: str) -> None:
+    """Replace ``path`` only once ``content`` is fully written, so readers never see half a file."""
+    data = content.encode("utf-8")
+    digest = hashlib.sha256(data).hexdigest()
+    changed = not is_unchanged(path, len(data), digest)
+    if changed:
+        tmp_path = get_temp_path(path)
+        tmp_path.write_bytes(data)
+        tmp_path.replace(path)
+        metrics.count("bytes_written", len(data))
+    metrics.output(path.name, digest, changed)
+
+
+def reflink(source: Path, target: Path) -> None:
+    """Clone ``source`` sharing its data blocks, falling back to a copy where unsupported."""
+    try:
+        import fcntl
+
+        with open(source, "rb") as src, open(target, "wb") as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+    except (ImportError, OSError):
+        shutil.copyfile(source, target)
+
+
+@metrics.timer("output.link")
+def link_atomic(source: Path, target: Path, link: str = "copy") -> None:
+    digest = get_file_digest(source)
+    if is_unchanged(target, source.stat().st_size, digest):
+        metrics.output(target.name, digest, changed=False)
+        return
+    tmp_path = get_temp_path(target)
+    tmp_path.unlink(missing_ok=True)
+    if link == "hardlink":
+        os.link(source, tmp_path)
+    elif link == "reflink":
+        reflink(source, tmp_path)
+    else:
+        shutil.copyfile(source, tmp_path)
+        metrics.count("bytes_written", tmp_path.stat().st_size)
+    tmp_path.replace(target)
+    metrics.output(target.name, digest, changed=True)
+
+
+class OutputWriter:
+    """Serialize an artifact once and write it to ``<name>_<hash>`` and ``<name>`` in build/.
+
+    The latest copy is made from the versioned file by ``link``: a plain copy, a
+    hardlink or a reflink. Subclasses choose the suffix and the serialization.
+    """
+
+    suffix = ""
+
+    def __init__(self, path: Path = BUILD_PATH, link: str = "copy") -> None:
+        if link not in LINK_MODES:
+            raise ValueError(f"unknown link mode {link!r}, expected one of {LINK_MODES}")
+        self.path = Path(path)
+        self.link = link
+
+    def serialize(self, obj) -> str:
+        raise NotImplementedError
+
+    def get_path(self, name: str, commit_hash: str | None = None) -> Path:
+        if commit_hash:
+            name = f"{name}_{commit_hash}"
+        return self.path / f"{name}{self.suffix}"
+
+    def link_latest(self, name: str, commit_hash: str) -> None:
+        link_atomic(self.get_path(name, commit_hash), self.get_path(name), self.link)
+
+    def write(self, name: str, commit_hash: str, obj, write_latest: bool = True) -> None:
+        write_atomic(self.get_path(name, commit_hash), self.serialize(obj))
+        if write_latest:
+            self.link_latest(name, commit_hash)
+
+
+class BundleWriter(OutputWriter):
+    """STIX bundles, pretty-printed in the property order stix2 uses.
+
+    Each bundle gets a sidecar lookup index, see ``bundle_index``.
+    """
+
+    suffix = ".json"
+
+    def write_index(self, name: str, commit_hash: str, write_latest: bool = True) -> None:
+        path = get_index_path(self.get_path(name, commit_hash))
+        with metrics.stage("output.index"):
+            index = build_index(self.get_path(name, commit_hash))
+        write_atomic(path, json.dumps(index, separators=(",", ":")))
+        if write_latest:
+            link_atomic(path, get_index_path(self.get_path(name)), self.link)
+
+    def write(self, name: str, commit_hash: str, obj, write_latest: bool = True) -> None:
+        super().write(name, commit_hash, obj, write_latest)
+        self.write_index(name, commit_hash, write_latest)
+
+    def serialize(self, bundle: _STIXBase | dict) -> str:
+        if isinstance(bundle, dict):
+            return serialize_bundle(bundle)
+        return serialize_pretty(bundle)
+
+    @contextmanager
+    def stream(
+        self,
+        name: str,
+        commit_hash: str,
+        head: _STIXBase | StixDict,
+        write_latest: bool = True,
+    ) -> Iterator[BundleStream]:
+        """Stream a bundle to disk; the caller ends it with ``BundleStream.close``."""
+        stream = BundleStream(self.get_path(name, commit_hash), head)
+        try:
+            yield stream
+        finally:
+            stream.spool.close()
+        if write_latest:
+            self.link_latest(name, commit_hash)
+        self.write_index(name, commit_hash, write_latest)
+
+
+class ExportWriter(OutputWriter):
+    """Another format of the bundles, filled object by object as a bundle is written.
+
+    ``stream_class`` is given the output path; its ``write`` takes each object
+    after the collection, ``close(collection, commit_hash)`` completes the file
+    and ``abort`` drops it.
+    """
+
+    stream_class = None
+
+    @contextmanager
+    def stream(self, name: str, commit_hash: str, write_latest: bool = True) -> Iterator:
+        """Fill an export; the caller ends it with the stream's ``close``."""
+        stream = self.stream_class(self.get_path(name, commit_hash))
+        try:
+            yield stream
+        except BaseException:
+            stream.abort()
+            raise
+        if write_latest:
+            self.link_latest(name, commit_hash)
+
+    def write(self, name: str, commit_hash: str, bundle: dict, write_latest: bool = True) -> None:
+        collection, *objects = bundle["objects"]
+        with self.stream(name, commit_hash, write_latest) as stream:
+            for obj in objects:
+                stream.write(obj)
+            stream.close(collection, commit_hash)
@@ -1,9 +1,15 @@
+import json
 import os
+import sys
+from collections.abc import Container, Iterator, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
 from datetime import datetime
+from itertools import chain
 from pathlib import Path
 
 from mitreattack.stix20.custom_attack_objects import Matrix
-from stix2 import Bundle, parse
+from stix2 import Identity
 
 from constants import (
     ATRM_PATH,
@@ -12,81 +18,240 @@ from constants import (
     ATTACK_SPEC_VERSION,
     CREATOR_IDENTITY,
     DEFAULT_CREATOR_JSON,
-    Mode,
     ModeEnumAttribute,
+    RelationError,
     get_atrm_domain,
     get_atrm_source,
     get_collection_id,
 )
 from custom_atrm_objects import Collection, ObjectRef, Relationship
-from git_tools import get_first_commit_date, get_last_commit_hash
-from parse_tactic import parse_tactic
-from parse_technique import get_techniques_brief_info, parse_technique
+from git_tools import GitHistory, get_last_commit_hash
+from metrics import metrics
+from output import BundleWriter, ExportWriter
+from parse_cache import ParseCache, get_blob_sha
+from parse_tactic import build_tactic, read_tactic
+from parse_technique import (
+    TechniqueRecord,
+    build_technique,
+    get_techniques_brief_info,
+    read_technique,
+    read_technique_job,
+)
+from stix_dicts import StixDict, make_object, validate_object
+from utils import create_uuid_from_string
+
+
+def get_tactic_file(tactic_name: str) -> Path:
+    path = ATRM_PATH / "docs" / tactic_name
+    return path / sorted(f for f in os.listdir(path) if f.endswith(".md"))[0]
+
+
+def get_technique_files(tactic_name: str) -> list[str]:
+    path = ATRM_PATH / "docs" / tactic_name
+    # Sorted, as listing order depends on the filesystem
+    tech_folders = sorted(f for f in os.listdir(path) if not f.endswith(".md"))
+
+    tech_file_paths = []
+    for tech_folder in tech_folders:
+        tech_path = path / tech_folder
+        tech_files = sorted(f for f in os.listdir(tech_path) if f.endswith(".md"))
+        tech_file_paths.extend(os.path.join(tech_path, tech_file) for tech_file in tech_files)
+    return tech_file_paths
+
+
+def set_dates(record: dict | None, history: GitHistory, file_path: str) -> None:
+    if record is not None:
+        record["created"] = history.get_creation_date(file_path)
+        record["modified"] = history.get_modification_date(file_path)
+
+
+def without_dates(record: dict | None) -> dict | None:
+    if record is None:
+        return None
+    return {k: v for k, v in record.items() if k not in ("created", "modified")}
+
+
+def read_tactic_page(
+    tactic_file: Path,
+    tactic_name: str,
+    history: GitHistory,
+    cache: ParseCache | None,
+) -> tuple[dict, dict, str | None]:
+    if not cache:
+        tactic = read_tactic(tactic_file, tactic_name)
+        set_dates(tactic, history, tactic_file)
+        return tactic, get_techniques_brief_info(file_path=tactic_file, tactic=tactic), None
+
+    key = cache.get_key(tactic_name, get_blob_sha(tactic_file.read_bytes()))
+    if cached := cache.get(key):
+        tactic, techniques_brief = cached
+    else:
+        tactic = read_tactic(tactic_file, tactic_name)
+        techniques_brief = get_techniques_brief_info(file_path=tactic_file, tactic=tactic)
+        cache.put(key, [without_dates(tactic), techniques_brief])
+    set_dates(tactic, history, tactic_file)
+    return tactic, techniques_brief, key
 
 
-def parse_atrm(mode: ModeEnumAttribute) -> None:
+def get_cached_technique(
+    cache: ParseCache,
+    tactic_key: str,
+    tech_file_path: str,
+    history: GitHistory,
+) -> tuple[str, tuple | None]:
+    """Return the cache key of a technique page, and its records if they are cached."""
+    tech_file = Path(tech_file_path)
+    key = cache.get_key(tactic_key, tech_file.name, get_blob_sha(tech_file.read_bytes()))
+    cached = cache.get(key)
+    if not cached:
+        return key, None
+    technique, relation = TechniqueRecord(**cached[0]), cached[1]
+    set_dates(technique, history, tech_file_path)
+    set_dates(relation, history, tech_file_path)
+    return key, (technique, relation)
+
+
+@metrics.timer("read.techniques")
+def read_techniques(jobs: list[tuple], workers: int) -> list[tuple]:
+    if workers > 1 and len(jobs) > 1:
+        # map() yields results in submission order, so the output matches a serial build
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return list(
+                executor.map(
+                    read_technique_job,
+                    jobs,
+                    chunksize=max(1, len(jobs) // (workers * 4)),
+                ),
+            )
+    return [read_technique(*job) for job in jobs]
+
+
+@metrics.timer("read")
+def read_atrm(
+    history: GitHistory,
+    workers: int = 1,
+    cache: ParseCache | None = None,
+    model: dict | None = None,
+    changed: Container[str] = frozenset(),
+) -> dict:
+    """Read the model of the ATRM docs.
+
+    Given the ``model`` of an earlier read with the same ``history``, only the
+    pages in ``changed``, the pages added since and the technique pages of a
+    changed tactic page are read again; the records of the others are reused.
+    """
     tactics = {}
     techniques = {}
     relations = []
-    relationships = []
+    # page path -> (tactic, techniques brief, cache key) or (technique, relation)
+    pages = {}
+    previous = model["pages"] if model else {}
+    # (file path, cache key, records or None, parse job)
+    entries = []
 
     for tactic_name in ATRM_TACTICS_MAP:
-        path = ATRM_PATH / "docs" / tactic_name
-        tactic_file = path / [f for f in os.listdir(path) if f.endswith(".md")][0]  # noqa: RUF015
-        tech_folders = (f for f in os.listdir(path) if not f.endswith(".md"))
-
-        tactic = parse_tactic(tactic_file, tactic_name, mode)
+        tactic_file = get_tactic_file(tactic_name)
+        tactic_changed = str(tactic_file) in changed or str(tactic_file) not in previous
+        if tactic_changed:
+            pages[str(tactic_file)] = read_tactic_page(tactic_file, tactic_name, history, cache)
+        else:
+            pages[str(tactic_file)] = previous[str(tactic_file)]
+        tactic, techniques_brief, tactic_key = pages[str(tactic_file)]
         tactics[tactic_name] = tactic
-        tactic_short = tactic.get_shortname()
 
-        techniques_brief = get_techniques_brief_info(
-            file_path=path / tactic_file,
-            tactic=tactic,
-        )
+        for tech_file_path in get_technique_files(tactic_name):
+            job = (tech_file_path, tactic_name, techniques_brief, tactic["shortname"])
 
-        for tech_folder in tech_folders:
-            tech_path = ATRM_PATH / "docs" / tactic_name / tech_folder
-            tech_files = (f for f in os.listdir(tech_path) if f.endswith(".md"))
-            for tech_file in tech_files:
-                tech_file_path = os.path.join(tech_path, tech_file)
-
-                technique, relation = parse_technique(
-                    tech_file_path,
-                    tactic_name,
-                    techniques_brief,
-                    tactic_short,
-                    mode,
-                )
-                techniques[technique.get_id(mode)] = technique
-
-                if relation:
-                    relations.append(relation)
-
-    relationships = [
-        Relationship(
-            created=relation.get("created"),
-            modified=relation.get("modified"),
-            source_ref=techniques[relation["source"]]["id"],
-            relationship_type=relation["relation"],
-            target_ref=techniques[relation["target"]]["id"],
-            created_by_ref=CREATOR_IDENTITY,
-            x_mitre_version=ATRM_VERSION,
-            x_mitre_modified_by_ref=CREATOR_IDENTITY,
-            x_mitre_attack_spec_version="2.1.0",
-            x_mitre_domains=[get_atrm_domain(mode=mode)],
-        )
-        for relation in relations
-    ]
+            key = None
+            records = None
+            if not tactic_changed and tech_file_path not in changed:
+                records = previous.get(tech_file_path)
+            if records is None and cache:
+                key, records = get_cached_technique(cache, tactic_key, tech_file_path, history)
+            entries.append((tech_file_path, key, records, job))
+
+    parsed = iter(
+        read_techniques(
+            [job for _, _, records, job in entries if not records],
+            workers,
+        ),
+    )
+    for tech_file_path, key, records, _ in entries:
+        if records:
+            technique, relation = records
+        else:
+            technique, relation = next(parsed)
+            if cache:
+                cache.put(key, [without_dates(technique), without_dates(relation)])
+            set_dates(technique, history, tech_file_path)
+            set_dates(relation, history, tech_file_path)
+        pages[tech_file_path] = (technique, relation)
+
+        techniques[technique["id"]] = technique
+
+        if relation:
+            relations.append(relation)
 
-    objects = []
-    objects.extend([tactics[t] for t in tactics])
-    objects.extend([techniques[t] for t in techniques])
-    objects.extend(relationships)
+    if cache:
+        cache.evict()
 
-    matrix = Matrix(
-        tactic_refs=[tactics[t].id for t in tactics],
-        created=get_first_commit_date(repo_path=ATRM_PATH),
-        modified=datetime.now(),
+    return {
+        "tactics": tactics,
+        "techniques": techniques,
+        "relations": relations,
+        "pages": pages,
+        "created": history.get_first_commit_date(),
+        "commit_hash": get_last_commit_hash(ATRM_PATH),
+    }
+
+
+def get_content_modified(model: dict) -> datetime:
+    """Latest modification date of any page in ``model``; other commits leave it unchanged."""
+    records = chain(model["tactics"].values(), model["techniques"].values(), model["relations"])
+    dates = [record["modified"] for record in records if record["modified"]]
+    return max(dates, default=model["created"])
+
+
+def get_relationship_id(source_ref: str, relationship_type: str, target_ref: str) -> str:
+    return "relationship--" + str(
+        create_uuid_from_string(
+            f"microsoft.atrm.relationship.{source_ref}.{relationship_type}.{target_ref}",
+        ),
+    )
+
+
+def build_relationship(
+    relation: dict,
+    source_ref: str,
+    target_ref: str,
+    mode: ModeEnumAttribute,
+    **kwargs,
+) -> StixDict:
+    kwargs.setdefault("id", get_relationship_id(source_ref, relation["relation"], target_ref))
+    return make_object(
+        Relationship,
+        created=relation.get("created"),
+        modified=relation.get("modified"),
+        source_ref=source_ref,
+        relationship_type=relation["relation"],
+        target_ref=target_ref,
+        created_by_ref=CREATOR_IDENTITY,
+        x_mitre_version=ATRM_VERSION,
+        x_mitre_modified_by_ref=CREATOR_IDENTITY,
+        x_mitre_attack_spec_version="2.1.0",
+        x_mitre_domains=[get_atrm_domain(mode=mode)],
+        **kwargs,
+    )
+
+
+def build_matrix(model: dict, mode: ModeEnumAttribute, modified: datetime) -> StixDict:
+    return make_object(
+        Matrix,
+        id="x-mitre-matrix--"
+        + str(create_uuid_from_string(f"microsoft.atrm.matrix.{mode.name.lower()}")),
+        tactic_refs=[tactic["stix_id"] for tactic in model["tactics"].values()],
+        created=model["created"],
+        modified=modified,
         created_by_ref=CREATOR_IDENTITY,
         external_references=[
             {
@@ -104,44 +269,116 @@ def parse_atrm(mode: ModeEnumAttribute) -> None:
         x_mitre_domains=[get_atrm_domain(mode=mode)],
         allow_custom=True,
     )
-    objects.append(matrix)
 
-    identity = parse(data=DEFAULT_CREATOR_JSON, allow_custom=True)
-    objects.append(identity)
 
-    collection = Collection(
+def build_collection(
+    model: dict,
+    mode: ModeEnumAttribute,
+    modified: datetime,
+    contents: list[StixDict],
+) -> StixDict:
+    return make_object(
+        Collection,
         id=get_collection_id(mode=mode),
         spec_version="2.1",
         name="Azure Threat Research Matrix",
         description="The purpose of the Azure Threat Research Matrix (ATRM) is to educate readers on the potential of Azure-based tactics, techniques, and procedures (TTPs). It is not to teach how to weaponize or specifically abuse them. For this reason, some specific commands will be obfuscated or parts will be omitted to prevent abuse.",
-        created=get_first_commit_date(repo_path=ATRM_PATH),
-        modified=datetime.now(),
+        created=model["created"],
+        modified=modified,
         x_mitre_attack_spec_version=ATTACK_SPEC_VERSION,
         x_mitre_version=ATRM_VERSION,
         created_by_ref=CREATOR_IDENTITY,
-        x_mitre_contents=[
-            ObjectRef(object_ref=obj.id, object_modified=obj.modified)
-            for obj in objects
-        ],
+        x_mitre_contents=contents,
     )
 
-    bundle = Bundle(collection, objects, allow_custom=True)
-    commit_hash = get_last_commit_hash(ATRM_PATH)
-    output_file_last = (
-        Path(__file__).parent.parent / "build" / f"atrm_{mode.name.lower()}.json"
-    )
-    with open(output_file_last, "w", encoding="utf-8") as f:
-        f.write(bundle.serialize(pretty=True))
 
-    output_file_versioned = (
-        Path(__file__).parent.parent
-        / "build"
-        / f"atrm_{mode.name.lower()}_{commit_hash}.json"
+def check_relations(model: dict) -> None:
+    """Fail before anything is written if a subtechnique's parent has no page."""
+    missing = [
+        f"{relation['source']} of {relation['target']}"
+        for relation in model["relations"]
+        if relation["source"] not in model["techniques"]
+        or relation["target"] not in model["techniques"]
+    ]
+    if missing:
+        raise RelationError(f"subtechniques of unknown techniques: {', '.join(missing)}")
+
+
+def iter_objects(model: dict, mode: ModeEnumAttribute, modified: datetime) -> Iterator:
+    """Yield the bundle's objects after the collection, building each one only when needed."""
+    techniques = model["techniques"]
+    for tactic in model["tactics"].values():
+        yield build_tactic(tactic, mode)
+    for technique in techniques.values():
+        yield build_technique(technique, mode)
+    for relation in model["relations"]:
+        yield build_relationship(
+            relation,
+            techniques[relation["source"]]["stix_id"],
+            techniques[relation["target"]]["stix_id"],
+            mode,
+        )
+    yield build_matrix(model, mode, modified)
+    yield make_object(Identity, allow_custom=True, **json.loads(DEFAULT_CREATOR_JSON))
+
+
+@metrics.timer("bundle")
+def parse_atrm(
+    mode: ModeEnumAttribute,
+    model: dict | None = None,
+    write_latest: bool = True,
+    writer: BundleWriter | None = None,
+    validate: bool = False,
+    deterministic: bool = False,
+    exporters: Sequence[ExportWriter] = (),
+) -> None:
+    """Write the bundle of ``model`` for ``mode``.
+
+    The matrix and collection are stamped with the build time, or with
+    ``deterministic`` with the last modification of a page, so that rebuilding
+    an unchanged ATRM gives the same bytes and leaves the files untouched.
+    ``exporters`` write other formats from the same objects as they are built.
+    """
+    if model is None:
+        model = read_atrm(GitHistory(ATRM_PATH))
+    check_relations(model)
+    writer = writer or BundleWriter()
+    name = f"atrm_{mode.name.lower()}"
+
+    modified = get_content_modified(model) if deterministic else datetime.now()
+    # The collection lists every object, so until they are all written its stand-in
+    # refers to itself; it has the same properties, which is all the stream needs
+    head = build_collection(
+        model,
+        mode,
+        modified,
+        [make_object(ObjectRef, object_ref=get_collection_id(mode=mode), object_modified=modified)],
     )
-    with open(output_file_versioned, "w", encoding="utf-8") as f:
-        f.write(bundle.serialize(pretty=True))
+    with ExitStack() as streams:
+        stream = streams.enter_context(writer.stream(name, model["commit_hash"], head, write_latest))
+        exports = [
+            streams.enter_context(exporter.stream(name, model["commit_hash"], write_latest))
+            for exporter in exporters
+        ]
+        contents = []
+        for obj in metrics.timed("stix.build", iter_objects(model, mode, modified)):
+            if validate:
+                validate_object(obj)
+            stream.write(obj)
+            for export in exports:
+                export.write(obj)
+            contents.append(
+                make_object(ObjectRef, object_ref=obj["id"], object_modified=obj["modified"]),
+            )
+        collection = build_collection(model, mode, modified, contents)
+        if validate:
+            validate_object(collection)
+        stream.close(collection)
+        for export in exports:
+            export.close(collection, model["commit_hash"])
 
 
 if __name__ == "__main__":
-    for mode in Mode:
-        parse_atrm(mode)
+    from cli import main
+
+    main(["build", *sys.argv[1:]])
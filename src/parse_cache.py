@@ -0,0 +1,102 @@
+import ast
+import hashlib
+import json
+import os
+from pathlib import Path
+
+from constants import BUILD_PATH
+
+CACHE_PATH = BUILD_PATH / ".cache"
+CACHE_SIZE = 64 * 1024 * 1024
+SRC_PATH = Path(__file__).parent
+# Modules producing the cached records; the local modules they import count too
+PARSER_MODULES = ("markdown_tools", "parse_tactic", "parse_technique", "parse_cache")
+
+
+def get_blob_sha(content: bytes) -> str:
+    """Return the SHA git assigns to a blob with this content."""
+    header = f"blob {len(content)}\0".encode()
+    return hashlib.sha1(header + content).hexdigest()  # noqa: S324
+
+
+def get_local_imports(source: bytes) -> set[str]:
+    """Return the modules of this directory a module imports at its top level or in functions."""
+    names = set()
+    for node in ast.walk(ast.parse(source)):
+        if isinstance(node, ast.Import):
+            names.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names.add(node.module)
+    return {name for name in names if (SRC_PATH / f"{name}.py").is_file()}
+
+
+def get_parser_modules() -> list[str]:
+    """Return ``PARSER_MODULES`` and every local module they import, directly or not."""
+    modules = set()
+    pending = list(PARSER_MODULES)
+    while pending:
+        module = pending.pop()
+        if module not in modules:
+            modules.add(module)
+            pending.extend(get_local_imports((SRC_PATH / f"{module}.py").read_bytes()))
+    return sorted(modules)
+
+
+def get_parser_salt() -> str:
+    """Hash the parser sources, so any change to them invalidates the cache."""
+    digest = hashlib.sha256()
+    for module in get_parser_modules():
+        digest.update(module.encode("utf-8") + b"\0")
+        digest.update((SRC_PATH / f"{module}.py").read_bytes())
+    return digest.hexdigest()[:16]
+
+
+class ParseCache:
+    """On-disk cache of parsed records, keyed by the blob SHAs of the pages they come from."""
+
+    def __init__(self, path: Path = CACHE_PATH, max_size: int = CACHE_SIZE) -> None:
+        self.path = Path(path)
+        self.max_size = max_size
+        self.salt = get_parser_salt()
+        self.hits = 0
+        self.misses = 0
+
+    def get_key(self, *parts: str) -> str:
+        return hashlib.sha256("\0".join([self.salt, *parts]).encode()).hexdigest()
+
+    def get_entry_path(self, key: str) -> Path:
+        return self.path / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> dict | list | None:
+        entry_path = self.get_entry_path(key)
+        try:
+            with open(entry_path, encoding="utf-8") as f:
+                value = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        # mtime doubles as the last-use time for eviction
+        os.utime(entry_path)
+        self.hits += 1
+        return value
+
+    def put(self, key: str, value: dict | list) -> None:
+        entry_path = self.get_entry_path(key)
+        entry_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = entry_path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(value, f)
+        tmp_path.replace(entry_path)
+
+    def evict(self) -> None:
+        """Drop least recently used entries until the cache fits into max_size."""
+        entries = [
+            (entry.stat().st_mtime, entry.stat().st_size, entry)
+            for entry in self.path.glob("*/*.json")
+        ]
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries, key=lambda e: e[0]):
+            if total_size <= self.max_size:
+                break
+            entry.unlink(missing_ok=True)
+            total_size -= size
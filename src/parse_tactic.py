@@ -1,9 +1,6 @@
-import html_to_json
-from marko.ext.gfm import gfm
 from mitreattack.stix20.custom_attack_objects import Tactic
 
 from constants import (
-    ATRM_PATH,
     ATRM_TACTICS_MAP,
     ATRM_VERSION,
     ATTACK_SPEC_VERSION,
@@ -12,47 +9,58 @@ from constants import (
     get_atrm_domain,
     get_atrm_source,
 )
-from git_tools import get_file_creation_date, get_file_modification_date
+from markdown_tools import markdown_to_json
+from metrics import metrics
+from stix_dicts import StixDict, make_object
 from utils import create_uuid_from_string
 
 
-def parse_tactic(file_path: str, tactic_name: str, mode: ModeEnumAttribute) -> Tactic:
+@metrics.timer("parse.tactic")
+def read_tactic_markdown(content: str, tactic_name: str) -> dict:
+    metrics.count("tactic_pages_parsed")
+    json_content = markdown_to_json(content)
+
+    tactic_id = ATRM_TACTICS_MAP[tactic_name]
+    tactic_display_name = json_content["h1"][0]["_value"]
+
+    return {
+        "id": tactic_id,
+        "stix_id": "x-mitre-tactic--"
+        + str(create_uuid_from_string(val=f"microsoft.atrm.tactic.{tactic_id}")),
+        "tactic_name": tactic_name,
+        "name": tactic_display_name,
+        "shortname": tactic_display_name.replace(" ", "-").lower(),
+        "description": json_content["p"][0]["_value"],
+        "url": f"https://microsoft.github.io/Azure-Threat-Research-Matrix/{tactic_name}/{tactic_name}",
+        "created": None,
+        "modified": None,
+    }
+
+
+def read_tactic(file_path: str, tactic_name: str) -> dict:
     with open(file_path, encoding="utf-8") as f:
-        content = f.read()
-        html_content = gfm(content)
-        json_content = html_to_json.convert(html_content)
-
-        tactic_id = ATRM_TACTICS_MAP[tactic_name]
-        tactic_description = json_content["p"][0]["_value"]
-        tactic_link = f"https://microsoft.github.io/Azure-Threat-Research-Matrix/{tactic_name}/{tactic_name}"
-        tactic_display_name = json_content["h1"][0]["_value"]
-        modified_datetime = get_file_modification_date(
-            repo_path=ATRM_PATH, file_path=file_path,
-        )
-        creation_datetime = get_file_creation_date(
-            repo_path=ATRM_PATH, file_path=file_path,
-        )
-
-        mitre_tactic_id = "x-mitre-tactic--" + str(
-            create_uuid_from_string(val=f"microsoft.atrm.tactic.{tactic_id}"),
-        )
-        return Tactic(
-            id=mitre_tactic_id,
-            x_mitre_domains=[get_atrm_domain(mode=mode)],
-            created=creation_datetime,
-            modified=modified_datetime,
-            created_by_ref=CREATOR_IDENTITY,
-            external_references=[
-                {
-                    "external_id": tactic_id,
-                    "url": tactic_link,
-                    "source_name": get_atrm_source(mode=mode),
-                },
-            ],
-            name=tactic_display_name,
-            description=tactic_description,
-            x_mitre_version=ATRM_VERSION,
-            x_mitre_attack_spec_version=ATTACK_SPEC_VERSION,
-            x_mitre_modified_by_ref=CREATOR_IDENTITY,
-            x_mitre_shortname=tactic_display_name.replace(" ", "-").lower(),
-        )
+        return read_tactic_markdown(f.read(), tactic_name)
+
+
+def build_tactic(tactic: dict, mode: ModeEnumAttribute) -> StixDict:
+    return make_object(
+        Tactic,
+        id=tactic["stix_id"],
+        x_mitre_domains=[get_atrm_domain(mode=mode)],
+        created=tactic["created"],
+        modified=tactic["modified"],
+        created_by_ref=CREATOR_IDENTITY,
+        external_references=[
+            {
+                "external_id": tactic["id"],
+                "url": tactic["url"],
+                "source_name": get_atrm_source(mode=mode),
+            },
+        ],
+        name=tactic["name"],
+        description=tactic["description"],
+        x_mitre_version=ATRM_VERSION,
+        x_mitre_attack_spec_version=ATTACK_SPEC_VERSION,
+        x_mitre_modified_by_ref=CREATOR_IDENTITY,
+        x_mitre_shortname=tactic["shortname"],
+    )
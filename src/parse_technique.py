@@ -1,12 +1,11 @@
 import re
+import sys
+from collections.abc import Iterator
+from dataclasses import dataclass, fields
+from datetime import datetime
 from pathlib import Path
 
-import html_to_json
-from marko.ext.gfm import gfm
-from mitreattack.stix20.custom_attack_objects import Tactic
-
 from constants import (
-    ATRM_PATH,
     ATRM_PLATFORM,
     CREATOR_IDENTITY,
     Mode,
@@ -15,44 +14,104 @@ from constants import (
     get_kill_chain_name,
 )
 from custom_atrm_objects import Technique
-from git_tools import get_file_creation_date, get_file_modification_date
-from utils import create_uuid_from_string
+from markdown_tools import markdown_to_json
+from metrics import metrics
+from stix_dicts import StixDict, make_object
+from utils import create_uuid_from_string, fix_id
 
 
-def get_techniques_brief_info(file_path: str, tactic: Tactic) -> dict:
-    techniques = {}
+def intern_all(values: list | str | None) -> list | str | None:
+    if isinstance(values, list):
+        return [sys.intern(value) for value in values]
+    return values
 
-    with open(file_path, encoding="utf-8") as f:
-        html_content = gfm(f.read())
-        json_content = html_to_json.convert(html_content)
 
-        parent_tech_id = ""
-        for row in techniques_table(json_content):
-            if is_technique(row):
-                parent_tech_id = current_id = get_technique_id(row)
+@dataclass(slots=True)
+class TechniqueRecord:
+    """A parsed technique page, built into a STIX object only when a bundle is written.
+
+    Builds hold every record of a commit, and backfills every version of every
+    page, so records have slots instead of a dict, and the ids, phase names and
+    list values techniques share point at one interned string. Item access keeps
+    the dict interface of tactic and relation records.
+    """
+
+    id: str
+    stix_id: str
+    parent_id: str
+    name: str
+    description: str
+    brief: str
+    phase_name: str
+    is_subtechnique: bool
+    url: str
+    links: list[str]
+    resources: list[str] | str | None
+    actions: list[str] | str | None
+    examples: str | None
+    detections: str | None
+    created: datetime | None = None
+    modified: datetime | None = None
+
+    def __post_init__(self) -> None:
+        self.id = sys.intern(self.id)
+        self.parent_id = sys.intern(self.parent_id)
+        self.phase_name = sys.intern(self.phase_name)
+        self.links = intern_all(self.links)
+        self.resources = intern_all(self.resources)
+        self.actions = intern_all(self.actions)
+
+    def __reduce__(self) -> tuple:
+        # Through __init__, so records unpickled from parse workers are interned too
+        return type(self), tuple(getattr(self, field.name) for field in fields(self))
+
+    def __getitem__(self, name: str):
+        return getattr(self, name)
+
+    def __setitem__(self, name: str, value) -> None:
+        setattr(self, name, value)
+
+    def items(self) -> Iterator[tuple]:
+        return ((field.name, getattr(self, field.name)) for field in fields(self))
+
+
+@metrics.timer("parse.techniques_brief")
+def get_techniques_brief_markdown(content: str, tactic: dict) -> dict:
+    techniques = {}
+    json_content = markdown_to_json(content)
+
+    parent_tech_id = ""
+    for row in techniques_table(json_content):
+        if is_technique(row):
+            parent_tech_id = current_id = get_technique_id(row)
+        else:
+            subtechnique_id = get_subtechnique_id(row)
+            if parent_tech_id in subtechnique_id:
+                current_id = subtechnique_id
             else:
-                subtechnique_id = get_subtechnique_id(row)
-                if parent_tech_id in subtechnique_id:
-                    current_id = subtechnique_id
-                else:
-                    current_id = parent_tech_id + subtechnique_id
-
-            tech_name = get_technique_name(row)
-            tech_desc = get_technique_brief(row)
-
-            technique = {
-                "id": current_id,
-                "parent_id": parent_tech_id,
-                "url": f"https://microsoft.github.io/Azure-Threat-Research-Matrix/{tactic.name}/{parent_tech_id}/{current_id.replace('.00','-')}",
-                "name": tech_name,
-                "brief": tech_desc,
-                "phase_name": tactic.get_shortname(),
-                "is_subtechnique": parent_tech_id != current_id,
-            }
+                current_id = parent_tech_id + subtechnique_id
 
-            techniques[current_id] = technique
+        tech_name = get_technique_name(row)
+        tech_desc = get_technique_brief(row)
 
-        return techniques
+        technique = {
+            "id": current_id,
+            "parent_id": parent_tech_id,
+            "url": f"https://microsoft.github.io/Azure-Threat-Research-Matrix/{tactic['name']}/{parent_tech_id}/{current_id.replace('.00','-')}",
+            "name": tech_name,
+            "brief": tech_desc,
+            "phase_name": tactic["shortname"],
+            "is_subtechnique": parent_tech_id != current_id,
+        }
+
+        techniques[current_id] = technique
+
+    return techniques
+
+
+def get_techniques_brief_info(file_path: str, tactic: dict) -> dict:
+    with open(file_path, encoding="utf-8") as f:
+        return get_techniques_brief_markdown(f.read(), tactic)
 
 
 def handle_description_markup(description_row: dict) -> str:
@@ -104,203 +163,178 @@ def get_technique_description(json_content: dict | list) -> str:
     return description
 
 
-def fix_id(atrm_id: str) -> str:
-    if "." in atrm_id:
-        tpart = atrm_id.split(".")[0]
-        spart = atrm_id.split(".")[1].replace("0", "")
-        atrm_id = f"{tpart}.00{spart}"
-    return atrm_id
+def get_links(additional_resources: list | str) -> list:
+    links = []
+    for r in additional_resources:
+        if r:
+            if match := re.match(r"\[.*\]\((.*)\)", r):
+                links.append(match.group(1))
+            elif match := re.match(r"^(https?:.*)", r):
+                links.append(match.group(1))
+    return links
 
 
-def parse_technique(
+@metrics.timer("parse.technique")
+def read_technique_markdown(
+    content: str,
     file_path: str,
     tactic_name: str,
     techniques_brief_info: dict,
     tactic_short: str,
-    mode: Mode,
-) -> tuple[Technique, dict]:
-    with open(file_path, encoding="utf-8") as f:
-        content = f.read()
-        html_content = gfm(content)
-        json_content = html_to_json.convert(html_content)
-        modified_datetime = get_file_modification_date(
-            repo_path=ATRM_PATH,
-            file_path=file_path,
-        )
-        creation_datetime = get_file_creation_date(
-            repo_path=ATRM_PATH,
-            file_path=file_path,
-        )
+) -> tuple[TechniqueRecord, dict]:
+    metrics.count("technique_pages_parsed")
+    json_content = markdown_to_json(content)
 
-        header_parts = json_content["h1"][0]["_value"].split(" - ")
-        atrm_id = header_parts[0]
-        # technique_name = header_parts[1].split(":")[0].strip()
-        subtechnique_name = header_parts[1].split(":")[-1].strip()
+    header_parts = json_content["h1"][0]["_value"].split(" - ")
+    atrm_id = header_parts[0]
+    # technique_name = header_parts[1].split(":")[0].strip()
+    subtechnique_name = header_parts[1].split(":")[-1].strip()
 
-        description = get_technique_description(json_content)
-        relation = None
-        atrm_id = fix_id(atrm_id)
+    description = get_technique_description(json_content)
+    relation = None
+    atrm_id = fix_id(atrm_id)
 
-        if atrm_id in techniques_brief_info:
-            technique_info = techniques_brief_info[atrm_id]
+    if atrm_id in techniques_brief_info:
+        technique_info = techniques_brief_info[atrm_id]
+    else:
+        technique_info = {
+            "id": atrm_id,
+            "parent_id": atrm_id.split(".")[0],
+            "name": subtechnique_name,
+            "brief": description,
+        }
+
+    technique_id = technique_info["id"]
+    parent_id = technique_info["parent_id"]
+    mitre_technique_id = "attack-pattern--" + str(
+        create_uuid_from_string(f"microsoft.atrm.technique.{technique_id}"),
+    )
+
+    resources = None
+    actions = None
+    examples = None
+    detections = None
+    links = []
+
+    if "." in atrm_id or "table" not in json_content:
+        if "ul" in json_content:
+            bullits = json_content["ul"][0]["li"]
+            description += "\n- " + "\n- ".join(
+                [
+                    b["p"][0]["strong"][0]["_value"] + b["p"][0]["_value"]
+                    for b in bullits
+                ],
+            )
+            resources = get_merged_values(json_content, 1)
+            actions = get_merged_values(json_content, 2)
+            examples = get_tech_elements(json_content, 0)
+            detections = get_tech_elements(json_content, 1)
+            links = get_links(get_tech_elements(json_content, 2, split=True))
         else:
-            technique_info = {
-                "id": atrm_id,
-                "parent_id": atrm_id.split(".")[0],
-                "name": subtechnique_name,
-                "brief": description,
+            resources = get_tech_elements(json_content, 0, split=True)
+            actions = get_tech_elements(json_content, 1, split=True)
+            examples = get_tech_elements(json_content, 2)
+            detections = get_tech_elements(json_content, 3)
+            links = get_links(get_tech_elements(json_content, 4, split=True))
+
+        if parent_id != technique_id:
+            relation = {
+                "source": technique_id,
+                "relation": "subtechnique-of",
+                "target": parent_id,
+                "created": None,
+                "modified": None,
             }
 
-        technique_id = technique_info["id"]
-        parent_id = technique_info["parent_id"]
-        mitre_technique_id = "attack-pattern--" + str(
-            create_uuid_from_string(f"microsoft.atrm.technique.{technique_id}"),
+    desc = description
+    if "!!!" in desc:
+        desc = technique_info["brief"]
+
+    technique = TechniqueRecord(
+        id=technique_id,
+        stix_id=mitre_technique_id,
+        parent_id=parent_id,
+        name=technique_info["name"],
+        description=desc,
+        brief=technique_info["brief"],
+        phase_name=tactic_short,
+        is_subtechnique=parent_id != technique_id,
+        url=f"https://microsoft.github.io/Azure-Threat-Research-Matrix/{tactic_name}/{atrm_id.split('.')[0]}/{Path(file_path).stem}",
+        links=links,
+        resources=resources,
+        actions=actions,
+        examples=examples,
+        detections=detections,
+    )
+
+    return technique, relation
+
+
+def read_technique(
+    file_path: str,
+    tactic_name: str,
+    techniques_brief_info: dict,
+    tactic_short: str,
+) -> tuple[TechniqueRecord, dict]:
+    with open(file_path, encoding="utf-8") as f:
+        return read_technique_markdown(
+            f.read(),
+            file_path,
+            tactic_name,
+            techniques_brief_info,
+            tactic_short,
         )
 
-        if "." in atrm_id or "table" not in json_content:
-            if "ul" in json_content:
-                bullits = json_content["ul"][0]["li"]
-                description += "\n- " + "\n- ".join(
-                    [
-                        b["p"][0]["strong"][0]["_value"] + b["p"][0]["_value"]
-                        for b in bullits
-                    ],
-                )
-                resources = get_merged_values(json_content, 1)
-                actions = get_merged_values(json_content, 2)
-                examples = get_tech_elements(json_content, 0)
-                detections = get_tech_elements(json_content, 1)
-                additional_reqources = get_tech_elements(json_content, 2, split=True)
-                links = []
-                for r in additional_reqources:
-                    if r:
-                        if match := re.match(r"\[.*\]\((.*)\)", r):
-                            links.append(match.group(1))
-                        elif match := re.match(r"^(https?:.*)", r):
-                            links.append(match.group(1))
-
-                external_references = [
-                    {
-                        "source_name": get_atrm_source(mode=mode),
-                        "external_id": technique_id,
-                        "url": f"https://microsoft.github.io/Azure-Threat-Research-Matrix/{tactic_name}/{atrm_id.split('.')[0]}/{Path(file_path).stem}",
-                    },
-                ]
-                external_references.extend(
-                    [
-                        {
-                            "source_name": "microsoft",
-                            "url": link,
-                        }
-                        for link in links
-                    ],
-                )
-
-                desc = description
-                if "!!!" in desc:
-                    desc = technique_info["brief"]
-
-                kill_chain_phases = [
-                    {
-                        "kill_chain_name": get_atrm_source(mode=mode),
-                        "phase_name": tactic_short,
-                    },
-                ]
-            else:
-                resources = get_tech_elements(json_content, 0, split=True)
-                actions = get_tech_elements(json_content, 1, split=True)
-                examples = get_tech_elements(json_content, 2)
-                detections = get_tech_elements(json_content, 3)
-                additional_reqources = get_tech_elements(json_content, 4, split=True)
-                links = []
-                for r in additional_reqources:
-                    if r:
-                        if match := re.match(r"\[.*\]\((.*)\)", r):
-                            links.append(match.group(1))
-                        elif match := re.match(r"^(https?:.*)", r):
-                            links.append(match.group(1))
-
-                external_references = [
-                    {
-                        "source_name": get_atrm_source(mode=mode),
-                        "external_id": technique_id,
-                        "url": f"https://microsoft.github.io/Azure-Threat-Research-Matrix/{tactic_name}/{atrm_id.split('.')[0]}/{Path(file_path).stem}",
-                    },
-                ]
-                external_references.extend(
-                    [
-                        {
-                            "source_name": "microsoft",
-                            "url": link,
-                        }
-                        for link in links
-                    ],
-                )
-                desc = description
-                if "!!!" in desc:
-                    desc = technique_info["brief"]
-
-                kill_chain_phases = [
-                    {
-                        "kill_chain_name": get_kill_chain_name(mode=mode),
-                        "phase_name": tactic_short,
-                    },
-                ]
-            if parent_id != technique_id:
-                relation = {
-                    "source": technique_id,
-                    "relation": "subtechnique-of",
-                    "target": parent_id,
-                    "created": get_file_creation_date(ATRM_PATH, file_path),
-                    "modified": get_file_modification_date(ATRM_PATH, file_path),
-                }
-        else:
-            resources = None
-            actions = None
-            examples = None
-            detections = None
-
-            desc = description
-            if "!!!" in desc:
-                desc = technique_info["brief"]
-
-            external_references = [
-                {
-                    "source_name": get_atrm_source(mode=mode),
-                    "external_id": technique_id,
-                    "url": f"https://microsoft.github.io/Azure-Threat-Research-Matrix/{tactic_name}/{atrm_id.split('.')[0]}/{Path(file_path).stem}",
-                },
-            ]
-            kill_chain_phases = [
-                {
-                    "kill_chain_name": get_kill_chain_name(mode=mode),
-                    "phase_name": tactic_short,
-                },
-            ]
 
-        technique = Technique(
-            id=mitre_technique_id,
-            x_mitre_platforms=[ATRM_PLATFORM],
-            x_mitre_domains=[get_atrm_domain(mode=mode)],
-            created=creation_datetime,
-            modified=modified_datetime,
-            created_by_ref=CREATOR_IDENTITY,
-            external_references=external_references,
-            name=technique_info["name"],
-            description=desc,
-            x_mitre_brief=technique_info["brief"],
-            kill_chain_phases=kill_chain_phases,
-            x_mitre_is_subtechnique=parent_id != technique_id,
-            x_mitre_version="1.0",
-            x_mitre_modified_by_ref=CREATOR_IDENTITY,
-            x_mitre_attack_spec_version="2.1.0",
-            x_atrm_resources=resources,
-            x_atrm_actions=actions,
-            x_atrm_examples=examples,
-            x_atrm_detections=detections,
-        )
-
-        return technique, relation
+def build_technique(technique: TechniqueRecord, mode: Mode) -> StixDict:
+    external_references = [
+        {
+            "source_name": get_atrm_source(mode=mode),
+            "external_id": technique["id"],
+            "url": technique["url"],
+        },
+    ]
+    external_references.extend(
+        [
+            {
+                "source_name": "microsoft",
+                "url": link,
+            }
+            for link in technique["links"]
+        ],
+    )
+
+    return make_object(
+        Technique,
+        id=technique["stix_id"],
+        x_mitre_platforms=[ATRM_PLATFORM],
+        x_mitre_domains=[get_atrm_domain(mode=mode)],
+        created=technique["created"],
+        modified=technique["modified"],
+        created_by_ref=CREATOR_IDENTITY,
+        external_references=external_references,
+        name=technique["name"],
+        description=technique["description"],
+        x_mitre_brief=technique["brief"],
+        kill_chain_phases=[
+            {
+                "kill_chain_name": get_kill_chain_name(mode=mode),
+                "phase_name": technique["phase_name"],
+            },
+        ],
+        x_mitre_is_subtechnique=technique["is_subtechnique"],
+        x_mitre_version="1.0",
+        x_mitre_modified_by_ref=CREATOR_IDENTITY,
+        x_mitre_attack_spec_version="2.1.0",
+        x_atrm_resources=technique["resources"],
+        x_atrm_actions=technique["actions"],
+        x_atrm_examples=technique["examples"],
+        x_atrm_detections=technique["detections"],
+    )
+
+
+def read_technique_job(job: tuple) -> tuple[TechniqueRecord, dict]:
+    return read_technique(*job)
 
 
 def techniques_table(page_as_json: dict) -> list[dict]:
@@ -0,0 +1,166 @@
+"""Full-text index of technique names, descriptions, detections and examples.
+
+``build/atrm_<mode>.search.json`` is an inverted index filled while the bundle
+is streamed. ``SearchIndex`` loads it once and ranks techniques with BM25::
+
+    index = SearchIndex("build/atrm_strict.search.json")
+    index.search("Microsoft.Compute/virtualMachines/write", fields=["detections"])
+
+Operation names and other dotted or slashed words are indexed whole and by
+part, so both ``microsoft.compute/virtualmachines/write`` and ``virtualmachines``
+match them.
+"""
+
+import json
+import math
+import re
+from collections import Counter, defaultdict
+from pathlib import Path
+
+from bundle_index import get_external_id
+from metrics import metrics
+from output import ExportWriter, write_atomic
+
+INDEX_VERSION = 1
+# Indexed properties of a technique by field name, and the weight of a match in each
+FIELDS = {
+    "name": "name",
+    "description": "description",
+    "detections": "x_atrm_detections",
+    "examples": "x_atrm_examples",
+}
+FIELD_WEIGHTS = {"name": 3.0, "description": 1.0, "detections": 1.5, "examples": 1.0}
+# BM25 term frequency saturation and length normalization
+K1 = 1.2
+B = 0.75
+TOKEN = re.compile(r"[0-9a-z_]+(?:[./:-][0-9a-z_]+)*")
+TOKEN_SEPARATOR = re.compile(r"[./:-]")
+
+
+def tokenize(text: str) -> list[str]:
+    tokens = []
+    for match in TOKEN.finditer(text.lower()):
+        token = match.group()
+        tokens.append(token)
+        parts = TOKEN_SEPARATOR.split(token)
+        if len(parts) > 1:
+            tokens.extend(parts)
+    return tokens
+
+
+def get_text(value: str | list | None) -> str:
+    if isinstance(value, list):
+        return "\n".join(value)
+    return value or ""
+
+
+class SearchIndexStream:
+    """Collect postings of the techniques of a bundle, written out on ``close``."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.documents = []
+        self.lengths = []
+        # term -> flat [document, field, term frequency, ...]
+        self.postings = defaultdict(list)
+
+    @metrics.timer("output.search")
+    def write(self, obj: dict) -> None:
+        if obj["type"] != "attack-pattern":
+            return
+        document = len(self.documents)
+        self.documents.append([obj["id"], get_external_id(obj), obj["name"]])
+        lengths = []
+        for field, name in enumerate(FIELDS.values()):
+            tokens = tokenize(get_text(obj.get(name)))
+            lengths.append(len(tokens))
+            for term, frequency in Counter(tokens).items():
+                self.postings[term].extend((document, field, frequency))
+        self.lengths.append(lengths)
+
+    @metrics.timer("output.search")
+    def close(self, collection: dict, commit_hash: str) -> None:
+        index = {
+            "version": INDEX_VERSION,
+            "commit_hash": commit_hash,
+            "fields": list(FIELDS),
+            "documents": self.documents,
+            "lengths": self.lengths,
+            "postings": dict(sorted(self.postings.items())),
+        }
+        write_atomic(self.path, json.dumps(index, separators=(",", ":")))
+
+    def abort(self) -> None:
+        pass
+
+
+class SearchIndexWriter(ExportWriter):
+    """Full-text indexes of the bundles, see ``SearchIndexStream``."""
+
+    suffix = ".search.json"
+    stream_class = SearchIndexStream
+
+
+class SearchIndex:
+    """Rank the techniques of one bundle against free-text queries."""
+
+    def __init__(self, path: Path | str) -> None:
+        with open(path, encoding="utf-8") as f:
+            index = json.load(f)
+        if index["version"] != INDEX_VERSION:
+            raise ValueError(f"unsupported index version {index['version']}")
+        self.fields = index["fields"]
+        self.documents = index["documents"]
+        self.lengths = index["lengths"]
+        self.postings = index["postings"]
+        self.weights = [FIELD_WEIGHTS[field] for field in self.fields]
+        self.average_lengths = [
+            max(sum(lengths[field] for lengths in self.lengths) / max(len(self.lengths), 1), 1)
+            for field in range(len(self.fields))
+        ]
+        # term -> ({document: score}, [(document, field, score), ...]), filled as terms are queried
+        self.terms = {}
+
+    def get_term(self, term: str) -> tuple[dict, list[tuple]]:
+        """Return the BM25 score of ``term`` in every document, in total and by field."""
+        if term not in self.terms:
+            postings = self.postings.get(term, [])
+            triples = list(zip(postings[0::3], postings[1::3], postings[2::3], strict=True))
+            count = len({document for document, _, _ in triples})
+            idf = math.log(1 + (len(self.documents) - count + 0.5) / (count + 0.5))
+            field_scores = []
+            scores = defaultdict(float)
+            for document, field, frequency in triples:
+                length = self.lengths[document][field] / self.average_lengths[field]
+                saturation = frequency * (K1 + 1) / (frequency + K1 * (1 - B + B * length))
+                score = self.weights[field] * idf * saturation
+                field_scores.append((document, field, score))
+                scores[document] += score
+            self.terms[term] = (dict(scores), field_scores)
+        return self.terms[term]
+
+    def search(self, query: str, limit: int = 10, fields: list[str] | None = None) -> list[dict]:
+        """Return up to ``limit`` techniques best matching ``query``, best first.
+
+        ``fields`` restricts matches to some of ``FIELDS``.
+        """
+        searched = {self.fields.index(field) for field in fields} if fields else None
+        scores = Counter()
+        for term in set(tokenize(query)):
+            term_scores, field_scores = self.get_term(term)
+            if searched is None:
+                scores.update(term_scores)
+            else:
+                for document, field, score in field_scores:
+                    if field in searched:
+                        scores[document] += score
+
+        return [
+            {
+                "id": self.documents[document][0],
+                "external_id": self.documents[document][1],
+                "name": self.documents[document][2],
+                "score": score,
+            }
+            for document, score in scores.most_common(limit)
+        ]
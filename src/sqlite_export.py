@@ -0,0 +1,205 @@
+"""Export the bundle's tactics and techniques to a normalized SQLite database.
+
+``build/atrm_<mode>.sqlite`` is filled from the same objects as the bundle,
+while they are streamed, so queries need no STIX parsing::
+
+    SELECT t.external_id, t.name
+    FROM techniques t
+    JOIN technique_tactics tt ON tt.technique_id = t.stix_id
+    JOIN resources r ON r.technique_id = t.stix_id
+    WHERE tt.tactic = 'execution' AND r.resource = 'Automation'
+"""
+
+import sqlite3
+from pathlib import Path
+
+from stix2.utils import format_datetime
+
+from bundle_index import get_external_id
+from metrics import metrics
+from output import ExportWriter, get_temp_path, replace_changed
+
+SCHEMA = """
+CREATE TABLE metadata (
+    name TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE tactics (
+    stix_id TEXT PRIMARY KEY,
+    external_id TEXT NOT NULL,
+    shortname TEXT NOT NULL,
+    name TEXT NOT NULL,
+    description TEXT,
+    url TEXT,
+    created TEXT,
+    modified TEXT
+);
+CREATE TABLE techniques (
+    stix_id TEXT PRIMARY KEY,
+    external_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    description TEXT,
+    brief TEXT,
+    url TEXT,
+    is_subtechnique INTEGER NOT NULL,
+    created TEXT,
+    modified TEXT
+);
+CREATE TABLE technique_tactics (
+    technique_id TEXT NOT NULL REFERENCES techniques,
+    tactic TEXT NOT NULL
+);
+CREATE TABLE subtechniques (
+    subtechnique_id TEXT NOT NULL REFERENCES techniques,
+    technique_id TEXT NOT NULL REFERENCES techniques,
+    relationship_id TEXT NOT NULL
+);
+CREATE TABLE resources (
+    technique_id TEXT NOT NULL REFERENCES techniques,
+    position INTEGER NOT NULL,
+    resource TEXT NOT NULL
+);
+CREATE TABLE actions (
+    technique_id TEXT NOT NULL REFERENCES techniques,
+    position INTEGER NOT NULL,
+    action TEXT NOT NULL
+);
+CREATE TABLE detections (
+    technique_id TEXT NOT NULL REFERENCES techniques,
+    position INTEGER NOT NULL,
+    detection TEXT NOT NULL
+);
+CREATE TABLE examples (
+    technique_id TEXT NOT NULL REFERENCES techniques,
+    position INTEGER NOT NULL,
+    example TEXT NOT NULL
+);
+"""
+# Created once the tables are filled, which is faster than updating them per row
+INDEXES = """
+CREATE UNIQUE INDEX tactics_external_id ON tactics (external_id);
+CREATE UNIQUE INDEX tactics_shortname ON tactics (shortname);
+CREATE UNIQUE INDEX techniques_external_id ON techniques (external_id);
+CREATE INDEX technique_tactics_tactic ON technique_tactics (tactic, technique_id);
+CREATE INDEX technique_tactics_technique_id ON technique_tactics (technique_id);
+CREATE INDEX subtechniques_technique_id ON subtechniques (technique_id);
+CREATE INDEX subtechniques_subtechnique_id ON subtechniques (subtechnique_id);
+CREATE INDEX resources_resource ON resources (resource, technique_id);
+CREATE INDEX resources_technique_id ON resources (technique_id);
+CREATE INDEX actions_action ON actions (action, technique_id);
+CREATE INDEX actions_technique_id ON actions (technique_id);
+CREATE INDEX detections_technique_id ON detections (technique_id);
+CREATE INDEX examples_technique_id ON examples (technique_id);
+"""
+# Technique properties stored one row per item, by table
+LIST_PROPERTIES = {
+    "x_atrm_resources": "resources",
+    "x_atrm_actions": "actions",
+    "x_atrm_detections": "detections",
+    "x_atrm_examples": "examples",
+}
+
+
+def format_timestamp(value) -> str | None:
+    # Objects patched from a previous build hold their timestamps serialized already
+    if value is None or isinstance(value, str):
+        return value
+    return format_datetime(value)
+
+
+def get_url(obj: dict) -> str | None:
+    for reference in obj.get("external_references", []):
+        if "external_id" in reference:
+            return reference.get("url")
+    return None
+
+
+class SqliteStream:
+    """Fill a database object by object, in a temporary file until ``close``."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.tmp_path = get_temp_path(path)
+        self.tmp_path.unlink(missing_ok=True)
+        self.connection = sqlite3.connect(self.tmp_path)
+        # The file is only moved into place once complete, so there is nothing to recover
+        self.connection.execute("PRAGMA journal_mode = OFF")
+        self.connection.execute("PRAGMA synchronous = OFF")
+        self.connection.executescript(SCHEMA)
+
+    @metrics.timer("output.sqlite")
+    def write(self, obj: dict) -> None:
+        if obj["type"] == "x-mitre-tactic":
+            self.connection.execute(
+                "INSERT INTO tactics VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    obj["id"],
+                    get_external_id(obj),
+                    obj["x_mitre_shortname"],
+                    obj["name"],
+                    obj.get("description"),
+                    get_url(obj),
+                    format_timestamp(obj.get("created")),
+                    format_timestamp(obj.get("modified")),
+                ),
+            )
+        elif obj["type"] == "attack-pattern":
+            self.write_technique(obj)
+        elif obj["type"] == "relationship" and obj["relationship_type"] == "subtechnique-of":
+            self.connection.execute(
+                "INSERT INTO subtechniques VALUES (?, ?, ?)",
+                (obj["source_ref"], obj["target_ref"], obj["id"]),
+            )
+
+    def write_technique(self, obj: dict) -> None:
+        self.connection.execute(
+            "INSERT INTO techniques VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                obj["id"],
+                get_external_id(obj),
+                obj["name"],
+                obj.get("description"),
+                obj.get("x_mitre_brief"),
+                get_url(obj),
+                bool(obj.get("x_mitre_is_subtechnique")),
+                format_timestamp(obj.get("created")),
+                format_timestamp(obj.get("modified")),
+            ),
+        )
+        self.connection.executemany(
+            "INSERT INTO technique_tactics VALUES (?, ?)",
+            [(obj["id"], phase["phase_name"]) for phase in obj.get("kill_chain_phases", [])],
+        )
+        for name, table in LIST_PROPERTIES.items():
+            self.connection.executemany(
+                f"INSERT INTO {table} VALUES (?, ?, ?)",  # noqa: S608
+                [(obj["id"], position, item) for position, item in enumerate(obj.get(name, []))],
+            )
+
+    @metrics.timer("output.sqlite")
+    def close(self, collection: dict, commit_hash: str) -> None:
+        self.connection.executemany(
+            "INSERT INTO metadata VALUES (?, ?)",
+            [
+                ("collection_id", collection["id"]),
+                ("name", collection["name"]),
+                ("version", collection["x_mitre_version"]),
+                ("modified", format_timestamp(collection["modified"])),
+                ("commit_hash", commit_hash),
+            ],
+        )
+        self.connection.executescript(INDEXES)
+        self.connection.commit()
+        self.connection.close()
+        replace_changed(self.tmp_path, self.path)
+
+    def abort(self) -> None:
+        self.connection.close()
+        self.tmp_path.unlink(missing_ok=True)
+
+
+class SqliteWriter(ExportWriter):
+    """SQLite databases of the bundles, see ``SqliteStream``."""
+
+    suffix = ".sqlite"
+    stream_class = SqliteStream
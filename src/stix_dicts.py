@@ -0,0 +1,137 @@
+"""Build STIX objects the pipeline trusts as plain dicts, skipping stix2's property checks.
+
+``make_object(Technique, ...)`` holds the same keys, in the same order and with
+the same timestamp values as ``Technique(...)`` would. ``validate_object``
+runs the stix2 checks on such a dict when they are wanted. ``load_object``
+reads such an object back from its JSON, without parsing its values again.
+"""
+
+from collections.abc import Mapping
+from functools import cache
+
+from stix2.base import _STIXBase
+from stix2.properties import ListProperty, Property, TimestampProperty
+from stix2.utils import NOW, format_datetime, get_timestamp, parse_into_datetime
+
+
+class StixDict(dict):
+    """A STIX object as a plain dict.
+
+    ``property_order`` lists the keys the way the stix2 object would hold them,
+    including optional properties left at their default, which stix2 keeps but
+    does not serialize. The pretty printer orders keys by these positions.
+    """
+
+    __slots__ = ("allow_custom", "property_order", "stix_class")
+
+
+@cache
+def get_defaultable_properties(stix_class: type[_STIXBase]) -> tuple:
+    return tuple(
+        (name, prop)
+        for name, prop in stix_class._properties.items()  # noqa: SLF001
+        if not prop.required and not hasattr(prop, "_fixed_value") and hasattr(prop, "default")
+    )
+
+
+@cache
+def get_defaulted_names(stix_class: type[_STIXBase]) -> frozenset:
+    """Names of the properties ``make_object`` fills in when they are not given."""
+    return frozenset(
+        name
+        for name, prop in stix_class._properties.items()  # noqa: SLF001
+        if hasattr(prop, "default") and prop.default() is not None
+    )
+
+
+def clean_value(prop: Property, value):
+    """Convert a trusted value the way ``prop.clean`` would, without checking it."""
+    if isinstance(prop, TimestampProperty):
+        return parse_into_datetime(value, prop.precision, prop.precision_constraint)
+    if isinstance(prop, ListProperty):
+        if isinstance(value, _STIXBase | StixDict | str):
+            value = [value]
+        if isinstance(prop.contained, Property):
+            return [clean_value(prop.contained, v) for v in value]
+        return [
+            make_object(prop.contained, **v)
+            if isinstance(v, Mapping) and not isinstance(v, prop.contained | StixDict)
+            else v
+            for v in value
+        ]
+    return value
+
+
+def make_object(stix_class: type[_STIXBase], allow_custom: bool = False, **kwargs) -> StixDict:
+    properties = stix_class._properties  # noqa: SLF001
+    custom_names = sorted(kwargs.keys() - properties.keys())
+    now = None
+
+    obj = StixDict()
+    for name in [*properties, *custom_names]:
+        value = kwargs.get(name)
+        if value is None or value == []:
+            value = None
+        prop = properties.get(name)
+        if prop is not None:
+            if value is None and hasattr(prop, "default"):
+                value = prop.default()
+                if value == NOW:
+                    # stix2 gives every generated timestamp of an object the same value
+                    now = now or get_timestamp()
+                    value = now
+            if value is not None:
+                value = clean_value(prop, value)
+        if value is not None:
+            obj[name] = value
+
+    obj.property_order = list(obj)
+    for name, prop in get_defaultable_properties(stix_class):
+        if name in obj and prop.default() == obj[name]:
+            del obj[name]
+    obj.stix_class = stix_class
+    obj.allow_custom = allow_custom
+    return obj
+
+
+def load_object(stix_class: type[_STIXBase], allow_custom: bool = False, **kwargs) -> StixDict:
+    """Return what ``make_object`` returned for the object serialized as ``kwargs``.
+
+    Values are kept as they were serialized, timestamps as strings, which the
+    pretty printer writes back unchanged.
+    """
+    properties = stix_class._properties  # noqa: SLF001
+    defaulted_names = get_defaulted_names(stix_class)
+    custom_names = sorted(kwargs.keys() - properties.keys())
+
+    obj = StixDict()
+    property_order = []
+    for name in [*properties, *custom_names]:
+        value = kwargs.get(name)
+        if value is None or value == []:
+            if name in defaulted_names:
+                # Left at its default, which make_object holds but does not keep
+                property_order.append(name)
+            continue
+        prop = properties.get(name)
+        if isinstance(prop, ListProperty) and not isinstance(prop.contained, Property):
+            value = [
+                load_object(prop.contained, **v) if isinstance(v, Mapping) else v for v in value
+            ]
+        obj[name] = value
+        property_order.append(name)
+
+    obj.property_order = property_order
+    obj.stix_class = stix_class
+    obj.allow_custom = allow_custom
+    return obj
+
+
+def serialize_timestamp(stix_class: type[_STIXBase], name: str, value) -> str:
+    """Return the timestamp ``value`` as property ``name`` of ``stix_class`` serializes it."""
+    return format_datetime(clean_value(stix_class._properties[name], value))  # noqa: SLF001
+
+
+def validate_object(obj: StixDict) -> _STIXBase:
+    """Run every stix2 property check on ``obj``, raising stix2's errors on bad values."""
+    return obj.stix_class(allow_custom=obj.allow_custom, **obj)
@@ -0,0 +1,336 @@
+"""Serve the latest ATRM bundles as read-only TAXII 2.1 collections.
+
+Every ``build/atrm_<mode>.json`` becomes a collection under the ``/atrm/`` API
+root, with the id of its ``x-mitre-collection``. A bundle rebuilt on disk is
+reloaded on the next request.
+
+The date an object was added is when the server first saw its current content,
+not its ``modified``: git dates pages by the commit that last touched them,
+which can predate the merge that brought them in, and some properties change
+without ``modified``. ``build/atrm_<mode>.taxii.json`` records the content digest
+and date added of every object across reloads and restarts, so polling with
+``added_after`` returns every object whose content changed since.
+
+    python src/taxii_server.py --port 8000
+"""
+
+import hashlib
+import json
+import os
+import sys
+import threading
+from bisect import bisect_right
+from datetime import UTC, datetime
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from operator import itemgetter
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+from bundle_index import get_digest
+from constants import BUILD_PATH, Mode
+
+TAXII_MEDIA_TYPE = "application/taxii+json;version=2.1"
+STIX_MEDIA_TYPE = "application/stix+json;version=2.1"
+API_ROOT = "atrm"
+PAGE_SIZE = 1000
+DATES_SUFFIX = ".taxii.json"
+# Entries sort by date added, then id
+get_key = itemgetter(0, 1)
+
+
+def parse_timestamp(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+def format_timestamp(value: datetime) -> str:
+    return value.astimezone(UTC).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def get_dates_path(bundle_path: Path) -> Path:
+    return bundle_path.with_suffix(DATES_SUFFIX)
+
+
+def load_dates(path: Path) -> dict[str, list[str]]:
+    """Return the [content digest, date added] of every object the server has seen."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_dates(path: Path, dates: dict[str, list[str]]) -> None:
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp_path.write_text(json.dumps(dates, indent=1, sort_keys=True), encoding="utf-8")
+    tmp_path.replace(path)
+
+
+def get_limit(query: dict[str, list[str]]) -> int:
+    limit = int(query.get("limit", [PAGE_SIZE])[0])
+    if limit < 1:
+        raise ValueError(f"limit must be at least 1, not {limit}")
+    return min(limit, PAGE_SIZE)
+
+
+class TaxiiCollection:
+    """The objects of one bundle, indexed by id and by the time they were added."""
+
+    def __init__(self, bundle_path: Path) -> None:
+        self.bundle_path = bundle_path
+        self.lock = threading.Lock()
+        self.stat = None
+        self.load()
+
+    def load(self) -> None:
+        data = self.bundle_path.read_bytes()
+        objects = json.loads(data)["objects"]
+        collection = next(obj for obj in objects if obj["type"] == "x-mitre-collection")
+        dates_path = get_dates_path(self.bundle_path)
+        previous = load_dates(dates_path)
+        now = format_timestamp(datetime.now(UTC))
+        dates = {}
+        for obj in objects:
+            digest = get_digest(obj)
+            seen = previous.get(obj["id"])
+            dates[obj["id"]] = seen if seen and seen[0] == digest else [digest, now]
+        if dates != previous:
+            save_dates(dates_path, dates)
+        # (date added, id, type, version, date added as sent, serialized object)
+        entries = sorted(
+            (
+                parse_timestamp(dates[obj["id"]][1]),
+                obj["id"],
+                obj["type"],
+                obj["modified"],
+                dates[obj["id"]][1],
+                json.dumps(obj, separators=(",", ":")),
+            )
+            for obj in objects
+        )
+        self.id = collection["id"].split("--")[1]
+        self.title = f"{collection['name']} ({self.bundle_path.stem})"
+        self.description = collection.get("description")
+        # Dates added are part of responses, so a lost sidecar changes the ETags too
+        self.version = hashlib.sha256(data + json.dumps(dates).encode("utf-8")).hexdigest()
+        self.entries = entries
+        # The entries of each id, one per version, in the order of entries
+        entries_by_id = {}
+        for entry in entries:
+            entries_by_id.setdefault(entry[1], []).append(entry)
+        self.entries_by_id = entries_by_id
+        self.stat = self.get_stat()
+
+    def get_stat(self) -> tuple:
+        stat = self.bundle_path.stat()
+        return stat.st_mtime_ns, stat.st_size
+
+    def refresh(self) -> None:
+        with self.lock:
+            if self.get_stat() != self.stat:
+                self.load()
+
+    def get_info(self) -> dict:
+        return {
+            "id": self.id,
+            "title": self.title,
+            "description": self.description,
+            "can_read": True,
+            "can_write": False,
+            "media_types": [STIX_MEDIA_TYPE],
+        }
+
+    def find(self, query: dict[str, list[str]], object_id: str | None = None) -> tuple[list, bool]:
+        """Return a page of entries matching the TAXII filters in ``query``, and if more follow."""
+        ids = {object_id} if object_id else set(get_match(query, "id"))
+        # A reload replaces the indexes, so requests keep reading the one they started with
+        if ids:
+            entries_by_id = self.entries_by_id
+            entries = sorted(entry for i in ids for entry in entries_by_id.get(i, ()))
+        else:
+            entries = self.entries
+        start = 0
+        if "added_after" in query:
+            added_after = (parse_timestamp(query["added_after"][0]), "\uffff")
+            start = bisect_right(entries, added_after, key=get_key)
+        if "next" in query:
+            added, _, next_id = query["next"][0].partition("|")
+            after = (parse_timestamp(added), next_id)
+            start = max(start, bisect_right(entries, after, key=get_key))
+        limit = get_limit(query)
+        types = set(get_match(query, "type"))
+        versions = set(get_match(query, "version")) - {"first", "last", "all"}
+
+        page = []
+        for entry in entries[start:]:
+            _, _, entry_type, version, _, _ = entry
+            if (types and entry_type not in types) or (versions and version not in versions):
+                continue
+            if len(page) == limit:
+                return page, True
+            page.append(entry)
+        return page, False
+
+
+def get_match(query: dict[str, list[str]], name: str) -> list[str]:
+    return [v for value in query.get(f"match[{name}]", []) for v in value.split(",") if v]
+
+
+def get_next(entries: list) -> str:
+    _, object_id, _, _, date_added, _ = entries[-1]
+    return f"{date_added}|{object_id}"
+
+
+class TaxiiRequestHandler(BaseHTTPRequestHandler):
+    server_version = "ATRM-TAXII/2.1"
+
+    @property
+    def collections(self) -> dict[str, TaxiiCollection]:
+        return self.server.collections
+
+    def do_GET(self) -> None:  # noqa: N802
+        url = urlsplit(self.path)
+        parts = [part for part in url.path.split("/") if part]
+        query = parse_qs(url.query)
+        try:
+            self.route(parts, query)
+        except (ValueError, KeyError) as e:
+            self.send_error_message(HTTPStatus.BAD_REQUEST, str(e))
+
+    def route(self, parts: list[str], query: dict) -> None:
+        if parts == ["taxii2"]:
+            self.send_json(
+                {
+                    "title": "Azure Threat Research Matrix",
+                    "default": f"/{API_ROOT}/",
+                    "api_roots": [f"/{API_ROOT}/"],
+                },
+            )
+            return
+        if not parts or parts[0] != API_ROOT:
+            self.send_error_message(HTTPStatus.NOT_FOUND, "unknown API root")
+            return
+        if len(parts) == 1:
+            self.send_json(
+                {
+                    "title": "Azure Threat Research Matrix",
+                    "versions": [TAXII_MEDIA_TYPE],
+                    "max_content_length": 0,
+                },
+            )
+            return
+        if parts == [API_ROOT, "collections"]:
+            collections = list(self.collections.values())
+            for collection in collections:
+                collection.refresh()
+            self.send_json({"collections": [c.get_info() for c in collections]})
+            return
+
+        collection = self.collections.get(parts[2]) if len(parts) > 2 else None
+        if parts[1] != "collections" or collection is None:
+            self.send_error_message(HTTPStatus.NOT_FOUND, "unknown collection")
+            return
+        collection.refresh()
+        match parts[3:]:
+            case []:
+                self.send_json(collection.get_info())
+            case ["objects"]:
+                self.send_objects(collection, query)
+            case ["objects", object_id]:
+                self.send_objects(collection, query, object_id)
+            case ["manifest"]:
+                self.send_manifest(collection, query)
+            case _:
+                self.send_error_message(HTTPStatus.NOT_FOUND, "unknown endpoint")
+
+    def get_etag(self, collection: TaxiiCollection) -> str:
+        # Responses only depend on the bundle and the request
+        digest = hashlib.sha256(f"{collection.version} {self.path}".encode()).hexdigest()
+        return f'"{digest[:32]}"'
+
+    def is_not_modified(self, etag: str) -> bool:
+        tags = [tag.strip() for tag in self.headers.get("If-None-Match", "").split(",")]
+        if etag in tags or "*" in tags:
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return True
+        return False
+
+    def send_objects(
+        self,
+        collection: TaxiiCollection,
+        query: dict,
+        object_id: str | None = None,
+    ) -> None:
+        etag = self.get_etag(collection)
+        if self.is_not_modified(etag):
+            return
+        entries, more = collection.find(query, object_id)
+        if object_id and not entries and "next" not in query:
+            self.send_error_message(HTTPStatus.NOT_FOUND, f"no object {object_id}")
+            return
+        envelope = f'{{"more":{json.dumps(more)}'
+        if entries:
+            if more:
+                envelope += f',"next":{json.dumps(get_next(entries))}'
+            envelope += ',"objects":[' + ",".join(entry[5] for entry in entries) + "]"
+        self.send_body((envelope + "}").encode("utf-8"), etag, entries)
+
+    def send_manifest(self, collection: TaxiiCollection, query: dict) -> None:
+        etag = self.get_etag(collection)
+        if self.is_not_modified(etag):
+            return
+        entries, more = collection.find(query)
+        manifest = {"more": more}
+        if entries:
+            if more:
+                manifest["next"] = get_next(entries)
+            manifest["objects"] = [
+                {
+                    "id": object_id,
+                    "date_added": date_added,
+                    "version": version,
+                    "media_type": STIX_MEDIA_TYPE,
+                }
+                for _, object_id, _, version, date_added, _ in entries
+            ]
+        self.send_body(json.dumps(manifest).encode("utf-8"), etag, entries)
+
+    def send_body(self, body: bytes, etag: str, entries: list) -> None:
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", TAXII_MEDIA_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        if entries:
+            self.send_header("X-TAXII-Date-Added-First", entries[0][4])
+            self.send_header("X-TAXII-Date-Added-Last", entries[-1][4])
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, obj: dict, status: HTTPStatus = HTTPStatus.OK) -> None:
+        body = json.dumps(obj).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", TAXII_MEDIA_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_message(self, status: HTTPStatus, description: str) -> None:
+        self.send_json(
+            {"title": status.phrase, "description": description, "http_status": str(status.value)},
+            status,
+        )
+
+
+def serve(host: str, port: int, build_path: Path = BUILD_PATH) -> None:
+    collections = [TaxiiCollection(build_path / f"atrm_{mode.name.lower()}.json") for mode in Mode]
+    with ThreadingHTTPServer((host, port), TaxiiRequestHandler) as server:
+        server.collections = {collection.id: collection for collection in collections}
+        server.serve_forever()
+
+
+if __name__ == "__main__":
+    from cli import main
+
+    main(["serve", *sys.argv[1:]])
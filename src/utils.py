@@ -5,3 +5,11 @@ import uuid
 def create_uuid_from_string(val: str) -> uuid.UUID:
     hex_string = hashlib.md5(val.encode("UTF-8")).hexdigest()  # noqa: S324
     return uuid.UUID(hex=hex_string, version=4)
+
+
+def fix_id(atrm_id: str) -> str:
+    if "." in atrm_id:
+        tpart = atrm_id.split(".")[0]
+        spart = atrm_id.split(".")[1].replace("0", "")
+        atrm_id = f"{tpart}.00{spart}"
+    return atrm_id
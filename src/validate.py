@@ -0,0 +1,235 @@
+"""Check the references and required properties of built bundles.
+
+stix2 only validates objects one at a time. This checks that every reference in
+a bundle resolves to an object of the right type: relationships, collection
+contents, matrix tactics, kill chain phases and creator identities. Objects are
+indexed by id once, then each one is checked against the index, so a bundle is
+validated in linear time and all of its problems are reported together::
+
+    python src/validate.py                          # every bundle in build/
+    python src/validate.py build/atrm_strict.json
+
+The exit status is 1 when a bundle has a problem, so it can gate CI.
+"""
+
+import json
+import sys
+from collections import Counter
+from pathlib import Path
+
+from bundle_index import get_external_id
+from constants import Mode, get_atrm_domain, get_collection_id, get_kill_chain_name
+from metrics import metrics
+
+COMMON_PROPERTIES = ("type", "spec_version", "id", "created", "modified")
+REQUIRED_PROPERTIES = {
+    "x-mitre-collection": ("name", "x_mitre_contents"),
+    "x-mitre-tactic": ("name", "external_references", "x_mitre_shortname"),
+    "attack-pattern": ("name", "external_references", "kill_chain_phases"),
+    "relationship": ("relationship_type", "source_ref", "target_ref"),
+    "x-mitre-matrix": ("name", "tactic_refs"),
+    "identity": ("name", "identity_class"),
+}
+# Properties referencing the identity that created or last modified an object
+IDENTITY_REFS = ("created_by_ref", "x_mitre_modified_by_ref")
+MODES = {get_collection_id(mode=mode): mode for mode in Mode}
+
+
+def get_bundle_paths(build_path: Path) -> list[Path]:
+    # Not the indexes, deltas and other files written next to the bundles
+    return sorted(path for path in build_path.glob("atrm_*.json") if path.suffixes == [".json"])
+
+
+def index_objects(objects: list, problems: list[str]) -> dict[str, dict]:
+    """Map ids to objects, reporting objects without an id, type or required property."""
+    index = {}
+    for position, obj in enumerate(objects):
+        obj_id = obj.get("id", f"objects[{position}]")
+        required = (*COMMON_PROPERTIES, *REQUIRED_PROPERTIES.get(obj.get("type"), ()))
+        missing = [name for name in required if name not in obj]
+        if missing:
+            problems.append(f"{obj_id}: missing {', '.join(missing)}")
+        if "id" not in obj or "type" not in obj:
+            continue
+        if not obj_id.startswith(f"{obj['type']}--"):
+            problems.append(f"{obj_id}: id does not match type {obj['type']}")
+        if obj_id in index:
+            problems.append(f"{obj_id}: duplicate id")
+        if obj.get("modified", "") < obj.get("created", ""):
+            problems.append(f"{obj_id}: modified before created")
+        index[obj_id] = obj
+    return index
+
+
+def check_ref(
+    objects: dict[str, dict],
+    obj: dict,
+    name: str,
+    ref: str,
+    object_type: str | None,
+    problems: list[str],
+) -> dict | None:
+    """Return the object ``ref`` points to if it is in the bundle, with ``object_type`` if any."""
+    target = objects.get(ref)
+    if target is None:
+        problems.append(f"{obj['id']}: {name} {ref} is not in the bundle")
+    elif object_type and target["type"] != object_type:
+        problems.append(f"{obj['id']}: {name} {ref} is a {target['type']}, not {object_type}")
+    else:
+        return target
+    return None
+
+
+def check_collection(objects: dict[str, dict], problems: list[str]) -> dict | None:
+    """Check that the collection lists every other object once, at its version."""
+    collections = [obj for obj in objects.values() if obj["type"] == "x-mitre-collection"]
+    if len(collections) != 1:
+        problems.append(f"bundle: {len(collections)} collections, expected 1")
+        return None
+    collection = collections[0]
+    listed = Counter()
+    for content in collection.get("x_mitre_contents", []):
+        ref = content.get("object_ref")
+        listed[ref] += 1
+        obj = objects.get(ref)
+        if obj is None:
+            problems.append(f"{collection['id']}: x_mitre_contents {ref} is not in the bundle")
+        elif content.get("object_modified") != obj.get("modified"):
+            problems.append(
+                f"{collection['id']}: x_mitre_contents {ref} is at {content.get('object_modified')}"
+                f", the object at {obj.get('modified')}",
+            )
+    problems.extend(
+        f"{collection['id']}: x_mitre_contents lists {ref} {count} times"
+        for ref, count in listed.items()
+        if count > 1
+    )
+    problems.extend(
+        f"{collection['id']}: x_mitre_contents does not list {obj_id}"
+        for obj_id in objects
+        if obj_id not in listed and obj_id != collection["id"]
+    )
+    return collection
+
+
+def check_tactics(objects: dict[str, dict], problems: list[str]) -> set[str]:
+    """Check that matrices list tactics, every tactic once; return their shortnames."""
+    shortnames = Counter()
+    in_matrix = set()
+    for obj in objects.values():
+        if obj["type"] == "x-mitre-tactic":
+            shortnames[obj.get("x_mitre_shortname")] += 1
+        elif obj["type"] == "x-mitre-matrix":
+            for ref in obj.get("tactic_refs", []):
+                if check_ref(objects, obj, "tactic_refs", ref, "x-mitre-tactic", problems):
+                    in_matrix.add(ref)
+    for obj in objects.values():
+        if obj["type"] == "x-mitre-tactic" and obj["id"] not in in_matrix:
+            problems.append(f"{obj['id']}: tactic is in no matrix")
+    problems.extend(
+        f"bundle: {count} tactics have the shortname {shortname}"
+        for shortname, count in shortnames.items()
+        if count > 1
+    )
+    return set(shortnames)
+
+
+def check_relationship(objects: dict[str, dict], obj: dict, problems: list[str]) -> None:
+    subtechnique_of = obj.get("relationship_type") == "subtechnique-of"
+    object_type = "attack-pattern" if subtechnique_of else None
+    source = check_ref(objects, obj, "source_ref", obj.get("source_ref"), object_type, problems)
+    target = check_ref(objects, obj, "target_ref", obj.get("target_ref"), object_type, problems)
+    if not (subtechnique_of and source and target):
+        return
+    if not source.get("x_mitre_is_subtechnique"):
+        problems.append(f"{obj['id']}: source_ref {source['id']} is not a subtechnique")
+    if target.get("x_mitre_is_subtechnique"):
+        problems.append(f"{obj['id']}: target_ref {target['id']} is a subtechnique")
+    source_id = get_external_id(source) or ""
+    target_id = get_external_id(target)
+    if source_id.split(".")[0] != target_id:
+        problems.append(f"{obj['id']}: {source_id} is not a subtechnique of {target_id}")
+
+
+def check_technique(
+    obj: dict,
+    shortnames: set[str],
+    kill_chain_name: str | None,
+    problems: list[str],
+) -> None:
+    for phase in obj.get("kill_chain_phases", []):
+        if phase.get("phase_name") not in shortnames:
+            problems.append(
+                f"{obj['id']}: kill chain phase {phase.get('phase_name')} is no tactic",
+            )
+        if kill_chain_name and phase.get("kill_chain_name") != kill_chain_name:
+            problems.append(
+                f"{obj['id']}: kill chain {phase.get('kill_chain_name')}, expected {kill_chain_name}",
+            )
+
+
+def validate_bundle(bundle: dict) -> list[str]:
+    """Return every problem found in ``bundle``, none if it is consistent."""
+    problems = []
+    if bundle.get("type") != "bundle":
+        problems.append(f"bundle: type is {bundle.get('type')}, expected bundle")
+    objects = index_objects(bundle.get("objects", []), problems)
+
+    collection = check_collection(objects, problems)
+    mode = MODES.get(collection["id"]) if collection else None
+    kill_chain_name = get_kill_chain_name(mode=mode) if mode else None
+    domains = [get_atrm_domain(mode=mode)] if mode else None
+    shortnames = check_tactics(objects, problems)
+    external_ids = Counter()
+    # subtechnique id -> number of subtechnique-of relationships from it
+    parents = Counter()
+
+    for obj in objects.values():
+        for name in IDENTITY_REFS:
+            if name in obj:
+                check_ref(objects, obj, name, obj[name], "identity", problems)
+        # The creator identity is shared by both modes
+        if (
+            domains
+            and obj["type"] != "identity"
+            and obj.get("x_mitre_domains", domains) != domains
+        ):
+            problems.append(f"{obj['id']}: domains {obj['x_mitre_domains']}, expected {domains}")
+        if obj["type"] in ("x-mitre-tactic", "attack-pattern"):
+            external_ids[get_external_id(obj)] += 1
+        if obj["type"] == "attack-pattern":
+            check_technique(obj, shortnames, kill_chain_name, problems)
+        elif obj["type"] == "relationship":
+            check_relationship(objects, obj, problems)
+            if obj.get("relationship_type") == "subtechnique-of":
+                parents[obj.get("source_ref")] += 1
+
+    problems.extend(
+        f"{obj['id']}: subtechnique of {parents[obj['id']]} techniques"
+        for obj in objects.values()
+        if obj["type"] == "attack-pattern"
+        and obj.get("x_mitre_is_subtechnique")
+        and parents[obj["id"]] != 1
+    )
+    problems.extend(
+        f"bundle: {count} objects have the external id {external_id}"
+        for external_id, count in external_ids.items()
+        if count > 1
+    )
+    return problems
+
+
+@metrics.timer("validate")
+def validate_file(path: Path) -> list[str]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            bundle = json.load(f)
+    except ValueError as e:
+        return [f"not a JSON document: {e}"]
+    return validate_bundle(bundle)
+
+
+if __name__ == "__main__":
+    from cli import main
+
+    main(["validate", *sys.argv[1:]])
@@ -0,0 +1,125 @@
+"""Rebuild the bundles whenever a page of the local ATRM docs changes.
+
+    python src/cli.py watch [--interval 0.5] [--debounce 0.2]
+
+The docs tree is polled with one ``stat`` per page, which works on every
+platform and filesystem and costs well under a millisecond for ATRM. A burst of
+saves is rebuilt once, after the tree has been quiet for the debounce delay.
+Only the changed pages are parsed again: the model, its git dates and the
+records of every other page stay in memory between rebuilds, until a commit
+moves the dates. Parsing an edit takes milliseconds; the rest of a rebuild is
+writing the bundles, byte for byte as a full build would. A page that fails
+to parse, typically halfway through an edit, is reported and the outputs are
+left as they were until it is saved again.
+"""
+
+import time
+import warnings
+from collections.abc import Callable, Sequence
+from pathlib import Path
+
+from constants import ATRM_PATH, Mode
+from git_tools import GitHistory, get_last_commit_hash
+from output import BundleWriter, ExportWriter
+from parse import parse_atrm, read_atrm
+from parse_cache import ParseCache
+
+DOCS_PATH = ATRM_PATH / "docs"
+
+
+def scan(path: Path) -> dict[str, tuple[int, int]]:
+    """Map every Markdown page under ``path`` to its modification time and size."""
+    pages = {}
+    for page in path.rglob("*.md"):
+        try:
+            stat = page.stat()
+        except FileNotFoundError:
+            # Deleted since it was listed, as editors do when saving
+            continue
+        pages[str(page)] = (stat.st_mtime_ns, stat.st_size)
+    return pages
+
+
+def get_changes(old: dict, new: dict) -> set[str]:
+    return {path for path in old.keys() | new.keys() if old.get(path) != new.get(path)}
+
+
+class ModelWatcher:
+    """The model of the ATRM docs and the outputs written from it, kept up to date page by page."""
+
+    def __init__(
+        self,
+        writer: BundleWriter,
+        cache: ParseCache | None = None,
+        workers: int = 1,
+        deterministic: bool = False,
+        exporters: Sequence[ExportWriter] = (),
+    ) -> None:
+        self.writer = writer
+        self.cache = cache
+        self.deterministic = deterministic
+        self.exporters = exporters
+        self.commit_hash = get_last_commit_hash(ATRM_PATH)
+        self.history = GitHistory(ATRM_PATH)
+        # Pages of updates that failed, parsed again with the next one
+        self.failed = set()
+        self.model = read_atrm(self.history, workers=workers, cache=cache)
+        self.write()
+
+    def write(self) -> None:
+        for mode in Mode:
+            parse_atrm(
+                mode,
+                self.model,
+                writer=self.writer,
+                deterministic=self.deterministic,
+                exporters=self.exporters,
+            )
+
+    def update(self, changed: set[str]) -> bool:
+        """Parse the ``changed`` pages again and rewrite the outputs; False if a page failed."""
+        model = self.model
+        commit_hash = get_last_commit_hash(ATRM_PATH)
+        if commit_hash != self.commit_hash:
+            # Committed meanwhile: every page is read again, dated from the new history
+            self.commit_hash = commit_hash
+            self.history = GitHistory(ATRM_PATH)
+            model = None
+        changed = changed | self.failed
+        try:
+            self.model = read_atrm(self.history, cache=self.cache, model=model, changed=changed)
+            self.write()
+        except (KeyError, IndexError, ValueError, OSError) as e:
+            self.failed = changed
+            warnings.warn(f"not rebuilt: {e!r}", stacklevel=2)
+            return False
+        self.failed = set()
+        return True
+
+
+def watch_atrm(
+    update: Callable[[set[str]], object],
+    interval: float = 0.5,
+    debounce: float = 0.2,
+    snapshot: dict[str, tuple[int, int]] | None = None,
+) -> None:
+    """Call ``update`` with the pages changed in a burst, polling every ``interval`` seconds.
+
+    Pass the ``snapshot`` scanned before building so edits made during the build are not missed.
+    """
+    if snapshot is None:
+        snapshot = scan(DOCS_PATH)
+    pending = set()
+    last_change = 0.0
+    while True:
+        time.sleep(interval)
+        current = scan(DOCS_PATH)
+        changed = get_changes(snapshot, current)
+        snapshot = current
+        now = time.monotonic()
+        if changed:
+            pending |= changed
+            last_change = now
+        elif pending and now - last_change >= debounce:
+            update(pending)
+            pending = set()